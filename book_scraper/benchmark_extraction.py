@@ -0,0 +1,160 @@
+"""
+This module benchmarks the extraction of paragraphs from saved book pages.
+
+It compares the original extraction (a full BeautifulSoup tree of every page and
+per-paragraph heading normalization) with the fast path used by parse_page, and
+reports pages per second for each. Sample pages are read from the page cache of a
+scraped book or from a directory of saved .html files, so no network is needed.
+
+Usage:
+    python benchmark_extraction.py --book-id 8183 --pages 200
+    python benchmark_extraction.py --pages-dir samples/
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+from bs4 import BeautifulSoup
+
+# Entry point: make the shared `common` package at the repository root importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# pylint: disable=wrong-import-position
+import scraper
+from scraper import extract_text_with_spans, extract_li_text, normalize_headings, parse_page
+from page_cache import PageCache
+from config import BOOK_ID, BASE_URL, PAGE_CACHE_DIRECTORY
+
+def legacy_parse_page(content, current_file_index, li_texts):
+    """
+    Processes a page the way scrape_page originally did, as the benchmark baseline.
+
+    Parameters:
+        content (bytes): The raw page content.
+        current_file_index (int): The current file index for text chunking.
+        li_texts (list): List of text items to match against.
+
+    Returns:
+        tuple: Formatted text, updated file index, and chunk length.
+    """
+    soup = BeautifulSoup(content, "html.parser")
+    text_div = soup.find("div", class_="nass margin-top-10")
+    if not text_div:
+        return None, None, None
+
+    formatted_text = []
+    chunk_len = 0
+    for p in text_div.find_all("p"):
+        text_with_spans = extract_text_with_spans(p)
+        text_with_spans = re.sub(r'[\u0617-\u061A\u064B-\u0652\[\]]', '',
+                                 text_with_spans).strip()
+        if current_file_index < len(li_texts):
+            heading = re.sub(r'^-+', '', li_texts[current_file_index]).strip()
+            if text_with_spans == f'"{heading}"':
+                current_file_index += 1
+                chunk_len = len(formatted_text)
+        formatted_text.append(text_with_spans)
+    return formatted_text, current_file_index, chunk_len
+
+def load_sample_pages(book_id, max_pages, pages_dir=None):
+    """
+    Loads saved pages to benchmark against.
+
+    Parameters:
+        book_id (int): The ID of a book in the page cache.
+        max_pages (int): The maximum number of pages to load.
+        pages_dir (str): A directory of saved .html pages to use instead of the cache.
+
+    Returns:
+        list: The raw content of the sample pages, in page order.
+    """
+    pages = []
+    if pages_dir:
+        for filename in sorted(os.listdir(pages_dir))[:max_pages]:
+            if filename.endswith('.html'):
+                with open(os.path.join(pages_dir, filename), 'rb') as file:
+                    pages.append(file.read())
+        return pages
+
+    cache = PageCache(PAGE_CACHE_DIRECTORY)
+    for page_number in range(1, max_pages + 1):
+        content = cache.get(book_id, page_number, BASE_URL)
+        if content is None:
+            break
+        pages.append(content)
+    return pages
+
+def run_benchmark(name, parse, pages, repeat):
+    """
+    Times a parse function over the sample pages.
+
+    Parameters:
+        name (str): The label printed with the result.
+        parse (callable): Takes (content, current_file_index) and returns parse_page's tuple.
+        pages (list): The raw sample pages.
+        repeat (int): The number of passes over the sample pages.
+
+    Returns:
+        tuple: The pages per second and the output of the last pass.
+    """
+    outputs = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        outputs = []
+        current_file_index = 1
+        for content in pages:
+            formatted_text, new_file_index, _ = parse(content, current_file_index)
+            outputs.append(formatted_text)
+            if new_file_index is not None:
+                current_file_index = new_file_index
+    elapsed = time.perf_counter() - start
+    pages_per_second = len(pages) * repeat / elapsed
+    print(f"{name:<24} {pages_per_second:10.1f} pages/s")
+    return pages_per_second, outputs
+
+def main():
+    """
+    Runs the extraction benchmark from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark page extraction.")
+    parser.add_argument('--book-id', type=int, default=BOOK_ID,
+                        help="The book whose cached pages are used as samples.")
+    parser.add_argument('--pages-dir', help="A directory of saved .html pages to use instead.")
+    parser.add_argument('--pages', type=int, default=200, help="The number of sample pages.")
+    parser.add_argument('--repeat', type=int, default=3, help="The number of timed passes.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    pages = load_sample_pages(args.book_id, args.pages, args.pages_dir)
+    if not pages:
+        print("No sample pages found; scrape the book first to fill the page cache.")
+        return
+
+    li_texts = extract_li_text(BeautifulSoup(pages[0], "html.parser"))
+    headings = normalize_headings(li_texts)
+    print(f"{len(pages)} sample pages, {args.repeat} passes")
+
+    baseline, expected = run_benchmark(
+        "original", lambda content, index: legacy_parse_page(content, index, li_texts),
+        pages, args.repeat)
+
+    parsers = ['html.parser']
+    try:
+        import lxml  # pylint: disable=import-outside-toplevel,unused-import
+        parsers.append('lxml')
+    except ImportError:
+        pass
+
+    for html_parser in parsers:
+        scraper.HTML_PARSER = html_parser
+        fast, outputs = run_benchmark(
+            f"fast path ({html_parser})",
+            lambda content, index: parse_page(content, 0, index, headings),
+            pages, args.repeat)
+        status = "identical output" if outputs == expected else "OUTPUT DIFFERS"
+        print(f"{'':<24} {fast / baseline:10.2f}x speed-up, {status}")
+
+if __name__ == "__main__":
+    main()
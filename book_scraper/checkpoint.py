@@ -0,0 +1,145 @@
+"""
+This module provides the run manifest used to checkpoint and resume book scrapes.
+
+The manifest is stored in the book directory and records the last page whose text
+has been committed, the current chapter index and how many bytes of the chapter in
+progress have been committed to its spool file, so an interrupted scrape can
+continue where it stopped.
+"""
+
+import os
+import re
+import json
+import logging
+from file_utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = '.manifest.json'
+CHAPTER_SPOOL_PATTERN = re.compile(r'^\.chapter_(\d+)\.part$')
+
+class RunManifest:
+    """
+    A persisted record of the progress of a book scrape.
+
+    Attributes:
+        directory (str): The book directory holding the manifest.
+        state (dict): The current run state.
+    """
+    def __init__(self, directory):
+        """
+        Initializes a RunManifest instance.
+
+        Parameters:
+            directory (str): The book directory holding the manifest.
+        """
+        self.directory = directory
+        self.state = {}
+
+    @property
+    def manifest_path(self):
+        """str: The path of the manifest file."""
+        return os.path.join(self.directory, MANIFEST_FILENAME)
+
+    def chapter_spool_path(self, file_index):
+        """
+        Returns the path of the spool file of a chapter in progress.
+
+        Parameters:
+            file_index (int): The index of the chapter.
+
+        Returns:
+            str: The path of the spool file.
+        """
+        return os.path.join(self.directory, f".chapter_{file_index}.part")
+
+    def pending_spools(self, current_file_index):
+        """
+        Finds spool files of earlier chapters that were not converted before a crash.
+
+        Parameters:
+            current_file_index (int): The index of the chapter in progress.
+
+        Returns:
+            list: (file_index, spool_path) pairs, ordered by chapter index.
+        """
+        pending = []
+        for filename in os.listdir(self.directory):
+            match = CHAPTER_SPOOL_PATTERN.match(filename)
+            if match and int(match.group(1)) < current_file_index:
+                pending.append((int(match.group(1)), os.path.join(self.directory, filename)))
+        return sorted(pending)
+
+    def load(self):
+        """
+        Loads the manifest of a previous run.
+
+        Returns:
+            dict: The run state, or None if there is no previous run.
+        """
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                self.state = json.load(file)
+        except FileNotFoundError:
+            return None
+        return self.state
+
+    def start(self, book_id, file_format, li_texts):
+        """
+        Starts a new run, replacing any previous manifest.
+
+        Parameters:
+            book_id (int): The ID of the book.
+            file_format (str): The format in which chapters are saved.
+            li_texts (list): The chapter headings of the book.
+
+        Returns:
+            None
+        """
+        self.state = {
+            "book_id": book_id,
+            "file_format": file_format,
+            "li_texts": li_texts,
+            "last_page": 0,
+            "current_file_index": 1,
+            "partial_bytes": 0,
+            "completed": False,
+        }
+        self._write()
+
+    def checkpoint(self, last_page, current_file_index, partial_bytes):
+        """
+        Persists the progress of the run.
+
+        The spool file of the chapter in progress must have been flushed first, so
+        the manifest never refers to text that is not on disk.
+
+        Parameters:
+            last_page (int): The last page whose text has been committed.
+            current_file_index (int): The index of the chapter in progress.
+            partial_bytes (int): The committed size of the chapter's spool file.
+
+        Returns:
+            None
+        """
+        self.state.update({
+            "last_page": last_page,
+            "current_file_index": current_file_index,
+            "partial_bytes": partial_bytes,
+        })
+        self._write()
+        logger.info("Checkpoint saved at page %d.", last_page)
+
+    def complete(self):
+        """
+        Marks the run as completed.
+
+        Returns:
+            None
+        """
+        self.state["completed"] = True
+        self._write()
+
+    def _write(self):
+        data = json.dumps(self.state, ensure_ascii=False, indent=2)
+        atomic_write(self.manifest_path, data.encode('utf-8'))
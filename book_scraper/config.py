@@ -18,9 +18,29 @@ BASE_URL = "https://shamela.ws/book"
 FILE_FORMAT = 'txt'  # Options: 'txt', 'docx', 'pdf'
 SUPPORTED_FORMATS = ['txt', 'docx']
 
+# Parser used for the content div ('html.parser', or 'lxml' if installed)
+HTML_PARSER = 'html.parser'
+
 # Page and retry settings
 MAX_PAGES = None
 RETRIES = 3
+RETRY_BACKOFF = 1.0  # Seconds before the first retry, doubled on every further attempt
+
+# Checkpoint settings
+CHECKPOINT_INTERVAL = 25  # Pages between run manifest checkpoints
+
+# Concurrency settings
+CONCURRENT_REQUESTS = 8  # Maximum pages fetched in parallel (1 fetches sequentially)
+
+# Batch settings (used when scraping several books at once)
+BATCH_CONCURRENT_BOOKS = 4  # Books scraped at the same time
+REQUESTS_PER_SECOND = 10  # Global request-rate limit across all books (None for no limit)
+MAX_CONNECTIONS_PER_HOST = 8  # Concurrent requests to any one host across all books
+PROGRESS_REPORT_INTERVAL = 30  # Seconds between progress reports
+
+# Page cache settings
+USE_PAGE_CACHE = True
+PAGE_CACHE_DIRECTORY = 'page_cache'  # Compressed raw HTML, keyed by host, book ID and page
 
 def get_book_directory(book_id):
     """
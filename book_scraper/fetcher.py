@@ -0,0 +1,93 @@
+"""
+This module provides concurrent downloading of book pages.
+
+Pages are fetched by a pool of worker threads, but they are always handed back
+to the caller in page order, so the chapter-splitting logic sees exactly the
+same sequence of pages as a sequential scrape.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from scraper import fetch_page
+from config import BASE_URL, CONCURRENT_REQUESTS
+
+class PageFetchError(requests.RequestException):
+    """
+    Raised when a page cannot be fetched, recording which page failed.
+
+    Attributes:
+        page_number (int): The page that could not be fetched.
+    """
+    def __init__(self, page_number, error):
+        """
+        Initializes a PageFetchError instance.
+
+        Parameters:
+            page_number (int): The page that could not be fetched.
+            error (Exception): The underlying request error.
+        """
+        super().__init__(f"Error fetching page {page_number}: {error}")
+        self.page_number = page_number
+
+def fetch_pages(book_id, start_page=1, max_pages=None, concurrency=CONCURRENT_REQUESTS,
+                base_url=BASE_URL, scheduler=None):
+    """
+    Fetches the pages of a book, yielding them in page order.
+
+    Up to `concurrency` requests are in flight at once and a small window of
+    pages is fetched ahead of the page being consumed. If a page cannot be fetched,
+    PageFetchError is raised once every earlier page has been yielded; any pages
+    fetched ahead of it are discarded. With a scheduler, the fetches run on the
+    scheduler's shared threads and `concurrency` only bounds the look-ahead of this book.
+
+    Parameters:
+        book_id (int): The ID of the book.
+        start_page (int): The first page number to fetch.
+        max_pages (int): The last page number to fetch (None for no limit).
+        concurrency (int): The maximum number of concurrent requests (1 fetches sequentially).
+        base_url (str): The base URL of the book pages.
+        scheduler (FetchScheduler, optional): The scheduler of a batch. Defaults to None.
+
+    Yields:
+        tuple: The page number and its raw content (None if the page does not exist).
+
+    Raises:
+        PageFetchError: If a page cannot be fetched.
+    """
+    if concurrency <= 1 and scheduler is None:
+        page_number = start_page
+        while max_pages is None or page_number <= max_pages:
+            try:
+                content = fetch_page(book_id, page_number, base_url)
+            except requests.RequestException as e:
+                raise PageFetchError(page_number, e) from e
+            yield page_number, content
+            page_number += 1
+        return
+
+    window = max(concurrency, 1) * 2
+    executor = ThreadPoolExecutor(max_workers=concurrency) if scheduler is None else scheduler
+    pending = deque()
+    next_page = start_page
+    try:
+        while True:
+            while len(pending) < window and (max_pages is None or next_page <= max_pages):
+                future = executor.submit(fetch_page, book_id, next_page, base_url, scheduler)
+                pending.append((next_page, future))
+                next_page += 1
+
+            if not pending:
+                return
+
+            page_number, future = pending.popleft()
+            try:
+                content = future.result()
+            except requests.RequestException as e:
+                raise PageFetchError(page_number, e) from e
+            yield page_number, content
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if scheduler is None:
+            executor.shutdown(wait=True)
@@ -1,12 +1,16 @@
 """
 Utility functions for handling file operations related to book scraping and processing.
 
-This module provides functions for creating directories, saving text in different formats
-(txt, pdf, docx), and logging the operations.
+This module provides functions for creating directories, writing files atomically,
+saving text in different formats (txt, pdf, docx), streaming chapters to disk, and
+logging the operations.
 """
 
 import os
 import logging
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
 from docx import Document
 from fpdf import FPDF
 from config import BOOKS_DIRECTORY
@@ -32,6 +36,28 @@ def create_book_directory(book_id):
         raise
     return directory
 
+def atomic_write(path, data):
+    """
+    Writes data to a file atomically, so concurrent readers never see a partial file.
+
+    Parameters:
+        path (str): The destination path.
+        data (bytes): The data to write.
+
+    Returns:
+        None
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
 def save_file(directory, filename, text, file_format='txt'):
     """
     Saves text to a file in the specified format.
@@ -103,3 +129,182 @@ def save_as_docx(file_path, text):
     except Exception as e:  # pylint: disable=broad-except
         logger.error("Failed to save DOCX %s: %s", file_path, e)
         raise
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+    'relationships/officeDocument" Target="word/document.xml"/>'
+    '</Relationships>'
+)
+DOCX_DOCUMENT_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:body>'
+)
+DOCX_DOCUMENT_END = '<w:sectPr/></w:body></w:document>'
+
+def stream_docx(lines, file_path):
+    """
+    Writes lines of text to a DOCX file one paragraph at a time.
+
+    The document part is streamed into the archive as the lines are read, so the
+    whole text never has to be held in memory.
+
+    Parameters:
+        lines (iterable): The lines of text, one paragraph each.
+        file_path (str): The path to save the DOCX file.
+
+    Returns:
+        None
+    """
+    with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', DOCX_RELATIONSHIPS)
+        with archive.open('word/document.xml', 'w') as document:
+            document.write(DOCX_DOCUMENT_START.encode('utf-8'))
+            for line in lines:
+                text = escape(line.rstrip('\n'))
+                paragraph = f'<w:p><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>'
+                document.write(paragraph.encode('utf-8'))
+            document.write(DOCX_DOCUMENT_END.encode('utf-8'))
+
+def finalize_chapter(spool_path, file_path, file_format='txt'):
+    """
+    Converts the spool file of a chapter into its final file.
+
+    The final file is written next to its destination and renamed into place, so a
+    chapter file is either complete or absent. PDF output is rendered from the whole
+    text at once, since FPDF has no incremental interface.
+
+    Parameters:
+        spool_path (str): The spool file holding the chapter text.
+        file_path (str): The path of the final chapter file.
+        file_format (str): The format to save the file in ('txt', 'pdf', or 'docx').
+
+    Returns:
+        None
+    """
+    try:
+        if file_format == 'txt':
+            os.replace(spool_path, file_path)
+            logger.info("TXT file saved: %s", file_path)
+            return
+
+        tmp_path = f"{file_path}.tmp"
+        if file_format == 'docx':
+            with open(spool_path, 'r', encoding='utf-8') as spool:
+                stream_docx(spool, tmp_path)
+            logger.info("DOCX saved: %s", file_path)
+        elif file_format == 'pdf':
+            with open(spool_path, 'r', encoding='utf-8') as spool:
+                save_as_pdf(tmp_path, spool.read())
+        else:
+            logger.error("Unsupported file format: %s", file_format)
+            return
+        os.replace(tmp_path, file_path)
+        os.remove(spool_path)
+    except (OSError, IOError) as e:
+        logger.error("Failed to save file %s: %s", file_path, e)
+        raise
+
+class ChapterWriter:
+    """
+    Streams the text of a chapter to disk as pages arrive.
+
+    Text is appended to a spool file as it is produced; closing the writer converts
+    the spool into the chapter file. Memory use therefore does not depend on the
+    length of the chapter.
+
+    Attributes:
+        file_path (str): The path of the final chapter file.
+        spool_path (str): The spool file the text is appended to.
+        file_format (str): The format of the final chapter file.
+    """
+    def __init__(self, file_path, spool_path, file_format='txt', offset=None):
+        """
+        Initializes a ChapterWriter instance, opening its spool file.
+
+        Parameters:
+            file_path (str): The path of the final chapter file.
+            spool_path (str): The spool file the text is appended to.
+            file_format (str): The format of the final chapter file ('txt', 'pdf', or 'docx').
+            offset (int, optional): Reopens an existing spool file, truncated to this
+                many bytes, instead of starting an empty one. Defaults to None.
+        """
+        self.file_path = file_path
+        self.spool_path = spool_path
+        self.file_format = file_format
+        if offset is None:
+            self._file = open(spool_path, 'wb')  # pylint: disable=consider-using-with
+        else:
+            self._file = open(spool_path, 'r+b')  # pylint: disable=consider-using-with
+            self._file.truncate(offset)
+            self._file.seek(offset)
+
+    @property
+    def size(self):
+        """int: The number of bytes of text written so far."""
+        return self._file.tell()
+
+    def write(self, text):
+        """
+        Appends text to the chapter.
+
+        Parameters:
+            text (str): The text to append.
+
+        Returns:
+            None
+        """
+        self._file.write(text.encode('utf-8'))
+
+    def flush(self):
+        """
+        Flushes the text written so far to disk.
+
+        Returns:
+            int: The size of the spool file, which can be used to reopen it later.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self.size
+
+    def close(self):
+        """
+        Closes the spool file and converts it into the chapter file.
+
+        Returns:
+            None
+        """
+        self._file.close()
+        finalize_chapter(self.spool_path, self.file_path, self.file_format)
+
+    def suspend(self):
+        """
+        Closes the spool file without converting it, so the chapter can be resumed later.
+
+        Returns:
+            None
+        """
+        self._file.close()
+
+    def discard(self):
+        """
+        Closes and removes the spool file without saving the chapter.
+
+        Returns:
+            None
+        """
+        self._file.close()
+        os.remove(self.spool_path)
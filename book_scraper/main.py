@@ -4,74 +4,255 @@ from a specific website. It handles downloading the book pages,
 parsing the content, and saving the text in chunks.
 """
 
+import os
+import sys
+import argparse
 import logging
-import requests
-from scraper import scrape_page, get_li_text
-from file_utils import save_file, create_book_directory
-from config import BOOK_ID, FILE_FORMAT, MAX_PAGES
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Entry point: make the shared `common` package at the repository root importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# pylint: disable=wrong-import-position
+from scraper import parse_page, get_li_text, normalize_headings
+from fetcher import fetch_pages, PageFetchError
+from checkpoint import RunManifest
+from scheduler import FetchScheduler, BookProgress
+from file_utils import ChapterWriter, finalize_chapter, create_book_directory
+from config import (BOOK_ID, BASE_URL, FILE_FORMAT, MAX_PAGES, CONCURRENT_REQUESTS,
+                    CHECKPOINT_INTERVAL, BATCH_CONCURRENT_BOOKS, REQUESTS_PER_SECOND,
+                    MAX_CONNECTIONS_PER_HOST, PROGRESS_REPORT_INTERVAL)
+from common import metrics  # pylint: disable=import-error
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def scrape_and_chunk_book(book_id, file_format='txt'):
+def get_chapter_path(directory, li_texts, file_index, file_format):
+    """
+    Returns the path of the file of a chapter.
+
+    Parameters:
+        directory (str): The book directory.
+        li_texts (list): The chapter headings of the book.
+        file_index (int): The index of the chapter.
+        file_format (str): The format in which the chapter is saved.
+
+    Returns:
+        str: The path of the chapter file.
+    """
+    return os.path.join(directory, f"{li_texts[file_index - 1]}.{file_format}")
+
+def scrape_and_chunk_book(book_id, file_format='txt', concurrency=CONCURRENT_REQUESTS,
+                          base_url=BASE_URL, resume=False, scheduler=None):
     """
     Scrapes and chunks a book from the given book ID.
 
+    Pages are downloaded concurrently but processed strictly in page order, so the
+    chapter files are identical to those of a sequential scrape. Chapter text is
+    streamed to disk as pages arrive, and progress is checkpointed to a run manifest
+    in the book directory; if a page still cannot be fetched after all retries, the
+    run stops and can be continued with `resume=True`.
+
     Parameters:
         book_id (str): The ID of the book to scrape.
         file_format (str): The format in which to save the book content. Default is 'txt'.
+        concurrency (int): The maximum number of concurrent page requests.
+        base_url (str): The base URL of the book pages.
+        resume (bool): Whether to continue the previous run of this book.
+        scheduler (FetchScheduler, optional): The shared scheduler of a batch, which
+            also tracks the progress of the book. Defaults to None.
 
     Returns:
-        None
+        bool: True if the book was scraped to the end, False if the run was interrupted.
     """
     # Create directory for the book
     directory = create_book_directory(book_id)
-    page_number = 1
-    current_file_index = 1
+    manifest = RunManifest(directory)
+    progress = scheduler.track(book_id) if scheduler else BookProgress(book_id)
+    progress.status = 'running'
 
-    url = f"https://shamela.ws/book/{book_id}/{page_number}"
+    state = manifest.load() if resume else None
+    if state:
+        if state["completed"]:
+            logger.info("Book %s has already been scraped.", book_id)
+            progress.status = 'done'
+            return True
+        if state["file_format"] != file_format:
+            raise ValueError(f"Cannot resume a '{state['file_format']}' run as '{file_format}'.")
+        li_texts = state["li_texts"]
+        current_file_index = state["current_file_index"]
+        last_page = state["last_page"]
+        logger.info("Resuming book %s after page %d.", book_id, last_page)
 
-    li_texts = get_li_text(url)
+        for file_index, spool_path in manifest.pending_spools(current_file_index):
+            finalize_chapter(spool_path,
+                             get_chapter_path(directory, li_texts, file_index, file_format),
+                             file_format)
+        spool_path = manifest.chapter_spool_path(current_file_index)
+        offset = state["partial_bytes"] if os.path.exists(spool_path) else None
+    else:
+        li_texts = get_li_text(book_id, base_url, scheduler)
 
-    if not li_texts:
-        logger.info("No li texts found.")
-        return
-    current_file_text = ""
+        if not li_texts:
+            logger.info("No li texts found.")
+            progress.status = 'failed'
+            return False
+        manifest.start(book_id, file_format, li_texts)
+        current_file_index = 1
+        last_page = 0
+        offset = None
 
-    while True:
-        try:
-            logger.info("Page Number: %d", page_number)
+    writer = ChapterWriter(get_chapter_path(directory, li_texts, current_file_index, file_format),
+                           manifest.chapter_spool_path(current_file_index), file_format, offset)
 
-            formatted_text, new_file_index, chunk_len = scrape_page(book_id, page_number,
-                                                                    current_file_index, li_texts)
-            if formatted_text is None:
-                break
+    headings = normalize_headings(li_texts)
+    pages = fetch_pages(book_id, start_page=last_page + 1, max_pages=MAX_PAGES,
+                        concurrency=concurrency, base_url=base_url, scheduler=scheduler)
+    try:
+        with closing(pages):
+            for page_number, content in pages:
+                logger.info("Page Number: %d", page_number)
 
-            if new_file_index != current_file_index:
-                current_file_text += '\n'.join(formatted_text[:chunk_len]) + '\n'
+                formatted_text, new_file_index, chunk_len = parse_page(content, page_number,
+                                                                       current_file_index,
+                                                                       headings)
+                if formatted_text is None:
+                    break
 
-                file_name = f"{li_texts[current_file_index - 1]}.{file_format}"
-                save_file(directory, file_name, current_file_text, file_format)
+                if new_file_index != current_file_index:
+                    writer.write('\n'.join(formatted_text[:chunk_len]) + '\n')
+                    writer.flush()
 
-                current_file_index = new_file_index
-                current_file_text = "\n".join(formatted_text[chunk_len:])
-            else:
-                current_file_text += '\n'.join(formatted_text) + '\n'
+                    next_writer = ChapterWriter(
+                        get_chapter_path(directory, li_texts, new_file_index, file_format),
+                        manifest.chapter_spool_path(new_file_index), file_format)
+                    next_writer.write("\n".join(formatted_text[chunk_len:]))
+                    manifest.checkpoint(page_number, new_file_index, next_writer.flush())
 
-            if MAX_PAGES and page_number >= MAX_PAGES:
-                logger.info("Reached maximum pages limit: %d", MAX_PAGES)
-                break
-            page_number += 1
+                    # Switch to the new chapter before closing the old one, so an interrupt
+                    # saves the checkpoint above; a resumed run finalizes the old spool
+                    previous_writer = writer
+                    writer = next_writer
+                    current_file_index = new_file_index
+                    last_page = page_number
+                    previous_writer.close()
+                    progress.chapters += 1
+                else:
+                    writer.write('\n'.join(formatted_text) + '\n')
+                    if page_number % CHECKPOINT_INTERVAL == 0:
+                        manifest.checkpoint(page_number, current_file_index, writer.flush())
 
-        except requests.RequestException as e:
-            logger.error("Error fetching page %d: %s", page_number, e)
-            break
+                last_page = page_number
+                progress.last_page = page_number
+                progress.pages += 1
+
+                if MAX_PAGES and page_number >= MAX_PAGES:
+                    logger.info("Reached maximum pages limit: %d", MAX_PAGES)
+    except PageFetchError as e:
+        logger.error("%s", e)
+        manifest.checkpoint(last_page, current_file_index, writer.flush())
+        writer.suspend()
+        logger.error("Scrape of book %s interrupted; rerun with --resume to continue.", book_id)
+        progress.status = 'interrupted'
+        return False
+    except KeyboardInterrupt:
+        manifest.checkpoint(last_page, current_file_index, writer.flush())
+        writer.suspend()
+        raise
+
+    if writer.size:
+        writer.close()
+        progress.chapters += 1
+    else:
+        writer.discard()
+    manifest.complete()
+    progress.status = 'done'
+    return True
+
+def scrape_books(book_ids, file_format='txt', resume=False, base_url=BASE_URL):
+    """
+    Scrapes many books through one shared scheduler.
+
+    Up to BATCH_CONCURRENT_BOOKS books are scraped at once. Their page fetches share
+    one pool of connections, limited to REQUESTS_PER_SECOND requests per second in
+    total and MAX_CONNECTIONS_PER_HOST concurrent requests per host. Aggregate
+    progress is logged every PROGRESS_REPORT_INTERVAL seconds.
+
+    Parameters:
+        book_ids (list): The IDs of the books to scrape.
+        file_format (str): The format in which to save the book content. Default is 'txt'.
+        resume (bool): Whether to continue the previous run of each book.
+        base_url (str): The base URL of the book pages.
 
-    if current_file_text:
-        file_name = f"{li_texts[current_file_index - 1]}.{file_format}"
-        save_file(directory, file_name, current_file_text, file_format)
+    Returns:
+        dict: The BookProgress of every book, keyed by book ID.
+    """
+    scheduler = FetchScheduler(max_workers=BATCH_CONCURRENT_BOOKS * CONCURRENT_REQUESTS,
+                               requests_per_second=REQUESTS_PER_SECOND,
+                               max_connections_per_host=MAX_CONNECTIONS_PER_HOST)
+    for book_id in book_ids:
+        scheduler.track(book_id)
+
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENT_BOOKS) as books_executor:
+        futures = {
+            books_executor.submit(scrape_and_chunk_book, book_id, file_format,
+                                  base_url=base_url, resume=resume, scheduler=scheduler): book_id
+            for book_id in book_ids
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=PROGRESS_REPORT_INTERVAL)
+            for future in done:
+                if future.exception() is not None:
+                    logger.error("Scrape of book %s failed: %s", futures[future],
+                                 future.exception())
+                    scheduler.track(futures[future]).status = 'failed'
+            scheduler.report()
+
+    scheduler.shutdown()
+    return scheduler.books
+
+def read_book_ids(path):
+    """
+    Reads book IDs from a file, one per line; blank lines and '#' comments are ignored.
+
+    Parameters:
+        path (str): The path of the book list.
+
+    Returns:
+        list: The book IDs.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        lines = (line.split('#', 1)[0].strip() for line in file)
+        return [int(line) for line in lines if line]
+
+def parse_args():
+    """
+    Parses the command-line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Scrape a book and save it in chapters.")
+    parser.add_argument('--book-id', type=int, default=BOOK_ID,
+                        help="The ID of the book to scrape.")
+    parser.add_argument('--book-ids', type=int, nargs='+',
+                        help="Scrape several books in one batch.")
+    parser.add_argument('--book-list',
+                        help="Scrape the books listed in a file, one ID per line, in one batch.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the previous run of each book from its last checkpoint.")
+    return parser.parse_args()
 
 # Main entry point
 if __name__ == "__main__":
-    scrape_and_chunk_book(BOOK_ID, FILE_FORMAT)
+    args = parse_args()
+    metrics.configure_from_env()
+    if args.book_ids or args.book_list:
+        batch = list(args.book_ids or [])
+        if args.book_list:
+            batch.extend(read_book_ids(args.book_list))
+        scrape_books(batch, FILE_FORMAT, resume=args.resume)
+    else:
+        scrape_and_chunk_book(args.book_id, FILE_FORMAT, resume=args.resume)
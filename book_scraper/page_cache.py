@@ -0,0 +1,87 @@
+"""
+This module provides an on-disk cache of raw book pages.
+
+Page HTML is stored compressed and content-addressed: each distinct page body is
+written once under the SHA-256 of its content, and a small reference file maps
+the host, book ID and page number to that digest, so pages of different servers
+never stand in for each other. Re-running the scraper (for example
+after a parser fix or with a different file format) then re-parses pages from
+local disk instead of downloading the book again.
+"""
+
+import os
+import gzip
+import hashlib
+import logging
+from urllib.parse import urlsplit
+from file_utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+class PageCache:
+    """
+    A compressed, content-addressed cache of raw page HTML.
+
+    Attributes:
+        directory (str): The root directory of the cache.
+    """
+    def __init__(self, directory):
+        """
+        Initializes a PageCache instance.
+
+        Parameters:
+            directory (str): The root directory of the cache.
+        """
+        self.directory = directory
+
+    def _ref_path(self, book_id, page_number, base_url):
+        host = urlsplit(base_url).netloc.replace(':', '_')
+        return os.path.join(self.directory, 'refs', host, str(book_id), str(page_number))
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], f"{digest}.html.gz")
+
+    def get(self, book_id, page_number, base_url):
+        """
+        Retrieves the cached content of a page.
+
+        Parameters:
+            book_id (int): The ID of the book.
+            page_number (int): The page number.
+            base_url (str): The base URL the page is downloaded from.
+
+        Returns:
+            bytes: The raw page content, or None if the page is not cached.
+        """
+        try:
+            with open(self._ref_path(book_id, page_number, base_url), 'r',
+                      encoding='utf-8') as ref:
+                digest = ref.read().strip()
+            with gzip.open(self._object_path(digest), 'rb') as blob:
+                return blob.read()
+        except (OSError, EOFError):
+            return None
+
+    def put(self, book_id, page_number, content, base_url):
+        """
+        Stores the content of a page in the cache.
+
+        Parameters:
+            book_id (int): The ID of the book.
+            page_number (int): The page number.
+            content (bytes): The raw page content.
+            base_url (str): The base URL the page was downloaded from.
+
+        Returns:
+            str: The SHA-256 digest under which the content is stored.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+        try:
+            if not os.path.exists(object_path):
+                atomic_write(object_path, gzip.compress(content))
+            atomic_write(self._ref_path(book_id, page_number, base_url),
+                         digest.encode('ascii'))
+        except OSError as e:
+            logger.warning("Failed to cache page %d of book %s: %s", page_number, book_id, e)
+        return digest
@@ -0,0 +1,212 @@
+"""
+This module provides the shared scheduler used to scrape many books at once.
+
+All books in a batch fetch their pages through one scheduler, which owns the pool
+of fetch threads, enforces a global request-rate limit and a per-host connection
+limit, and tracks the progress of every book to report aggregate throughput.
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """
+    A thread-safe token bucket limiting how many requests start per second.
+
+    Attributes:
+        rate (float): The sustained number of requests per second.
+        capacity (float): The largest burst of requests allowed at once.
+    """
+    def __init__(self, rate, burst=None):
+        """
+        Initializes a RateLimiter instance.
+
+        Parameters:
+            rate (float): The sustained number of requests per second.
+            burst (float, optional): The largest burst allowed. Defaults to one second
+                worth of requests.
+        """
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a request may start.
+
+        Returns:
+            None
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class BookProgress:
+    """
+    The progress of one book in a batch.
+
+    Attributes:
+        book_id (int): The ID of the book.
+        status (str): 'queued', 'running', 'done', 'interrupted' or 'failed'.
+        pages (int): The number of pages processed in this run.
+        last_page (int): The last page processed.
+        chapters (int): The number of chapter files written in this run.
+    """
+    def __init__(self, book_id):
+        """
+        Initializes a BookProgress instance.
+
+        Parameters:
+            book_id (int): The ID of the book.
+        """
+        self.book_id = book_id
+        self.status = 'queued'
+        self.pages = 0
+        self.last_page = 0
+        self.chapters = 0
+
+class FetchScheduler:
+    """
+    Schedules page fetches of many books over shared, rate-limited connections.
+
+    Attributes:
+        executor (ThreadPoolExecutor): The pool of fetch threads shared by all books.
+        rate_limiter (RateLimiter): The global request-rate limit, or None for no limit.
+        max_connections_per_host (int): The maximum number of concurrent requests per host.
+        books (dict): The BookProgress of every tracked book, keyed by book ID.
+    """
+    def __init__(self, max_workers, requests_per_second=None, max_connections_per_host=8):
+        """
+        Initializes a FetchScheduler instance.
+
+        Parameters:
+            max_workers (int): The number of fetch threads shared by all books.
+            requests_per_second (float, optional): The global request-rate limit.
+                Defaults to None (no limit).
+            max_connections_per_host (int): The maximum number of concurrent requests per host.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+        self.max_connections_per_host = max_connections_per_host
+        self.books = {}
+        self.requests = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedules a fetch on the shared pool of fetch threads.
+
+        Parameters:
+            fn (callable): The function to run.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            Future: The future of the scheduled call.
+        """
+        return self.executor.submit(fn, *args, **kwargs)
+
+    @contextmanager
+    def request_slot(self, url):
+        """
+        Waits for a connection slot on the host of a URL and for the rate limit.
+
+        Every request is counted, including those that fail and are retried.
+
+        Parameters:
+            url (str): The URL about to be requested.
+
+        Yields:
+            None
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            slots = self._host_slots.get(host)
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.max_connections_per_host)
+                self._host_slots[host] = slots
+        with slots:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.requests += 1
+
+    def record_download(self, size):
+        """
+        Records the size of a downloaded page.
+
+        Parameters:
+            size (int): The number of bytes downloaded.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.bytes += size
+
+    def track(self, book_id):
+        """
+        Returns the progress record of a book, creating it if needed.
+
+        Parameters:
+            book_id (int): The ID of the book.
+
+        Returns:
+            BookProgress: The progress of the book.
+        """
+        with self._lock:
+            if book_id not in self.books:
+                self.books[book_id] = BookProgress(book_id)
+            return self.books[book_id]
+
+    def report(self):
+        """
+        Logs the aggregate progress and throughput of the batch.
+
+        Returns:
+            None
+        """
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        books = list(self.books.values())
+        statuses = {}
+        for progress in books:
+            statuses[progress.status] = statuses.get(progress.status, 0) + 1
+        pages = sum(progress.pages for progress in books)
+        logger.info("Books: %s | %d pages (%.1f pages/s) | %d requests (%.1f req/s, %.1f KB/s)",
+                    ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())),
+                    pages, pages / elapsed, self.requests, self.requests / elapsed,
+                    self.bytes / elapsed / 1024)
+        for progress in books:
+            if progress.status == 'running':
+                logger.info("  Book %s: page %d, %d pages, %d chapters", progress.book_id,
+                            progress.last_page, progress.pages, progress.chapters)
+
+    def shutdown(self):
+        """
+        Stops the fetch threads once pending fetches have finished.
+
+        Returns:
+            None
+        """
+        self.executor.shutdown(wait=True)
@@ -4,15 +4,62 @@ The text is extracted from specific HTML elements and cleaned of certain charact
 """
 
 import re
+import time
 import logging
+import threading
+from contextlib import nullcontext
 import requests
-from bs4 import BeautifulSoup
-from config import BASE_URL
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from page_cache import PageCache
+from config import (BASE_URL, CONCURRENT_REQUESTS, PAGE_CACHE_DIRECTORY, USE_PAGE_CACHE,
+                    RETRIES, RETRY_BACKOFF, HTML_PARSER, MAX_CONNECTIONS_PER_HOST)
+from common import metrics  # pylint: disable=import-error
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Precompiled normalization patterns used in the per-paragraph hot loop
+TASHKEEL_PATTERN = re.compile(r'[\u0617-\u061A\u064B-\u0652\[\]]')
+LEADING_HYPHENS_PATTERN = re.compile(r'^-+')
+
+# Locates the opening tag of the content div, so only the page body is parsed
+CONTENT_DIV_PATTERN = re.compile(rb'<div[^>]*class=["\']nass margin-top-10["\']')
+CONTENT_STRAINER = SoupStrainer("div", class_="nass margin-top-10")
+
+# Finds the charset declared in a <meta> tag, which slicing at the content div cuts off
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]*charset=["\']?([\w-]+)', re.IGNORECASE)
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+page_cache = PageCache(PAGE_CACHE_DIRECTORY) if USE_PAGE_CACHE else None
+
+def get_session():
+    """
+    Returns the shared HTTP session used for all page requests.
+
+    The session keeps connections alive and pools up to CONCURRENT_REQUESTS (or
+    MAX_CONNECTIONS_PER_HOST in batch mode) connections per host, so concurrent
+    fetches reuse TCP/TLS connections.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session  # pylint: disable=global-statement
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            pool_size = max(CONCURRENT_REQUESTS, MAX_CONNECTIONS_PER_HOST)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
 def extract_text_with_spans(p_tag):
     """
     Extracts text from <span> tags within a <p> tag and formats it.
@@ -35,54 +82,179 @@ def extract_text_with_spans(p_tag):
                 formatted_text.append(normal_text)
     return ''.join(formatted_text)
 
-def scrape_page(book_id, page_number, current_file_index, li_texts):
+def fetch_page(book_id, page_number, base_url=BASE_URL, scheduler=None):
     """
-    Scrapes a specific page of a book and processes the text.
+    Downloads the raw HTML of a specific page of a book.
+
+    The page is served from the page cache when available; otherwise it is
+    downloaded over the shared session and stored in the cache. Connection errors,
+    timeouts and transient HTTP errors are retried up to RETRIES times with
+    exponential backoff. A missing page (HTTP 404) marks the end of the book.
 
     Parameters:
         book_id (int): The ID of the book.
-        page_number (int): The page number to scrape.
-        current_file_index (int): The current file index for text chunking.
-        li_texts (list): List of text items to match against.
-        retries (int): Number of retry attempts for failed requests.
+        page_number (int): The page number to download.
+        base_url (str): The base URL of the book pages.
+        scheduler (FetchScheduler, optional): Rate-limits the requests and counts
+            the downloads of a batch. Defaults to None.
 
     Returns:
-        tuple: Formatted text, updated file index, and chunk length.
-    """
-    url = f"{BASE_URL}/{book_id}/{page_number}"
+        bytes: The raw page content, or None if the page does not exist.
 
-    response = requests.get(url, timeout=10)
+    Raises:
+        requests.RequestException: If the request still fails after all retries.
+    """
+    if page_cache is not None:
+        content = page_cache.get(book_id, page_number, base_url)
+        if content is not None:
+            metrics.increment("scraper_pages_total", source="cache")
+            return content
+
+    url = f"{base_url}/{book_id}/{page_number}"
+
+    attempt = 0
+    while True:
+        try:
+            with scheduler.request_slot(url) if scheduler else nullcontext():
+                with metrics.timer("scraper_page_fetch_seconds"):
+                    response = get_session().get(url, timeout=10)
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+            error = requests.HTTPError(f"{response.status_code} Error for url: {url}",
+                                       response=response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        if attempt >= RETRIES:
+            raise error
+        delay = RETRY_BACKOFF * 2 ** attempt
+        attempt += 1
+        metrics.increment("scraper_fetch_retries_total")
+        logger.warning("Retrying page %d in %.1fs (attempt %d of %d): %s",
+                       page_number, delay, attempt, RETRIES, error)
+        time.sleep(delay)
+
+    if response.status_code == 404:
+        logger.info("Page %d not found, end of book reached.", page_number)
+        metrics.increment("scraper_pages_total", source="missing")
+        return None
     response.raise_for_status()
 
     if response.status_code == 200:
-        soup = BeautifulSoup(response.content, "html.parser")
-        text_div = soup.find("div", class_="nass margin-top-10")
+        metrics.increment("scraper_pages_total", source="network")
+        metrics.increment("scraper_downloaded_bytes_total", len(response.content))
+        if scheduler is not None:
+            scheduler.record_download(len(response.content))
+        if page_cache is not None:
+            page_cache.put(book_id, page_number, response.content, base_url)
+        return response.content
 
-        if text_div:
-            paragraphs = text_div.find_all("p")
-            formatted_text = []
-            chunk_len = 0
+    logger.error("Failed to retrieve page %d .", page_number)
+    return None
 
-            for p in paragraphs:
-                text_with_spans = extract_text_with_spans(p)
-                text_with_spans = remove_tashkeel(text_with_spans)
+def normalize_headings(li_texts):
+    """
+    Precomputes the normalized form of every chapter heading.
 
-                if text_with_spans == f'"{clean_text(li_texts[current_file_index])}"':
-                    current_file_index += 1
-                    chunk_len = len(formatted_text)
-                    logger.info("Match found: %s vs %s", text_with_spans,
-                                f'"{clean_text(li_texts[current_file_index])}"')
+    A chapter starts at the paragraph whose text equals the quoted, cleaned heading,
+    so the comparison string of each heading is built once per book instead of once
+    per paragraph.
 
-                formatted_text.append(text_with_spans)
+    Parameters:
+        li_texts (list): The chapter headings extracted by get_li_text.
 
-            return formatted_text, current_file_index, chunk_len
+    Returns:
+        tuple: The normalized headings, indexed like li_texts.
+    """
+    return tuple(f'"{clean_text(li_text)}"' for li_text in li_texts)
 
-        logger.warning("Text div not found on page %d.", page_number)
+def extract_content_div(content):
+    """
+    Parses only the content div of a book page.
+
+    The raw HTML is sliced to start at the opening tag of the content div, and a
+    strainer keeps the parser from building a tree for anything else on the page.
+    The slice is decoded with the charset declared in the page's <meta> tag, or as
+    UTF-8 if the page declares none, since the tag is not part of the slice.
+
+    Parameters:
+        content (bytes): The raw page content.
+
+    Returns:
+        Tag: The content div, or None if the page has none.
+    """
+    encoding = None
+    match = CONTENT_DIV_PATTERN.search(content)
+    if match:
+        charset = META_CHARSET_PATTERN.search(content, 0, match.start())
+        encoding = charset.group(1).decode('ascii') if charset else 'utf-8'
+        content = content[match.start():]
+    soup = BeautifulSoup(content, HTML_PARSER, parse_only=CONTENT_STRAINER,
+                         from_encoding=encoding)
+    return soup.find("div", class_="nass margin-top-10")
+
+def parse_page(content, page_number, current_file_index, headings):
+    """
+    Processes the raw HTML of a book page into formatted paragraphs.
+
+    Parameters:
+        content (bytes): The raw page content returned by fetch_page.
+        page_number (int): The page number, used for logging.
+        current_file_index (int): The current file index for text chunking.
+        headings (tuple): The chapter headings as returned by normalize_headings.
+
+    Returns:
+        tuple: Formatted text, updated file index, and chunk length.
+    """
+    if content is None:
         return None, None, None
 
-    logger.error("Failed to retrieve page %d .", page_number)
+    with metrics.timer("scraper_page_parse_seconds"):
+        return _parse_content(content, page_number, current_file_index, headings)
+
+def _parse_content(content, page_number, current_file_index, headings):
+    text_div = extract_content_div(content)
+
+    if text_div:
+        paragraphs = text_div.find_all("p")
+        formatted_text = []
+        chunk_len = 0
+        next_heading = headings[current_file_index] if current_file_index < len(headings) else None
+
+        for p in paragraphs:
+            text_with_spans = remove_tashkeel(extract_text_with_spans(p))
+
+            if text_with_spans == next_heading:
+                current_file_index += 1
+                chunk_len = len(formatted_text)
+                next_heading = (headings[current_file_index]
+                                if current_file_index < len(headings) else None)
+                logger.info("Match found: %s vs %s", text_with_spans, next_heading)
+
+            formatted_text.append(text_with_spans)
+
+        return formatted_text, current_file_index, chunk_len
+
+    logger.warning("Text div not found on page %d.", page_number)
     return None, None, None
 
+def scrape_page(book_id, page_number, current_file_index, li_texts, base_url=BASE_URL):
+    """
+    Scrapes a specific page of a book and processes the text.
+
+    Parameters:
+        book_id (int): The ID of the book.
+        page_number (int): The page number to scrape.
+        current_file_index (int): The current file index for text chunking.
+        li_texts (list): List of text items to match against.
+        base_url (str): The base URL of the book pages.
+
+    Returns:
+        tuple: Formatted text, updated file index, and chunk length.
+    """
+    content = fetch_page(book_id, page_number, base_url)
+    return parse_page(content, page_number, current_file_index, normalize_headings(li_texts))
+
 def extract_li_text(soup):
     """
     Extracts text from list items within the specified navigation div.
@@ -110,28 +282,29 @@ def extract_li_text(soup):
 
     return li_texts
 
-def get_li_text(url):
+def get_li_text(book_id, base_url=BASE_URL, scheduler=None):
     """
-    Retrieves and extracts list item texts from a given URL.
+    Retrieves and extracts the list item texts from the first page of a book.
 
     Parameters:
-        url (str): The URL to fetch and parse.
+        book_id (int): The ID of the book.
+        base_url (str): The base URL of the book pages.
+        scheduler (FetchScheduler, optional): The scheduler of a batch. Defaults to None.
 
     Returns:
         list: A list of extracted text items from the <li> tags.
     """
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        content = fetch_page(book_id, 1, base_url, scheduler)
 
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, "html.parser")
+        if content is not None:
+            soup = BeautifulSoup(content, "html.parser")
             li_texts = extract_li_text(soup)
 
             if li_texts:
                 return li_texts
     except requests.RequestException as e:
-        logger.error("Error fetching URL %s: %s", url, e)
+        logger.error("Error fetching book %s: %s", book_id, e)
     return []
 
 def remove_tashkeel(text):
@@ -144,7 +317,7 @@ def remove_tashkeel(text):
     Returns:
         str: The cleaned text without tashkeel.
     """
-    return re.sub(r'[\u0617-\u061A\u064B-\u0652\[\]]', '', text).strip()
+    return TASHKEEL_PATTERN.sub('', text).strip()
 
 def clean_text(text):
     """
@@ -156,4 +329,4 @@ def clean_text(text):
     Returns:
         str: The cleaned text without leading hyphens.
     """
-    return re.sub(r'^-+', '', text).strip()
+    return LEADING_HYPHENS_PATTERN.sub('', text).strip()
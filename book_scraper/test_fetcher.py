@@ -0,0 +1,141 @@
+"""
+Tests of the concurrent page fetcher against a local stand-in for the book site.
+
+Fixture pages are served by http.server on a free local port, so the tests need no
+network. Run them from this directory with `python -m unittest test_fetcher`.
+"""
+
+import os
+import re
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+# Entry point: make the shared `common` package at the repository root importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# pylint: disable=wrong-import-position
+import file_utils
+import scraper
+from fetcher import fetch_pages
+from main import scrape_and_chunk_book
+
+BOOK_ID = 4242
+HEADINGS = ["مقدمة", "الباب الأول", "الباب الثاني", "الباب الثالث"]
+PAGE_COUNT = 30
+
+def build_page(page_number):
+    """
+    Builds the HTML of a fixture page, with the chapter list on every page and a
+    chapter heading on some pages.
+
+    Parameters:
+        page_number (int): The page number.
+
+    Returns:
+        bytes: The page HTML.
+    """
+    nav = ''.join(f'<li><a href="#">{heading}</a></li>' for heading in HEADINGS)
+    paragraphs = []
+    if page_number % 8 == 0 and page_number // 8 < len(HEADINGS):
+        paragraphs.append(f'<p><span>{HEADINGS[page_number // 8]}</span></p>')
+    for line in range(5):
+        paragraphs.append(f'<p>صفحة {page_number} سطر {line} <span>قال</span> تَعْلِيق</p>')
+    return (f'<html><head><meta charset="utf-8"></head><body>'
+            f'<div class="s-nav"><ul>{nav}</ul></div>'
+            f'<div class="nass margin-top-10">{"".join(paragraphs)}</div>'
+            f'</body></html>').encode('utf-8')
+
+class BookHandler(BaseHTTPRequestHandler):
+    """
+    Serves the fixture pages of the book at /book/<book id>/<page>, and 404 after
+    the last page.
+    """
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Serves a fixture page.
+        """
+        match = re.fullmatch(rf'/book/{BOOK_ID}/(\d+)', self.path)
+        if not match or not 1 <= int(match.group(1)) <= PAGE_COUNT:
+            self.send_error(404)
+            return
+        body = build_page(int(match.group(1)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+class FetcherTest(unittest.TestCase):
+    """
+    Scrapes the fixture book from a local server at different concurrencies.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), BookHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}/book"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = mock.patch.object(scraper, 'page_cache', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scrape(self, concurrency):
+        """
+        Scrapes the fixture book into a directory of its own.
+
+        Parameters:
+            concurrency (int): The maximum number of concurrent requests.
+
+        Returns:
+            dict: The content of every chapter file, by file name.
+        """
+        books_directory = os.path.join(self.directory, str(concurrency))
+        with mock.patch.object(file_utils, 'BOOKS_DIRECTORY', books_directory):
+            self.assertTrue(scrape_and_chunk_book(BOOK_ID, 'txt', concurrency=concurrency,
+                                                  base_url=self.base_url))
+        book_directory = os.path.join(books_directory, str(BOOK_ID))
+        chapters = {}
+        for filename in os.listdir(book_directory):
+            if not filename.startswith('.'):
+                with open(os.path.join(book_directory, filename), 'rb') as file:
+                    chapters[filename] = file.read()
+        return chapters
+
+    def test_concurrent_scrape_matches_sequential(self):
+        sequential = self.scrape(1)
+        self.assertEqual(sorted(sequential), sorted(f"{heading}.txt" for heading in HEADINGS))
+        self.assertEqual(self.scrape(8), sequential)
+
+    def test_missing_page_ends_book(self):
+        for concurrency in (1, 8):
+            pages = []
+            with closing(fetch_pages(BOOK_ID, concurrency=concurrency,
+                                     base_url=self.base_url)) as fetched:
+                for page_number, content in fetched:
+                    pages.append(page_number)
+                    if content is None:
+                        break
+            self.assertEqual(pages, list(range(1, PAGE_COUNT + 2)))
+
+        chapters = self.scrape(8)
+        last_chapter = chapters[f"{HEADINGS[-1]}.txt"].decode('utf-8')
+        self.assertIn(f"صفحة {PAGE_COUNT} سطر 4", last_chapter)
+
+if __name__ == '__main__':
+    unittest.main()
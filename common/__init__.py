@@ -0,0 +1,3 @@
+"""
+Code shared by the scraper, the ingestion pipeline and the query app.
+"""
@@ -0,0 +1,378 @@
+"""
+This module records the timings and counters of the scraper, the ingestion pipeline
+and the query app, and exports them for monitoring.
+
+Entry points configure instrumentation from environment variables by calling
+configure_from_env, and it is disabled unless METRICS is set:
+
+    METRICS       Comma-separated outputs: 'jsonl' appends every observation to a
+                  JSON-lines file, and 'prometheus' serves the totals in the Prometheus
+                  text format over HTTP. Unset or empty disables instrumentation.
+    METRICS_FILE  The JSON-lines file (default 'metrics.jsonl').
+    METRICS_HOST  The address of the Prometheus endpoint (default 127.0.0.1).
+    METRICS_PORT  The port of the Prometheus endpoint (default 9100).
+
+Worker processes, which import the modules of their parent, are never configured, so
+only one process per program binds the Prometheus port.
+
+While disabled, increment, observe and timer return at once, so instrumented code
+costs no more than a function call. Counters are named with a '_total' suffix and
+timers with a '_seconds' suffix; timers are exported as Prometheus histograms.
+
+Usage:
+    from common import metrics
+
+    metrics.configure_from_env()
+    with metrics.timer("scraper_page_fetch_seconds"):
+        ...
+    metrics.increment("scraper_pages_total", source="network")
+"""
+
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+import multiprocessing
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds, in seconds, of the histogram buckets of timers
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+# The timer returned while instrumentation is disabled
+_NULL_TIMER = nullcontext()
+
+logger = logging.getLogger(__name__)
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+class MetricsRegistry:
+    """
+    Aggregates counters and timers, and writes every observation to a JSON-lines file.
+
+    Attributes:
+        file_path (str): The JSON-lines file, or None.
+    """
+    def __init__(self, file_path=None):
+        """
+        Initializes a MetricsRegistry instance.
+
+        Parameters:
+            file_path (str, optional): The JSON-lines file observations are appended
+                to. Defaults to None (observations are only aggregated).
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+        self._file = (open(file_path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+                      if file_path else None)
+
+    def _write(self, kind, name, value, labels):
+        self._file.write(json.dumps({"time": time.time(), "pid": os.getpid(), "type": kind,
+                                     "metric": name, "value": value, "labels": dict(labels)},
+                                    ensure_ascii=False) + "\n")
+
+    def increment(self, name, value=1, labels=None):
+        """
+        Adds to a counter.
+
+        Parameters:
+            name (str): The name of the counter.
+            value (float): The amount added. Defaults to 1.
+            labels (dict, optional): The labels of the counter. Defaults to None.
+
+        Returns:
+            None
+        """
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            if self._file is not None:
+                self._write("counter", name, value, key[1])
+
+    def observe(self, name, seconds, labels=None):
+        """
+        Records the duration of an operation in a timer.
+
+        Parameters:
+            name (str): The name of the timer.
+            seconds (float): The duration.
+            labels (dict, optional): The labels of the timer. Defaults to None.
+
+        Returns:
+            None
+        """
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = [0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if self._file is not None:
+                self._write("timer", name, seconds, key[1])
+
+    def render_prometheus(self):
+        """
+        Renders the counters and timers in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics.
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timers = sorted((key, (count, total, list(buckets)))
+                            for key, (count, total, buckets) in self._timers.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), (count, total, buckets) in timers:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """
+        Flushes the JSON-lines file.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        """
+        Closes the JSON-lines file.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class Timer:
+    """
+    Times the block it is used around and records the duration in a timer.
+    """
+    def __init__(self, registry, name, labels):
+        """
+        Initializes a Timer instance.
+
+        Parameters:
+            registry (MetricsRegistry): The registry the duration is recorded in.
+            name (str): The name of the timer.
+            labels (dict): The labels of the timer.
+        """
+        self._registry = registry
+        self._name = name
+        self._labels = labels
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._registry.observe(self._name, time.perf_counter() - self._start, self._labels)
+        return False
+
+def start_http_server(registry, port, host="127.0.0.1"):
+    """
+    Serves the metrics of a registry in the Prometheus text format, in a daemon thread.
+
+    Parameters:
+        registry (MetricsRegistry): The registry.
+        port (int): The port to listen on.
+        host (str): The address to listen on. Defaults to 127.0.0.1.
+
+    Returns:
+        ThreadingHTTPServer: The server.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """
+        Answers GET /metrics with the metrics of the registry.
+        """
+        def do_GET(self):  # pylint: disable=invalid-name
+            """
+            Sends the metrics.
+            """
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+_registry = None
+_server = None
+_configured_from_env = False
+
+def configure(outputs=(), file_path="metrics.jsonl", port=9100, host="127.0.0.1", serve=True):
+    """
+    Enables or disables instrumentation, replacing the previous configuration.
+
+    If the Prometheus endpoint cannot be started, e.g. because its port is taken, a
+    warning is logged and the other outputs are kept.
+
+    Parameters:
+        outputs (iterable): The outputs: 'jsonl' and/or 'prometheus'. Instrumentation
+            is disabled if there are none. Defaults to ().
+        file_path (str): The JSON-lines file. Defaults to 'metrics.jsonl'.
+        port (int): The port of the Prometheus endpoint. Defaults to 9100.
+        host (str): The address of the Prometheus endpoint. Defaults to 127.0.0.1.
+        serve (bool): Whether to start the Prometheus endpoint; programs that serve
+            render_prometheus themselves pass False. Defaults to True.
+
+    Returns:
+        MetricsRegistry: The registry, or None if instrumentation is disabled.
+
+    Raises:
+        ValueError: If an output is unknown.
+    """
+    global _registry, _server  # pylint: disable=global-statement
+    outputs = set(outputs)
+    unknown = outputs - {"jsonl", "prometheus"}
+    if unknown:
+        raise ValueError(f"Unsupported metrics outputs: {', '.join(sorted(unknown))}")
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+    if _registry is not None:
+        _registry.close()
+        _registry = None
+    if not outputs:
+        return None
+
+    registry = MetricsRegistry(file_path if "jsonl" in outputs else None)
+    if "prometheus" in outputs and serve:
+        try:
+            _server = start_http_server(registry, port, host)
+        except OSError as e:
+            logger.warning("Could not serve metrics on %s:%d (%s); Prometheus export is "
+                           "disabled.", host, port, e)
+    _registry = registry
+    return registry
+
+def configure_from_env(serve=True):
+    """
+    Configures instrumentation from the METRICS environment variables, once per
+    process. Worker processes are left unconfigured.
+
+    Parameters:
+        serve (bool): Whether to start the Prometheus endpoint (see configure).
+            Defaults to True.
+
+    Returns:
+        MetricsRegistry: The registry, or None if instrumentation is disabled.
+
+    Raises:
+        ValueError: If an output is unknown.
+    """
+    global _configured_from_env  # pylint: disable=global-statement
+    if _configured_from_env or multiprocessing.parent_process() is not None:
+        return _registry
+    _configured_from_env = True
+    outputs = [output.strip() for output in os.getenv("METRICS", "").split(",")
+               if output.strip()]
+    return configure(outputs, os.getenv("METRICS_FILE", "metrics.jsonl"),
+                     int(os.getenv("METRICS_PORT", "9100")),
+                     os.getenv("METRICS_HOST", "127.0.0.1"), serve)
+
+def get_registry():
+    """
+    Returns the registry metrics are recorded in.
+
+    Returns:
+        MetricsRegistry: The registry, or None if instrumentation is disabled.
+    """
+    return _registry
+
+def increment(name, value=1, **labels):
+    """
+    Adds to a counter, if instrumentation is enabled.
+
+    Parameters:
+        name (str): The name of the counter.
+        value (float): The amount added. Defaults to 1.
+        **labels: The labels of the counter.
+
+    Returns:
+        None
+    """
+    if _registry is not None:
+        _registry.increment(name, value, labels)
+
+def observe(name, seconds, **labels):
+    """
+    Records a duration in a timer, if instrumentation is enabled.
+
+    Parameters:
+        name (str): The name of the timer.
+        seconds (float): The duration.
+        **labels: The labels of the timer.
+
+    Returns:
+        None
+    """
+    if _registry is not None:
+        _registry.observe(name, seconds, labels)
+
+def timer(name, **labels):
+    """
+    Returns a context manager timing its block, if instrumentation is enabled.
+
+    Parameters:
+        name (str): The name of the timer.
+        **labels: The labels of the timer.
+
+    Returns:
+        Timer: The timer, or a context manager that does nothing if instrumentation
+        is disabled.
+    """
+    if _registry is None:
+        return _NULL_TIMER
+    return Timer(_registry, name, labels)
+
+def _close():
+    if _registry is not None:
+        _registry.close()
+
+atexit.register(_close)
@@ -0,0 +1,184 @@
+"""
+This module caches the answers of the RAG chain by the meaning of their questions.
+
+Questions about the same books are often asked again in slightly different words.
+Every answer is stored on disk, in an SQLite database, with the embedding of its
+question and the version of the index it was answered from. A new question is
+compared with the questions answered from the current version of the index, and if
+the cosine similarity of the nearest one reaches the threshold, its answer is
+returned instead of calling the language model again.
+
+Answers expire after a time to live, the least recently used answers are evicted
+once the cache is full, and all answers are dropped when the index is rebuilt or
+updated, since create_embeddings.py then saves it with a new version.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import numpy as np
+
+DATABASE_FILENAME = "answers.sqlite3"
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SemanticAnswerCache:
+    """
+    A persistent cache of answers, looked up by the similarity of their questions.
+
+    Attributes:
+        threshold (float): The minimum cosine similarity of a cached question.
+        max_entries (int): The maximum number of cached answers.
+        ttl (float): The number of seconds an answer is kept, or None to keep it
+            until it is evicted.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups not answered from the cache.
+    """
+    def __init__(self, directory, threshold=0.95, max_entries=10000, ttl=None):
+        """
+        Initializes a SemanticAnswerCache instance.
+
+        Parameters:
+            directory (str): The directory of the cache database.
+            threshold (float): The minimum cosine similarity between a question and a
+                cached question for the cached answer to be returned. Defaults to 0.95.
+            max_entries (int): The maximum number of cached answers. Defaults to 10000.
+            ttl (float, optional): The number of seconds an answer is kept. Defaults
+                to None (answers do not expire).
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(directory, DATABASE_FILENAME),
+                                           check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY, index_version TEXT, "
+            "query TEXT, answer TEXT, vector BLOB, created REAL, last_used REAL)")
+        self._connection.commit()
+        self._index_version = object()
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._vectors = None
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def _load(self, index_version):
+        # Drops the answers of other index versions and the expired answers, and
+        # loads the vectors of the remaining questions
+        self._connection.execute("DELETE FROM answers WHERE index_version IS NOT ?",
+                                 (index_version,))
+        if self.ttl is not None:
+            self._connection.execute("DELETE FROM answers WHERE created < ?",
+                                     (time.time() - self.ttl,))
+        self._connection.commit()
+        rows = self._connection.execute("SELECT id, vector FROM answers ORDER BY id").fetchall()
+        self._index_version = index_version
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._vectors = (np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                         if rows else None)
+
+    def _forget(self, ids):
+        keep = ~np.isin(self._ids, ids)
+        self._ids = self._ids[keep]
+        self._vectors = self._vectors[keep] if keep.any() else None
+
+    def lookup(self, vector, index_version):
+        """
+        Looks up the answer of the cached question most similar to a question.
+
+        Parameters:
+            vector (list): The embedding of the question.
+            index_version (str): The version of the index the question is answered from.
+
+        Returns:
+            str: The cached answer, or None if no cached question is similar enough.
+        """
+        query_vector = _normalize(vector)
+        with self._lock:
+            if index_version != self._index_version:
+                self._load(index_version)
+            answer = None
+            if self._vectors is not None and self._vectors.shape[1] == len(query_vector):
+                similarities = self._vectors @ query_vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    answer = self._use(int(self._ids[best]))
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return answer
+
+    def _use(self, entry_id):
+        now = time.time()
+        row = self._connection.execute("SELECT answer, created FROM answers WHERE id = ?",
+                                       (entry_id,)).fetchone()
+        if row is None or (self.ttl is not None and row[1] < now - self.ttl):
+            self._connection.execute("DELETE FROM answers WHERE id = ?", (entry_id,))
+            self._connection.commit()
+            self._forget([entry_id])
+            return None
+        self._connection.execute("UPDATE answers SET last_used = ? WHERE id = ?",
+                                 (now, entry_id))
+        self._connection.commit()
+        return row[0]
+
+    def store(self, query, vector, answer, index_version):
+        """
+        Caches the answer of a question, evicting the least recently used answers if
+        the cache is full.
+
+        Parameters:
+            query (str): The question.
+            vector (list): The embedding of the question.
+            answer (str): The answer.
+            index_version (str): The version of the index the question was answered from.
+
+        Returns:
+            None
+        """
+        if self.max_entries <= 0:
+            return
+        query_vector = _normalize(vector)
+        now = time.time()
+        with self._lock:
+            if index_version != self._index_version:
+                self._load(index_version)
+            if self._vectors is not None and self._vectors.shape[1] != len(query_vector):
+                # The embeddings model changed without a new index version
+                self._connection.execute("DELETE FROM answers")
+                self._load(index_version)
+            cursor = self._connection.execute(
+                "INSERT INTO answers (index_version, query, answer, vector, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (index_version, query, answer, query_vector.tobytes(), now, now))
+            self._ids = np.append(self._ids, cursor.lastrowid)
+            self._vectors = (query_vector[None, :] if self._vectors is None
+                             else np.vstack([self._vectors, query_vector]))
+
+            evicted = [row[0] for row in self._connection.execute(
+                "SELECT id FROM answers ORDER BY last_used DESC, id DESC LIMIT -1 OFFSET ?",
+                (self.max_entries,))]
+            if evicted:
+                self._connection.executemany("DELETE FROM answers WHERE id = ?",
+                                             [(entry_id,) for entry_id in evicted])
+                self._forget(evicted)
+            self._connection.commit()
+
+    def close(self):
+        """
+        Closes the cache database.
+
+        Returns:
+            None
+        """
+        self._connection.close()
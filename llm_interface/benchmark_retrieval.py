@@ -0,0 +1,477 @@
+"""
+This module benchmarks the retrieval step of the query path on a saved index.
+
+It loads an index as the retrieval service does (load_knowledge_base), embeds a set
+of queries, and runs every query through the search the service runs per request:
+the dense or hybrid search of the chunk positions, then the reading of the chunks.
+The language model is never called, so the benchmark runs offline on an index built
+with an offline embeddings model (e.g. by benchmark_ingestion.py in
+vector_store_creation) and its results depend only on the index and the hardware.
+
+It reports the p50, p95 and p99 search latencies of queries run one at a time, the
+queries per second and latencies with several queries in flight, and the recall@k of
+the dense search against an exact (flat) search of the same vectors. The ground
+truth is the exact search at full width for two-stage indexes, the vectors stored in
+flat and HNSW indexes, and the re-embedded chunks for compressed indexes. A shard
+catalog is benchmarked through its ShardRouter, and the ground truth is then the exact
+search of every shard, merged by distance.
+
+Queries are read from a file, one per line, or sampled from the chunks of the index
+as runs of consecutive words.
+
+Usage:
+    python benchmark_retrieval.py --index-path ../vector_store_creation/8183_faiss_index_books
+    python benchmark_retrieval.py --queries queries.txt --k 10 --concurrency 1 4 16
+    python benchmark_retrieval.py --output results.json --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from retrieval_service import load_knowledge_base
+import settings
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'vector_store_creation'))
+from retrieval import (  # pylint: disable=wrong-import-position,import-error
+    HybridSearch, TwoStageSearch, load_index_meta)
+from sharding import ShardCatalog, ShardRouter  # pylint: disable=wrong-import-position,import-error
+
+# Number of chunk vectors compared with the queries at a time in the exact search
+GROUND_TRUTH_BLOCK_SIZE = 65536
+
+def load_queries(file_path):
+    """
+    Reads queries from a file, one per line.
+
+    Parameters:
+        file_path (str): The path of the file.
+
+    Returns:
+        list: The non-empty lines of the file.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
+
+def sample_queries(mapped_indexes, count, words=8, seed=0):
+    """
+    Samples queries from the chunks of one or more indexes, as runs of consecutive words.
+
+    Parameters:
+        mapped_indexes (list): The indexes (MappedIndex); every chunk is equally likely
+            to be sampled.
+        count (int): The number of queries.
+        words (int): The number of words per query. Defaults to 8.
+        seed (int): The seed of the sample. Defaults to 0.
+
+    Returns:
+        list: The queries.
+    """
+    rng = random.Random(seed)
+    ends = np.cumsum([len(mapped_index) for mapped_index in mapped_indexes])
+    docs = []
+    for _ in range(count):
+        position = rng.randrange(int(ends[-1]))
+        i = int(np.searchsorted(ends, position, side='right'))
+        docs.extend(mapped_indexes[i].documents([position - (int(ends[i - 1]) if i else 0)]))
+    queries = []
+    for doc in docs:
+        chunk_words = doc.page_content.split()
+        start = rng.randrange(max(len(chunk_words) - words, 0) + 1)
+        queries.append(' '.join(chunk_words[start:start + words]))
+    return queries
+
+def percentiles(latencies):
+    """
+    Summarizes latencies.
+
+    Parameters:
+        latencies (list): The latencies, in seconds.
+
+    Returns:
+        dict: The mean, p50, p95 and p99 latencies in milliseconds.
+    """
+    milliseconds = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {"mean_ms": float(milliseconds.mean()), "p50_ms": float(p50),
+            "p95_ms": float(p95), "p99_ms": float(p99)}
+
+def exact_search(search, vectors, meta, k):
+    """
+    Finds the exact nearest chunks of every query in one index by a flat search.
+
+    Parameters:
+        search: The index, as returned by load_index.
+        vectors (numpy.ndarray): The embeddings of the queries.
+        meta (dict): The metadata of the index.
+        k (int): The number of chunks per query.
+
+    Returns:
+        tuple: The positions and distances of the `k` nearest chunks of every query,
+        and the source of the chunk vectors ('full-width', 'indexed' or 're-embedded').
+    """
+    mapped_index = getattr(search, "mapped_index", search)
+    dense_search = getattr(search, "dense_search", search)
+    count = len(mapped_index)
+    if isinstance(dense_search, TwoStageSearch):
+        source = "full-width"
+    elif meta["index_type"] in ("flat", "hnsw"):
+        source = "indexed"
+    else:
+        source = "re-embedded"
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    best_positions = np.zeros((len(vectors), 0), dtype=np.int64)
+    best_distances = np.zeros((len(vectors), 0), dtype=np.float32)
+    for start in range(0, count, GROUND_TRUTH_BLOCK_SIZE):
+        positions = np.arange(start, min(start + GROUND_TRUTH_BLOCK_SIZE, count))
+        if source == "full-width":
+            block = dense_search.full_vectors[mapped_index.full_vector_rows(positions)]
+        elif source == "indexed":
+            block = mapped_index.index.reconstruct_n(start, len(positions))
+        else:
+            texts = [doc.page_content for doc in mapped_index.documents(positions)]
+            block = mapped_index.embeddings_model.embed_documents(texts)
+        block = np.asarray(block, dtype=np.float32)
+        distances = ((vectors ** 2).sum(axis=1)[:, np.newaxis] - 2 * vectors @ block.T
+                     + (block ** 2).sum(axis=1)[np.newaxis, :])
+        best_positions = np.concatenate(
+            (best_positions, np.broadcast_to(positions, distances.shape)), axis=1)
+        best_distances = np.concatenate((best_distances, distances), axis=1)
+        order = np.argsort(best_distances, axis=1, kind='stable')[:, :k]
+        best_positions = np.take_along_axis(best_positions, order, axis=1)
+        best_distances = np.take_along_axis(best_distances, order, axis=1)
+    return best_positions, best_distances, source
+
+class RetrievalBenchmark:
+    """
+    Runs queries through the search of the retrieval service.
+
+    Chunks are identified by (shard name, position) pairs; a single index is one
+    shard named None.
+
+    Attributes:
+        knowledge_base: The index, as returned by load_knowledge_base.
+        shards (dict): The searchable index of every shard, by name.
+        k (int): The number of chunks retrieved per query.
+    """
+    def __init__(self, knowledge_base, k):
+        """
+        Initializes a RetrievalBenchmark instance.
+
+        Parameters:
+            knowledge_base: The index, as returned by load_knowledge_base.
+            k (int): The number of chunks retrieved per query.
+        """
+        self.knowledge_base = knowledge_base
+        if isinstance(knowledge_base, ShardRouter):
+            self.shards = knowledge_base.shards
+        else:
+            self.shards = {None: knowledge_base}
+        self.k = k
+
+    @property
+    def mapped_indexes(self):
+        """list: The indexes the chunks of every shard are read from."""
+        return [getattr(search, "mapped_index", search) for search in self.shards.values()]
+
+    def search(self, query, vector):
+        """
+        Runs one query as the retrieval service does, and times it.
+
+        Parameters:
+            query (str): The query.
+            vector (numpy.ndarray): The embedding of the query.
+
+        Returns:
+            float: The latency of the search, in seconds.
+        """
+        start = time.perf_counter()
+        if isinstance(self.knowledge_base, ShardRouter):
+            self.knowledge_base.search_with_score(query, vector, self.k)
+            return time.perf_counter() - start
+        if isinstance(self.knowledge_base, HybridSearch):
+            hits = self.knowledge_base.hybrid_search_positions(query, vector, self.k)
+        else:
+            hits = self.knowledge_base.search_positions(vector, self.k)
+        self.mapped_indexes[0].documents([position for position, _ in hits])
+        return time.perf_counter() - start
+
+    def run(self, queries, vectors, concurrency=1, repeat=1):
+        """
+        Runs every query `repeat` times with up to `concurrency` queries in flight.
+
+        Parameters:
+            queries (list): The queries.
+            vectors (numpy.ndarray): The embeddings of the queries.
+            concurrency (int): The number of queries in flight. Defaults to 1.
+            repeat (int): The number of passes over the queries. Defaults to 1.
+
+        Returns:
+            dict: The number of queries, queries per second and latency percentiles.
+        """
+        tasks = list(zip(queries, vectors)) * repeat
+        start = time.perf_counter()
+        if concurrency == 1:
+            latencies = [self.search(query, vector) for query, vector in tasks]
+        else:
+            # Searches run in threads, as in the executor of the retrieval service
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                latencies = list(executor.map(lambda task: self.search(*task), tasks))
+        elapsed = time.perf_counter() - start
+        return {"concurrency": concurrency, "queries": len(tasks),
+                "qps": len(tasks) / elapsed, **percentiles(latencies)}
+
+    def dense_positions(self, vectors):
+        """
+        Runs the dense search of every query in every shard, and merges the results
+        by distance.
+
+        Parameters:
+            vectors (numpy.ndarray): The embeddings of the queries.
+
+        Returns:
+            list: The (shard name, position) pairs found for every query.
+        """
+        results = []
+        for vector in vectors:
+            hits = sorted((distance, name, position) for name, search in self.shards.items()
+                          for position, distance in getattr(search, "dense_search", search)
+                          .search_positions(vector, self.k))
+            results.append([(name, position) for _, name, position in hits[:self.k]])
+        return results
+
+    def exact_positions(self, vectors, metas):
+        """
+        Finds the exact nearest chunks of every query by a flat search of every shard.
+
+        Parameters:
+            vectors (numpy.ndarray): The embeddings of the queries.
+            metas (dict): The metadata of every shard, by name.
+
+        Returns:
+            tuple: The (shard name, position) pairs of the `k` nearest chunks of every
+            query, and the sources of the chunk vectors (see exact_search).
+        """
+        hits = [[] for _ in vectors]
+        sources = set()
+        for name, search in self.shards.items():
+            positions, distances, source = exact_search(search, vectors, metas[name], self.k)
+            sources.add(source)
+            for query_hits, query_positions, query_distances in zip(hits, positions, distances):
+                query_hits.extend((float(distance), name, int(position))
+                                  for position, distance in zip(query_positions, query_distances))
+        exact = []
+        for query_hits in hits:
+            query_hits.sort(key=lambda hit: hit[0])
+            exact.append([(name, position) for _, name, position in query_hits[:self.k]])
+        return exact, ", ".join(sorted(sources))
+
+def recall_at_k(found, expected):
+    """
+    Computes the mean recall of search results against the exact results.
+
+    Parameters:
+        found (list): The positions found for every query.
+        expected (list): The exact positions for every query.
+
+    Returns:
+        float: The mean share of the exact positions that were found.
+    """
+    recalls = [len(set(hits) & set(truth)) / len(truth) for hits, truth in zip(found, expected)
+               if truth]
+    return float(np.mean(recalls)) if recalls else 0.0
+
+def git_commit():
+    """
+    Returns the commit the benchmark runs on.
+
+    Returns:
+        str: The hash of the current git commit, or None outside a git repository.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(index_path, queries=None, query_count=200, k=settings.TOP_K,
+                  concurrency=(1, 4, 16), repeat=1, seed=0):
+    """
+    Benchmarks the search of a saved index.
+
+    Parameters:
+        index_path (str): The directory of the saved index or shard catalog.
+        queries (list, optional): The queries; sampled from the chunks if None.
+        query_count (int): The number of sampled queries. Defaults to 200.
+        k (int): The number of chunks retrieved per query. Defaults to TOP_K.
+        concurrency (tuple): The numbers of queries in flight to measure throughput
+            at. Defaults to (1, 4, 16); the sequential latency run is reused for 1.
+        repeat (int): The number of passes over the queries per measurement.
+            Defaults to 1.
+        seed (int): The seed of the sampled queries. Defaults to 0.
+
+    Returns:
+        dict: The index settings, the embedding time, the latencies of sequential
+        queries, the throughput at every concurrency and the recall@k.
+    """
+    start = time.perf_counter()
+    knowledge_base = load_knowledge_base(index_path)
+    load_seconds = time.perf_counter() - start
+    sharded = isinstance(knowledge_base, ShardRouter)
+    if sharded:
+        catalog = ShardCatalog.load(index_path)
+        metas = {name: load_index_meta(catalog.shard_path(name)) for name in knowledge_base.shards}
+    else:
+        metas = {None: load_index_meta(index_path)}
+    meta = next(iter(metas.values()))
+    benchmark = RetrievalBenchmark(knowledge_base, k)
+    if queries is None:
+        queries = sample_queries(benchmark.mapped_indexes, query_count, seed=seed)
+
+    start = time.perf_counter()
+    vectors = np.asarray(knowledge_base.embeddings_model.embed_documents(queries),
+                         dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+
+    # Warm up the page cache of the memory-mapped index and chunk store
+    benchmark.run(queries[:10], vectors[:10])
+    latency = benchmark.run(queries, vectors, 1, repeat)
+    # The sequential run is the throughput at one query in flight
+    throughput = [latency if workers == 1 else benchmark.run(queries, vectors, workers, repeat)
+                  for workers in concurrency]
+    exact, ground_truth = benchmark.exact_positions(vectors, metas)
+    recall = recall_at_k(benchmark.dense_positions(vectors), exact)
+    chunk_count = sum(len(mapped_index) for mapped_index in benchmark.mapped_indexes)
+    if sharded:
+        knowledge_base.close()
+    else:
+        benchmark.mapped_indexes[0].close()
+
+    return {
+        "index": {
+            "path": index_path,
+            "chunks": chunk_count,
+            "shards": len(benchmark.shards),
+            "embedding_model": meta["embedding_model"],
+            "dimension": meta["dimension"],
+            "index_type": meta["index_type"],
+            "index_params": meta["index_params"],
+            "two_stage": meta["two_stage"],
+            "hybrid": (knowledge_base.hybrid if sharded
+                       else isinstance(knowledge_base, HybridSearch)),
+            "version": knowledge_base.version if sharded else meta.get("version"),
+        },
+        "k": k,
+        "queries": len(queries),
+        "load_seconds": load_seconds,
+        "embed_ms_per_query": embed_seconds * 1000 / max(len(queries), 1),
+        "latency": latency,
+        "throughput": throughput,
+        "recall_at_k": recall,
+        "ground_truth": ground_truth,
+    }
+
+def print_results(results):
+    """
+    Prints benchmark results.
+
+    Parameters:
+        results (dict): The results of run_benchmark.
+
+    Returns:
+        None
+    """
+    index = results["index"]
+    shards = f" in {index['shards']} shards" if index.get("shards", 1) > 1 else ""
+    print(f"{index['chunks']} chunks{shards}, {index['index_type']} index of {index['dimension']} "
+          f"dimensions{', hybrid' if index['hybrid'] else ''}"
+          f"{', two-stage' if index['two_stage'] else ''}; "
+          f"{results['queries']} queries, k={results['k']}")
+    print(f"Embedding: {results['embed_ms_per_query']:.2f} ms/query")
+    for run in [results["latency"]] + [run for run in results["throughput"]
+                                       if run["concurrency"] != 1]:
+        print(f"{run['concurrency']:4d} in flight {run['qps']:10.1f} QPS  "
+              f"p50 {run['p50_ms']:8.3f} ms  p95 {run['p95_ms']:8.3f} ms  "
+              f"p99 {run['p99_ms']:8.3f} ms")
+    print(f"Dense recall@{results['k']}: {results['recall_at_k']:.3f} "
+          f"(exact search of the {results['ground_truth']} vectors)")
+
+def print_comparison(results, baseline):
+    """
+    Prints the latency, throughput and recall relative to earlier results.
+
+    Parameters:
+        results (dict): The results of this run.
+        baseline (dict): The results of an earlier run, e.g. of another commit or
+            index configuration.
+
+    Returns:
+        None
+    """
+    print(f"\nCompared with {baseline.get('commit') or 'the baseline'}:")
+    for percentile in ("p50_ms", "p95_ms", "p99_ms"):
+        latency = results["latency"][percentile]
+        if latency:
+            print(f"{percentile[:3]:<12} {baseline['latency'][percentile] / latency:8.2f}x faster")
+    previous_runs = {run["concurrency"]: run for run in baseline.get("throughput", [])}
+    for run in results["throughput"]:
+        previous = previous_runs.get(run["concurrency"])
+        if previous:
+            print(f"{run['concurrency']:4d} in flight {run['qps'] / previous['qps']:8.2f}x QPS")
+    print(f"{'recall':<12} {results['recall_at_k'] - baseline['recall_at_k']:+8.3f}")
+
+def main():
+    """
+    Runs the retrieval benchmark from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark search latency and recall.")
+    parser.add_argument('--index-path', default=settings.INDEX_PATH,
+                        help="The directory of the saved index or shard catalog.")
+    parser.add_argument('--queries', help="A file of queries, one per line (sampled from "
+                                          "the chunks of the index by default).")
+    parser.add_argument('--query-count', type=int, default=200,
+                        help="The number of sampled queries.")
+    parser.add_argument('--k', type=int, default=settings.TOP_K,
+                        help="The number of chunks retrieved per query.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help="The numbers of queries in flight to measure throughput at.")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="The number of passes over the queries per measurement.")
+    parser.add_argument('--seed', type=int, default=0, help="The seed of the sampled queries.")
+    parser.add_argument('--output', help="The JSON file the results are written to.")
+    parser.add_argument('--compare', help="A JSON results file to compare with.")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else None
+    results = run_benchmark(args.index_path, queries, args.query_count, args.k,
+                            args.concurrency, args.repeat, args.seed)
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        **results,
+    }
+    print_results(results)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            print_comparison(results, json.load(file))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to '{args.output}'.")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,36 @@
 """
 This module sets up a Streamlit interface for a conversational AI bot that
 uses LangChain and OpenAI to answer questions based on PDF content.
+
+Chunks are retrieved from the retrieval service (retrieval_service.py), which keeps
+the knowledge base resident and is shared by every user of the app. Answers are
+cached by the similarity of their questions (answer_cache.py), so a question asked
+again in other words is answered without calling the language model.
+
+The sources of an answer are shown as soon as they are retrieved, and the answer is
+rendered token by token as the language model generates it, with the time to the
+first token and the total latency shown under it. With instrumentation enabled (see
+common/metrics.py), these latencies are also recorded.
 """
 
+import os
+import sys
+import time
+import requests
 import streamlit as sl
 
-from langchain_openai import OpenAIEmbeddings
 from langchain.prompts import ChatPromptTemplate
 from langchain.memory import ConversationBufferMemory
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_community.vectorstores import FAISS  # pylint: disable=no-name-in-module
+from langchain_core.documents import Document
 from langchain.chains import ConversationalRetrievalChain  # pylint: disable=no-name-in-module disable=C0412
 from langchain.chat_models import ChatOpenAI  # pylint: disable=no-name-in-module
+from answer_cache import SemanticAnswerCache
+import settings
+
+# Entry point: make the shared `common` package at the repository root importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import metrics  # pylint: disable=wrong-import-position,import-error
 
 
 def start_conversation(vector_embeddings):
@@ -57,19 +75,59 @@ def load_prompt():
     return prompt
 
 
-def load_knowledge_base():
+@sl.cache_resource
+def get_session():
     """
-    Loads the knowledge base from the local FAISS vector store.
-    
+    Creates the HTTP session used to reach the retrieval service, shared across reruns.
+
     Returns:
-        A FAISS instance with the loaded vector store.
+        A requests.Session instance.
     """
-    embeddings = OpenAIEmbeddings(model='text-embedding-3-large')
-    db_faiss_path = '../vector_store_creation/vector_store_books'
-    db = FAISS.load_local(db_faiss_path, embeddings, allow_dangerous_deserialization=True)
-    return db
+    return requests.Session()
 
 
+@sl.cache_resource
+def load_answer_cache():
+    """
+    Opens the semantic answer cache, shared across reruns and users.
+
+    Returns:
+        A SemanticAnswerCache instance, or None if the cache is disabled.
+    """
+    if not settings.USE_ANSWER_CACHE:
+        return None
+    return SemanticAnswerCache(settings.ANSWER_CACHE_DIRECTORY,
+                               threshold=settings.ANSWER_CACHE_THRESHOLD,
+                               max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                               ttl=settings.ANSWER_CACHE_TTL)
+
+
+def retrieve(query, k=settings.TOP_K):
+    """
+    Retrieves the chunks most similar to a query from the retrieval service.
+
+    Args:
+        query: The query.
+        k: The number of chunks to retrieve.
+
+    Returns:
+        A tuple of the list of Document instances, most similar first, the
+        embedding of the query and the version of the searched index.
+
+    Raises:
+        requests.RequestException: If the retrieval service cannot be reached or fails.
+    """
+    response = get_session().post(f"{settings.RETRIEVAL_SERVICE_URL}/search",
+                                  json={"query": query, "k": k, "include_vector": True},
+                                  timeout=settings.REQUEST_TIMEOUT)
+    response.raise_for_status()
+    result = response.json()
+    docs = [Document(page_content=hit["page_content"], metadata=hit["metadata"])
+            for hit in result["results"]]
+    return docs, result["query_vector"], result["index_version"]
+
+
+@sl.cache_resource
 def load_llm():
     """
     Loads the OpenAI language model.
@@ -94,36 +152,105 @@ def format_docs(docs):
     return "\n\n".join(doc.page_content for doc in docs)
 
 
+def show_sources(docs):
+    """
+    Shows the retrieved chunks an answer is based on.
+
+    Args:
+        docs: A list of document objects, most similar first.
+    """
+    with sl.expander(f"Sources ({len(docs)})"):
+        for doc in docs:
+            page = doc.metadata.get("page")
+            location = f", page {page + 1}" if isinstance(page, int) else ""
+            sl.markdown(f"**{doc.metadata.get('source', 'Unknown')}**{location}")
+            sl.caption(doc.page_content[:300])
+
+
+def timed_stream(chunks, timings, start):
+    """
+    Passes on streamed chunks, recording when the first one arrives.
+
+    Args:
+        chunks: An iterator of answer chunks.
+        timings: A dict in which the time to the first token, in milliseconds, is
+            recorded as 'first_token_ms'.
+        start: The time.perf_counter() value the latency is measured from.
+
+    Yields:
+        The answer chunks.
+    """
+    for chunk in chunks:
+        if "first_token_ms" not in timings:
+            timings["first_token_ms"] = (time.perf_counter() - start) * 1000
+        yield chunk
+
+
 def main():
     """
     Main function to run the Streamlit application.
     """
+    # Streamlit reruns the script on every interaction; this only configures once
+    metrics.configure_from_env()
     sl.header("Welcome to the 📝PDF bot")
     sl.write("🤖 You can chat by entering your queries")
 
-    knowledge_base = load_knowledge_base()
     llm = load_llm()
     prompt = load_prompt()
+    answer_cache = load_answer_cache()
 
     query = sl.text_input('Enter some text')
 
     if query:
+        start = time.perf_counter()
+        timings = {}
+
         # Getting only the chunks that are similar to the query for the LLM to produce the output
-        similar_embeddings = knowledge_base.similarity_search(query)
-        similar_embeddings = FAISS.from_documents(documents=similar_embeddings,
-                                                  embedding=OpenAIEmbeddings())
-
-        # Creating the chain for integrating LLM, prompt, and output parser
-        retriever = similar_embeddings.as_retriever()
-        rag_chain = (
-            {"context": retriever | format_docs, "question": RunnablePassthrough()}  # pylint: disable=unsupported-binary-operation
-            | prompt
-            | llm
-            | StrOutputParser()
-        )
-
-        response = rag_chain.invoke(query)
-        sl.write(response)
+        try:
+            similar_chunks, query_vector, index_version = retrieve(query)
+        except requests.RequestException as e:
+            sl.error(f"The retrieval service at {settings.RETRIEVAL_SERVICE_URL} "
+                     f"is unavailable: {e}")
+            return
+        timings["retrieval_ms"] = (time.perf_counter() - start) * 1000
+        metrics.observe("app_retrieval_seconds", timings["retrieval_ms"] / 1000)
+        show_sources(similar_chunks)
+
+        # Reusing the answer of an earlier question with the same meaning
+        response = None
+        if answer_cache is not None:
+            response = answer_cache.lookup(query_vector, index_version)
+        if response is not None:
+            metrics.increment("app_answers_total", source="cache")
+            sl.write(response)
+            sl.caption(f"Cached answer ({answer_cache.hits} hits, "
+                       f"{answer_cache.misses} misses) · "
+                       f"total {(time.perf_counter() - start) * 1000:.0f} ms")
+            return
+
+        # Creating the chain for integrating LLM, prompt, and output parser; the retrieved
+        # chunks go straight into the prompt
+        rag_chain = prompt | llm | StrOutputParser()
+
+        inputs = {"context": format_docs(similar_chunks), "question": query}
+        if settings.STREAM_ANSWERS:
+            # Rendering the answer as it is generated
+            response = sl.write_stream(timed_stream(rag_chain.stream(inputs), timings, start))
+        else:
+            response = rag_chain.invoke(inputs)
+            timings["first_token_ms"] = (time.perf_counter() - start) * 1000
+            sl.write(response)
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        metrics.increment("app_answers_total", source="llm")
+        metrics.observe("app_llm_first_token_seconds",
+                        (timings.get("first_token_ms", timings["total_ms"])
+                         - timings["retrieval_ms"]) / 1000)
+        metrics.observe("app_llm_seconds", (timings["total_ms"] - timings["retrieval_ms"]) / 1000)
+        sl.caption(f"Retrieval {timings['retrieval_ms']:.0f} ms · "
+                   f"first token {timings.get('first_token_ms', timings['total_ms']):.0f} ms · "
+                   f"total {timings['total_ms']:.0f} ms")
+        if answer_cache is not None:
+            answer_cache.store(query, query_vector, response, index_version)
 
 
 if __name__ == "__main__":
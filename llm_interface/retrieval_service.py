@@ -0,0 +1,398 @@
+"""
+This module runs the retrieval service, which keeps the FAISS knowledge base and its
+embeddings model resident and answers similarity searches over HTTP.
+
+Queries that arrive together are embedded together: the first query of a batch
+waits at most EMBED_BATCH_DEADLINE_MS for others to join it, up to EMBED_BATCH_SIZE
+queries, and the batch is embedded in one call while the next batch gathers. The
+Streamlit app is a client of this service, so all of its users share one warm index.
+The embeddings of recent queries are kept in an LRU cache, so repeated queries are
+not embedded again. Indexes saved with a lexical index are searched in hybrid mode
+unless HYBRID_SEARCH is disabled: the dense results are fused with BM25 results over
+Arabic-normalized words, and the score of a result is then its fused score, higher
+for better matches, instead of its distance. INDEX_PATH can also be the directory of
+a shard catalog saved by create_embeddings.py with SHARDED_INDEX enabled: the index of
+every book is then searched in parallel, and a search can be limited to some books.
+
+Every response carries the version of the index, which changes whenever
+create_embeddings.py saves new content, and the query embedding can be returned with
+the results, so clients can cache answers per index version. With instrumentation
+enabled (see common/metrics.py), embedding and search times are recorded and
+served in the Prometheus text format.
+
+API:
+    POST /search  {"query": str, "k": int, "include_vector": bool, "shards": [str]}
+                  ->  {"results": [...], "timings": {...}, "index_version": str, ...}
+    GET  /health                           ->  {"status": "ok", "chunks": int, ...}
+    GET  /metrics                          ->  Prometheus text (404 if METRICS is unset)
+"""
+
+import os
+import sys
+import time
+import asyncio
+from functools import partial
+from collections import OrderedDict
+import numpy as np
+from aiohttp import web
+import settings
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'vector_store_creation'))
+# Entry point: make the shared `common` package at the repository root importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from retrieval import (  # pylint: disable=wrong-import-position,import-error
+    HybridSearch, load_index, load_index_meta)
+from sharding import (  # pylint: disable=wrong-import-position,import-error
+    ShardRouter, has_catalog, load_library)
+from common import metrics  # pylint: disable=wrong-import-position,import-error
+
+def load_knowledge_base(index_path):
+    """
+    Loads the knowledge base from the local FAISS vector store.
+
+    The index is opened memory-mapped, with the query embedder and search settings
+    recorded in the index_meta.json that create_embeddings.py saves next to it;
+    chunk texts are read only for the chunks a search returns. If HYBRID_SEARCH is
+    enabled and the index has a lexical index, searches are hybrid. If the directory
+    holds a shard catalog, the index of every book in it is loaded, and searched in
+    parallel by SHARD_SEARCH_WORKERS threads.
+
+    Parameters:
+        index_path (str): The directory of the saved index or shard catalog.
+
+    Returns:
+        A MappedIndex, TwoStageSearch, HybridSearch or ShardRouter instance with the
+        loaded vector store.
+    """
+    if has_catalog(index_path):
+        return load_library(index_path, settings.HYBRID_SEARCH, settings.RRF_K,
+                            settings.HYBRID_CANDIDATE_FACTOR, settings.SHARD_SEARCH_WORKERS or None)
+    return load_index(index_path, settings.HYBRID_SEARCH, settings.RRF_K,
+                      settings.HYBRID_CANDIDATE_FACTOR)
+
+class LRUCache:
+    """
+    A least-recently-used cache of query embeddings.
+
+    Attributes:
+        max_size (int): The maximum number of cached embeddings.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups not in the cache.
+    """
+    def __init__(self, max_size):
+        """
+        Initializes an LRUCache instance.
+
+        Parameters:
+            max_size (int): The maximum number of cached embeddings.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Looks up a cached embedding, marking it as recently used.
+
+        Parameters:
+            key (str): The query.
+
+        Returns:
+            numpy.ndarray: The embedding, or None if it is not cached.
+        """
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Caches an embedding, evicting the least recently used one if the cache is full.
+
+        Parameters:
+            key (str): The query.
+            value (numpy.ndarray): The embedding.
+
+        Returns:
+            None
+        """
+        if self.max_size <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+class QueryBatcher:
+    """
+    Combines concurrent query embeddings into micro-batches.
+
+    Attributes:
+        embeddings_model: The embeddings model used to embed queries.
+        max_batch_size (int): The maximum number of queries per batch.
+        max_delay (float): The longest time, in seconds, a query waits for a batch.
+        cache (LRUCache): The cache of recent query embeddings.
+        batches (int): The number of batches embedded so far.
+        queries (int): The number of queries embedded so far.
+    """
+    def __init__(self, embeddings_model, max_batch_size=32, max_delay=0.005, cache_size=0):
+        """
+        Initializes a QueryBatcher instance.
+
+        Parameters:
+            embeddings_model: The embeddings model used to embed queries.
+            max_batch_size (int): The maximum number of queries per batch. Defaults to 32.
+            max_delay (float): The longest time, in seconds, a query waits for other
+                queries to join its batch. Defaults to 0.005.
+            cache_size (int): The number of query embeddings kept in the LRU cache.
+                Defaults to 0 (no cache).
+        """
+        self.embeddings_model = embeddings_model
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.cache = LRUCache(cache_size)
+        self.batches = 0
+        self.queries = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """
+        Starts batching in the running event loop.
+
+        Returns:
+            None
+        """
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops batching.
+
+        Returns:
+            None
+        """
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def embed(self, text):
+        """
+        Embeds a query as part of the next batch, unless its embedding is cached.
+
+        Parameters:
+            text (str): The query to embed.
+
+        Returns:
+            numpy.ndarray: The embedding of the query.
+        """
+        vector = self.cache.get(text)
+        if vector is not None:
+            return vector
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        vector = await future
+        self.cache.put(text, vector)
+        return vector
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            texts = [text for text, _ in batch]
+            start = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(None, self.embeddings_model.embed_documents,
+                                                     texts)
+            except Exception as e:  # pylint: disable=broad-except
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            metrics.observe("retrieval_embed_batch_seconds", time.perf_counter() - start)
+            metrics.increment("retrieval_queries_embedded_total", len(batch))
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(np.asarray(vector, dtype=np.float32))
+
+async def handle_search(request):
+    """
+    Finds the chunks most similar to a query.
+
+    Parameters:
+        request (web.Request): A JSON request with the 'query' and, optionally, the
+            number 'k' of chunks to return, whether to return the query embedding
+            ('include_vector') and, for a shard catalog, the names of the shards to
+            search ('shards').
+
+    Returns:
+        web.Response: The chunks with their scores, best first, the time spent
+        embedding and searching in milliseconds, the version of the index and, if
+        requested, the query embedding ('query_vector').
+
+    Raises:
+        web.HTTPBadRequest: If the request is not a valid search request.
+    """
+    try:
+        body = await request.json()
+        query = body["query"]
+        k = int(body.get("k", settings.TOP_K))
+    except (ValueError, KeyError, TypeError) as e:
+        raise web.HTTPBadRequest(text=f"Invalid search request: {e}") from e
+    if not isinstance(query, str) or not query.strip() or k < 1:
+        raise web.HTTPBadRequest(text="The query must be a non-empty string and k positive.")
+    knowledge_base = request.app["knowledge_base"]
+    shards = body.get("shards")
+    if shards is not None:
+        if not isinstance(knowledge_base, ShardRouter):
+            raise web.HTTPBadRequest(text="The index is not sharded.")
+        if (not isinstance(shards, list)
+                or any(not isinstance(name, str) or name not in knowledge_base.shards
+                       for name in shards)):
+            raise web.HTTPBadRequest(text="The shards must be a list of shard names.")
+
+    start = time.perf_counter()
+    vector = await request.app["batcher"].embed(query)
+    embedded = time.perf_counter()
+    if isinstance(knowledge_base, ShardRouter):
+        mode = "sharded_hybrid" if knowledge_base.hybrid else "sharded"
+        search = partial(knowledge_base.search_with_score, query, vector, k, shards)
+    elif isinstance(knowledge_base, HybridSearch):
+        mode = "hybrid"
+        search = partial(knowledge_base.hybrid_search_with_score, query, vector, k)
+    else:
+        mode = "dense"
+        search = partial(knowledge_base.similarity_search_with_score_by_vector, vector, k)
+    hits = await asyncio.get_running_loop().run_in_executor(None, search)
+    searched = time.perf_counter()
+    metrics.observe("retrieval_embed_seconds", embedded - start)
+    metrics.observe("retrieval_search_seconds", searched - embedded, mode=mode)
+
+    result = {
+        "results": [{"page_content": doc.page_content, "metadata": doc.metadata,
+                     "score": float(score)} for doc, score in hits],
+        "timings": {"embed_ms": (embedded - start) * 1000,
+                    "search_ms": (searched - embedded) * 1000},
+        "index_version": request.app["index_version"],
+    }
+    if body.get("include_vector"):
+        result["query_vector"] = np.asarray(vector, dtype=np.float32).tolist()
+    return web.json_response(result)
+
+async def handle_health(request):
+    """
+    Reports that the service is up, with its batching counters.
+
+    Parameters:
+        request (web.Request): The request.
+
+    Returns:
+        web.Response: The status, the number of indexed chunks, the number of
+        embedded queries and batches, the hits and misses of the query cache and,
+        for a shard catalog, the number of shards.
+    """
+    batcher = request.app["batcher"]
+    knowledge_base = request.app["knowledge_base"]
+    health = {
+        "status": "ok",
+        "chunks": len(getattr(knowledge_base, "mapped_index", knowledge_base)),
+        "queries": batcher.queries,
+        "batches": batcher.batches,
+        "cache_hits": batcher.cache.hits,
+        "cache_misses": batcher.cache.misses,
+    }
+    if isinstance(knowledge_base, ShardRouter):
+        health["shards"] = len(knowledge_base.shards)
+    return web.json_response(health)
+
+async def handle_metrics(request):  # pylint: disable=unused-argument
+    """
+    Reports the metrics of the service in the Prometheus text format.
+
+    Parameters:
+        request (web.Request): The request.
+
+    Returns:
+        web.Response: The metrics.
+
+    Raises:
+        web.HTTPNotFound: If instrumentation is disabled.
+    """
+    registry = metrics.get_registry()
+    if registry is None:
+        raise web.HTTPNotFound(text="Metrics are disabled; set METRICS to enable them.")
+    return web.Response(text=registry.render_prometheus(),
+                        content_type="text/plain", charset="utf-8")
+
+def create_app(knowledge_base, index_version=None):
+    """
+    Creates the retrieval service application.
+
+    Parameters:
+        knowledge_base: The knowledge base returned by load_knowledge_base.
+        index_version (str, optional): The version of the index, from its metadata
+            or shard catalog. Defaults to None.
+
+    Returns:
+        web.Application: The application.
+    """
+    app = web.Application()
+    app["knowledge_base"] = knowledge_base
+    app["index_version"] = index_version
+    app["batcher"] = QueryBatcher(knowledge_base.embeddings_model, settings.EMBED_BATCH_SIZE,
+                                  settings.EMBED_BATCH_DEADLINE_MS / 1000,
+                                  settings.QUERY_CACHE_SIZE)
+
+    async def start_batcher(app):
+        app["batcher"].start()
+
+    async def stop_batcher(app):
+        await app["batcher"].stop()
+
+    app.on_startup.append(start_batcher)
+    app.on_cleanup.append(stop_batcher)
+    app.router.add_post("/search", handle_search)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+def main():
+    """
+    Loads the knowledge base and serves it until interrupted.
+    """
+    # Metrics are served at GET /metrics on the service's port, not on METRICS_PORT
+    metrics.configure_from_env(serve=False)
+    knowledge_base = load_knowledge_base(settings.INDEX_PATH)
+    if isinstance(knowledge_base, ShardRouter):
+        index_version = knowledge_base.version
+    else:
+        index_version = load_index_meta(settings.INDEX_PATH).get("version")
+    web.run_app(create_app(knowledge_base, index_version), host=settings.SERVICE_HOST,
+                port=settings.SERVICE_PORT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+This module contains configuration settings for the retrieval service and the
+Streamlit app. Every setting can be overridden by an environment variable of the
+same name, set directly or in a .env file.
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Directory of the FAISS index, or of the shard catalog, searched by the retrieval service
+INDEX_PATH = os.getenv("INDEX_PATH", "../vector_store_creation/8183_faiss_index_books")
+
+# Number of threads searching the shards of a shard catalog in parallel (0 uses one per
+# core, at most one per shard)
+SHARD_SEARCH_WORKERS = int(os.getenv("SHARD_SEARCH_WORKERS", "0"))
+
+# Host and port the retrieval service listens on
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+
+# URL of the retrieval service used by the Streamlit app
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL",
+                                  f"http://{SERVICE_HOST}:{SERVICE_PORT}")
+
+# Seconds the Streamlit app waits for the retrieval service
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+
+# Number of chunks retrieved per query
+TOP_K = int(os.getenv("TOP_K", "4"))
+
+# Maximum number of concurrent queries embedded together in one batch
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
+# Longest time, in milliseconds, a query waits for other queries to join its batch
+EMBED_BATCH_DEADLINE_MS = float(os.getenv("EMBED_BATCH_DEADLINE_MS", "5"))
+
+# Whether the service fuses dense results with BM25 results over Arabic-normalized words,
+# for indexes saved with a lexical index
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+
+# Rank offset of the reciprocal rank fusion of dense and lexical results
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Number of candidates taken from each of the dense and lexical searches per result
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))
+
+# Maximum number of query embeddings kept in the service's LRU cache (0 disables it)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
+# Whether the Streamlit app renders answers token by token as they are generated
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "true").lower() in ("1", "true", "yes")
+
+# Whether the Streamlit app caches answers by the similarity of their questions
+USE_ANSWER_CACHE = os.getenv("USE_ANSWER_CACHE", "true").lower() in ("1", "true", "yes")
+
+# Directory of the answer cache database
+ANSWER_CACHE_DIRECTORY = os.getenv("ANSWER_CACHE_DIRECTORY", "answer_cache")
+
+# Minimum cosine similarity between two questions for a cached answer to be reused
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# Maximum number of cached answers; the least recently used ones are evicted
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+
+# Seconds a cached answer is kept (7 days)
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
@@ -0,0 +1,60 @@
+"""
+This module normalizes Arabic text for lexical matching.
+
+The same word is written with or without diacritics (tashkeel), with different
+forms of alef, with a final ya or alef maqsura, and with a final ta marbuta or ha.
+Normalization removes diacritics and tatweel and folds these letters to one form,
+so the indexed text and the queries match whichever form they use.
+"""
+
+import re
+
+# Quranic annotation marks, harakat, the superscript alef and tatweel
+TASHKEEL_PATTERN = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+
+# Hamza and madda forms of alef, folded to a bare alef
+ALEF_PATTERN = re.compile(r'[\u0622\u0623\u0625\u0671]')
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+FOLDED_LETTERS = str.maketrans({
+    '\u0649': '\u064A',  # alef maqsura -> ya
+    '\u0629': '\u0647',  # ta marbuta -> ha
+})
+
+def remove_tashkeel(text):
+    """
+    Removes diacritical marks (tashkeel) and tatweel from Arabic text.
+
+    Parameters:
+        text (str): The text to clean.
+
+    Returns:
+        str: The text without tashkeel.
+    """
+    return TASHKEEL_PATTERN.sub('', text)
+
+def normalize_arabic(text):
+    """
+    Normalizes Arabic text by removing tashkeel and folding alef, ya and ta marbuta.
+
+    Parameters:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text, with Latin letters in lower case.
+    """
+    text = ALEF_PATTERN.sub('\u0627', remove_tashkeel(text))
+    return text.translate(FOLDED_LETTERS).casefold()
+
+def tokenize(text):
+    """
+    Splits text into normalized words.
+
+    Parameters:
+        text (str): The text to split.
+
+    Returns:
+        list: The normalized words of the text.
+    """
+    return TOKEN_PATTERN.findall(normalize_arabic(text))
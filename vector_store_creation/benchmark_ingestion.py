@@ -0,0 +1,647 @@
+"""
+This module benchmarks the ingestion of a corpus into a FAISS index.
+
+It generates a synthetic corpus of mostly Arabic text with some English words, laid
+out like a scraped book (a directory of .txt files, as BOOKS_DIRECTORY expects), and
+runs the stages of create_embeddings.py on it one after another, so each is timed
+separately: loading and splitting the files in the worker processes of
+parallel_loading, dropping near-duplicate chunks, embedding the chunks and adding
+them to the index with pipeline.index_batches, and saving the index. The time
+index_batches spends in the embeddings model is reported as the embedding stage, and
+the rest as the indexing stage.
+
+The chunking, deduplication, index and lexical index settings are read from
+config.py. Chunks are embedded with the deterministic HashingEmbeddings model by
+default, so the benchmark runs offline and its results do not depend on model
+weights; `--embedder config` uses the model of EMBEDDING_MODEL and MODEL_TYPE, such
+as CustomArabicEmbeddings, instead.
+
+For every stage the results hold the time taken, the throughput and the peak resident
+memory of the process so far, along with the size of the saved index, the corpus
+and the settings used. They can be written as JSON and compared with the results of
+another run, e.g. of another commit.
+
+Usage:
+    python benchmark_ingestion.py
+    python benchmark_ingestion.py --files 50 --words-per-file 50000 --output results.json
+    python benchmark_ingestion.py --compare baseline.json --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+import subprocess
+from datetime import datetime, timezone
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Entry point: make the shared `common` package at the repository root importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# pylint: disable=wrong-import-position
+from document_loaders import SimpleTextLoader
+from parallel_loading import load_files
+from models import get_embeddings_model, CustomArabicEmbeddings
+from pipeline import batched, index_batches
+from full_vectors import FullVectorStore
+from deduplication import apply_aliases
+from create_embeddings import (get_chunk_size, get_deduplicator, get_index_meta,
+                               save_faiss_index)
+import config as cfg
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+ARABIC_LETTERS = "ابتثجحخدذرزسشصضطظعغفقكلمنهويةىءأإآ"
+ENGLISH_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+TASHKEEL = "\u064B\u064D\u064E\u064F\u0650\u0651\u0652"
+SENTENCE_ENDINGS = ".....؟!"
+
+def make_vocabulary(rng, size, letters, min_length=2, max_length=8):
+    """
+    Generates random words.
+
+    Parameters:
+        rng (random.Random): The random number generator.
+        size (int): The number of words.
+        letters (str): The letters of the words.
+        min_length (int): The minimum number of letters per word. Defaults to 2.
+        max_length (int): The maximum number of letters per word. Defaults to 8.
+
+    Returns:
+        list: The words.
+    """
+    return [''.join(rng.choices(letters, k=rng.randint(min_length, max_length)))
+            for _ in range(size)]
+
+def add_tashkeel(rng, word, rate=0.3):
+    """
+    Adds diacritics after some letters of a word.
+
+    Parameters:
+        rng (random.Random): The random number generator.
+        word (str): The word.
+        rate (float): The probability of a diacritic after each letter. Defaults to 0.3.
+
+    Returns:
+        str: The word with diacritics.
+    """
+    return ''.join(letter + rng.choice(TASHKEEL) if rng.random() < rate else letter
+                   for letter in word)
+
+class CorpusGenerator:
+    """
+    Generates synthetic Arabic text with the statistics of scraped books.
+
+    Word frequencies follow Zipf's law. Some Arabic words carry diacritics or the
+    definite article, some words are English, sentences end with Arabic or Latin
+    punctuation and have clauses separated by the Arabic comma, and some paragraphs
+    are boilerplate repeated across the corpus, like the chains of narrators of
+    hadith books, so that deduplication has work to do.
+
+    Attributes:
+        english_ratio (float): The share of English words.
+        boilerplate_ratio (float): The share of boilerplate paragraphs.
+    """
+    def __init__(self, seed=0, vocabulary_size=20000, english_ratio=0.05,
+                 boilerplate_ratio=0.05):
+        """
+        Initializes a CorpusGenerator instance.
+
+        Parameters:
+            seed (int): The seed of the random number generator. Defaults to 0.
+            vocabulary_size (int): The number of distinct Arabic words. Defaults to 20000.
+            english_ratio (float): The share of English words. Defaults to 0.05.
+            boilerplate_ratio (float): The share of boilerplate paragraphs. Defaults to 0.05.
+        """
+        self.english_ratio = english_ratio
+        self.boilerplate_ratio = boilerplate_ratio
+        self._rng = random.Random(seed)
+        self._arabic = make_vocabulary(self._rng, vocabulary_size, ARABIC_LETTERS)
+        self._english = make_vocabulary(self._rng, max(vocabulary_size // 10, 1),
+                                        ENGLISH_LETTERS, 3, 10)
+        self._arabic_weights = np.cumsum(1 / np.arange(1, len(self._arabic) + 1)).tolist()
+        self._english_weights = np.cumsum(1 / np.arange(1, len(self._english) + 1)).tolist()
+        self._boilerplate = []
+        self._boilerplate = [self.paragraph()[0] for _ in range(20)]
+
+    def words(self, count):
+        """
+        Generates words.
+
+        Parameters:
+            count (int): The number of words.
+
+        Returns:
+            list: The words.
+        """
+        rng = self._rng
+        words = rng.choices(self._arabic, cum_weights=self._arabic_weights, k=count)
+        for i in range(count):
+            draw = rng.random()
+            if draw < self.english_ratio:
+                words[i] = rng.choices(self._english, cum_weights=self._english_weights)[0]
+            elif draw < self.english_ratio + 0.05:
+                words[i] = add_tashkeel(rng, words[i])
+            elif draw < self.english_ratio + 0.25:
+                words[i] = "ال" + words[i]
+        return words
+
+    def sentence(self):
+        """
+        Generates a sentence of 5 to 30 words.
+
+        Returns:
+            tuple: The sentence and its number of words.
+        """
+        rng = self._rng
+        words = self.words(rng.randint(5, 30))
+        for i in range(4, len(words) - 1, 7):
+            if rng.random() < 0.4:
+                words[i] += "،"
+        return ' '.join(words) + rng.choice(SENTENCE_ENDINGS), len(words)
+
+    def paragraph(self):
+        """
+        Generates a paragraph of 2 to 8 sentences, or repeats a boilerplate paragraph.
+
+        Returns:
+            tuple: The paragraph and its number of words.
+        """
+        if self._boilerplate and self._rng.random() < self.boilerplate_ratio:
+            paragraph = self._rng.choice(self._boilerplate)
+            return paragraph, len(paragraph.split())
+        sentences = [self.sentence() for _ in range(self._rng.randint(2, 8))]
+        return ' '.join(text for text, _ in sentences), sum(count for _, count in sentences)
+
+    def text(self, word_count):
+        """
+        Generates paragraphs until they hold a number of words.
+
+        Parameters:
+            word_count (int): The minimum number of words.
+
+        Returns:
+            str: The paragraphs, one per line.
+        """
+        paragraphs = []
+        total = 0
+        while total < word_count:
+            paragraph, count = self.paragraph()
+            paragraphs.append(paragraph)
+            total += count
+        return '\n'.join(paragraphs) + '\n'
+
+def generate_corpus(books_directory, files, words_per_file, seed=0, english_ratio=0.05,
+                    boilerplate_ratio=0.05, duplicate_ratio=0.1):
+    """
+    Writes a synthetic corpus as the .txt files of a book directory, replacing the
+    files of an earlier corpus.
+
+    Some files repeat the text of an earlier file under another title, as chapters
+    repeated across the volumes of a book are, so their chunks are near-duplicates.
+
+    Parameters:
+        books_directory (str): The directory the files are written to.
+        files (int): The number of files.
+        words_per_file (int): The minimum number of words per file.
+        seed (int): The seed of the corpus; the same seed gives the same corpus.
+            Defaults to 0.
+        english_ratio (float): The share of English words. Defaults to 0.05.
+        boilerplate_ratio (float): The share of boilerplate paragraphs. Defaults to 0.05.
+        duplicate_ratio (float): The share of files repeating an earlier file.
+            Defaults to 0.1.
+
+    Returns:
+        dict: The parameters of the corpus, and its size in bytes.
+    """
+    shutil.rmtree(books_directory, ignore_errors=True)
+    os.makedirs(books_directory)
+    generator = CorpusGenerator(seed, english_ratio=english_ratio,
+                                boilerplate_ratio=boilerplate_ratio)
+    rng = random.Random(f"duplicates-{seed}")
+    paths = []
+    total_bytes = 0
+    for i in range(files):
+        # Scraped chapters are named after their titles
+        title = f"باب {i + 1:04d} {' '.join(generator.words(3))}"
+        if paths and rng.random() < duplicate_ratio:
+            with open(rng.choice(paths), 'r', encoding='utf-8') as file:
+                text = file.read().split('\n', 1)[1]
+        else:
+            text = generator.text(words_per_file)
+        paths.append(os.path.join(books_directory, f"{title}.txt"))
+        with open(paths[-1], 'w', encoding='utf-8') as file:
+            file.write(f"{title}\n{text}")
+        total_bytes += os.path.getsize(paths[-1])
+    return {"files": files, "words_per_file": words_per_file, "seed": seed,
+            "english_ratio": english_ratio, "boilerplate_ratio": boilerplate_ratio,
+            "duplicate_ratio": duplicate_ratio, "bytes": total_bytes}
+
+def peak_rss_megabytes():
+    """
+    Returns the peak resident memory of the process.
+
+    Returns:
+        float: The peak resident set size in megabytes, or None if it is unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def directory_size(path):
+    """
+    Returns the total size of the files in a directory.
+
+    Parameters:
+        path (str): The directory.
+
+    Returns:
+        int: The size in bytes.
+    """
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+def git_commit():
+    """
+    Returns the commit the benchmark runs on.
+
+    Returns:
+        str: The hash of the current git commit, or None outside a git repository.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class StageTimer:
+    """
+    Times the stages of the benchmark and records their results.
+
+    Attributes:
+        stages (dict): The results of every stage, by name, in the order they ran.
+    """
+    def __init__(self):
+        """
+        Initializes a StageTimer instance.
+        """
+        self.stages = {}
+
+    def run(self, name, function, *args):
+        """
+        Runs and times a stage.
+
+        Parameters:
+            name (str): The name of the stage.
+            function (callable): The stage; returns its result and the number of
+                items it processed.
+            *args: The arguments of the stage.
+
+        Returns:
+            The result of the stage.
+        """
+        start = time.perf_counter()
+        result, items = function(*args)
+        self.record(name, time.perf_counter() - start, items)
+        return result
+
+    def record(self, name, seconds, items):
+        """
+        Records the results of a stage timed by the caller.
+
+        Parameters:
+            name (str): The name of the stage.
+            seconds (float): The time the stage took.
+            items (int): The number of items it processed.
+
+        Returns:
+            None
+        """
+        self.stages[name] = {
+            "seconds": seconds,
+            "items": items,
+            "items_per_second": items / seconds if seconds else None,
+            "peak_rss_mb": peak_rss_megabytes(),
+        }
+        print(f"{name:<12} {seconds:9.3f} s {items:9d} items "
+              f"{self.stages[name]['items_per_second'] or 0:12.1f} items/s")
+
+class TimedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model and adds up the time spent embedding documents, so the
+    embedding and indexing that index_batches interleaves can be timed apart.
+
+    Attributes:
+        embeddings_model: The wrapped model.
+        seconds (float): The time spent embedding documents so far.
+    """
+    def __init__(self, embeddings_model):
+        """
+        Initializes a TimedEmbeddings instance.
+
+        Parameters:
+            embeddings_model: The wrapped model.
+        """
+        self.embeddings_model = embeddings_model
+        self.seconds = 0.0
+
+    def embed_documents(self, texts):
+        """
+        Embeds texts with the wrapped model and times it.
+
+        Parameters:
+            texts (list): The texts to embed.
+
+        Returns:
+            The embeddings of the texts.
+        """
+        start = time.perf_counter()
+        embeddings = self.embeddings_model.embed_documents(texts)
+        self.seconds += time.perf_counter() - start
+        return embeddings
+
+    def embed_query(self, text):
+        """
+        Embeds a query with the wrapped model.
+
+        Parameters:
+            text (str): The query to embed.
+
+        Returns:
+            list: The embedding of the query.
+        """
+        return self.embeddings_model.embed_query(text)
+
+def load_stage(books_directory):
+    """
+    Loads and splits the text files of a book directory in LOADER_WORKERS processes,
+    with parallel_loading.load_files as create_embeddings.py does.
+
+    Parameters:
+        books_directory (str): The directory containing the text files.
+
+    Returns:
+        tuple: The chunks, and the number of files.
+
+    Raises:
+        Exception: The error of a file that failed to load.
+    """
+    files = sorted(file for file in os.listdir(books_directory) if file.endswith('.txt'))
+    chunk_size, chunk_overlap = get_chunk_size()
+    chunks = []
+    for _, file_chunks, error in load_files(books_directory, files, SimpleTextLoader, chunk_size,
+                                            chunk_overlap, cfg.HANDLE_METADATA,
+                                            cfg.LOADER_WORKERS, cfg.TEXT_SPLITTER):
+        if error is not None:
+            raise error
+        chunks.extend(file_chunks)
+    return chunks, len(files)
+
+def deduplicate_stage(chunks, deduplicator):
+    """
+    Gives chunks IDs and drops the near-duplicates, if deduplication is enabled.
+
+    Parameters:
+        chunks (list): The chunks.
+        deduplicator (ChunkDeduplicator): The near-duplicate detector, or None.
+
+    Returns:
+        tuple: The kept (chunk_id, document) pairs, and the number of chunks checked.
+    """
+    kept = []
+    for chunk in chunks:
+        chunk_id = uuid.uuid4().hex
+        if (deduplicator is None
+                or deduplicator.add(chunk_id, chunk, chunk.metadata.get("source")) is None):
+            kept.append((chunk_id, chunk))
+    return kept, len(chunks)
+
+def index_stage(chunks, embeddings_model, meta, index_path, deduplicator):
+    """
+    Embeds chunks and adds them to a new FAISS index with pipeline.index_batches, in
+    batches of EMBEDDING_BATCH_SIZE, as create_embeddings.py does.
+
+    Parameters:
+        chunks (list): The (chunk_id, document) pairs.
+        embeddings_model: The embeddings model.
+        meta (dict): The metadata of the index.
+        index_path (str): The directory of the index, for its full-width vectors.
+        deduplicator (ChunkDeduplicator): The near-duplicate detector, or None.
+
+    Returns:
+        tuple: The vector store, its full-width vectors (or None) and the seconds spent
+        embedding, and the number of chunks added.
+    """
+    full_vectors = None
+    if meta["two_stage"]:
+        full_vectors = FullVectorStore.create(index_path, meta["full_dimension"])
+    timed_model = TimedEmbeddings(embeddings_model)
+    vector_store_index, chunk_count = index_batches(batched(chunks, cfg.EMBEDDING_BATCH_SIZE),
+                                                    timed_model, None, meta["dimension"],
+                                                    full_vectors, meta["index_type"],
+                                                    meta["index_params"])
+    if deduplicator is not None:
+        apply_aliases(deduplicator.aliases, vector_store_index.docstore.search)
+    return (vector_store_index, full_vectors, timed_model.seconds), chunk_count
+
+def save_stage(vector_store_index, full_vectors, index_path, meta):
+    """
+    Saves an index with its chunk store, lexical index and metadata.
+
+    Parameters:
+        vector_store_index (FAISS): The vector store.
+        full_vectors (FullVectorStore): The full-width vectors, or None.
+        index_path (str): The directory of the saved index.
+        meta (dict): The metadata of the index.
+
+    Returns:
+        tuple: None, and the number of chunks saved.
+    """
+    save_faiss_index(vector_store_index, index_path, meta, full_vectors)
+    return None, vector_store_index.index.ntotal
+
+def get_embedder(embedder):
+    """
+    Creates the embeddings model of the benchmark.
+
+    Parameters:
+        embedder (str): 'hashing' for HashingEmbeddings, or 'config' for the model of
+            EMBEDDING_MODEL and MODEL_TYPE.
+
+    Returns:
+        tuple: The embeddings model, its name and its type.
+    """
+    if embedder == "hashing":
+        model_name, model_type = "HASHING", "hashing"
+    else:
+        model_name, model_type = cfg.EMBEDDING_MODEL, cfg.MODEL_TYPE
+    return (get_embeddings_model(model_name, model_type, cfg.EMBEDDING_ENCODE_BATCH_SIZE,
+                                 cfg.EMBEDDING_WORKERS), model_name, model_type)
+
+def run_benchmark(books_directory, index_path, embedder="hashing"):
+    """
+    Runs the ingestion stages on the files of a book directory.
+
+    Parameters:
+        books_directory (str): The directory containing the text files.
+        index_path (str): The directory the index is saved to, replacing an earlier index.
+        embedder (str): The embeddings model (see get_embedder). Defaults to 'hashing'.
+
+    Returns:
+        dict: The results of every stage, the number of chunks and of dropped
+        duplicates, and the size of the saved index in bytes.
+    """
+    embeddings_model, model_name, model_type = get_embedder(embedder)
+    meta = dict(get_index_meta(embeddings_model), embedding_model=model_name,
+                model_type=model_type)
+    deduplicator = get_deduplicator()
+    shutil.rmtree(index_path, ignore_errors=True)
+    os.makedirs(index_path)
+
+    timer = StageTimer()
+    try:
+        chunks = timer.run("load_split", load_stage, books_directory)
+        chunks = timer.run("deduplicate", deduplicate_stage, chunks, deduplicator)
+        start = time.perf_counter()
+        (vector_store_index, full_vectors, embed_seconds), chunk_count = index_stage(
+            chunks, embeddings_model, meta, index_path, deduplicator)
+        timer.record("embed", embed_seconds, chunk_count)
+        timer.record("index", time.perf_counter() - start - embed_seconds, chunk_count)
+        timer.run("save", save_stage, vector_store_index, full_vectors, index_path, meta)
+    finally:
+        if isinstance(embeddings_model, CustomArabicEmbeddings):
+            embeddings_model.close()
+
+    return {
+        "stages": timer.stages,
+        "chunks": len(chunks),
+        "duplicates": deduplicator.duplicates if deduplicator is not None else 0,
+        "index_bytes": directory_size(index_path),
+        "settings": {
+            "embedding_model": model_name,
+            "model_type": model_type,
+            "dimension": meta["dimension"],
+            "index_type": meta["index_type"],
+            "text_splitter": cfg.TEXT_SPLITTER,
+            "chunk_size": get_chunk_size()[0],
+            "chunk_overlap": get_chunk_size()[1],
+            "deduplicate_chunks": cfg.DEDUPLICATE_CHUNKS,
+            "lexical_index": cfg.LEXICAL_INDEX,
+            "embedding_batch_size": cfg.EMBEDDING_BATCH_SIZE,
+            "loader_workers": cfg.LOADER_WORKERS,
+        },
+    }
+
+def print_comparison(results, baseline):
+    """
+    Prints the throughput and memory of every stage relative to earlier results.
+
+    Results are only compared if both runs used the same corpus parameters; settings
+    that differ are listed.
+
+    Parameters:
+        results (dict): The results of this run.
+        baseline (dict): The results of an earlier run, e.g. of another commit.
+
+    Returns:
+        bool: True if the results were compared.
+    """
+    baseline_corpus = baseline.get("corpus", {})
+    differences = [key for key, value in results["corpus"].items()
+                   if key != "bytes" and baseline_corpus.get(key) != value]
+    if differences:
+        print(f"\nNot compared with {baseline.get('commit') or 'the baseline'}: the corpus "
+              f"parameters differ ({', '.join(differences)}).")
+        return False
+    print(f"\nCompared with {baseline.get('commit') or 'the baseline'}:")
+    baseline_settings = baseline.get("settings", {})
+    for key, value in results["settings"].items():
+        if key in baseline_settings and baseline_settings[key] != value:
+            print(f"{key:<12} {baseline_settings[key]} -> {value}")
+    for name, stage in results["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if previous and stage["seconds"]:
+            print(f"{name:<12} {previous['seconds'] / stage['seconds']:8.2f}x speed-up")
+    if baseline.get("index_bytes"):
+        print(f"{'index size':<12} {results['index_bytes'] / baseline['index_bytes']:8.2f}x")
+    previous_peak = baseline.get("stages", {}).get("save", {}).get("peak_rss_mb")
+    current_peak = results["stages"]["save"]["peak_rss_mb"]
+    if previous_peak and current_peak:
+        print(f"{'peak RSS':<12} {current_peak / previous_peak:8.2f}x")
+    return True
+
+def main():
+    """
+    Runs the ingestion benchmark from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark ingestion on a synthetic corpus.")
+    parser.add_argument('--files', type=int, default=20, help="The number of corpus files.")
+    parser.add_argument('--words-per-file', type=int, default=20000,
+                        help="The number of words per corpus file.")
+    parser.add_argument('--english-ratio', type=float, default=0.05,
+                        help="The share of English words in the corpus.")
+    parser.add_argument('--boilerplate-ratio', type=float, default=0.05,
+                        help="The share of repeated boilerplate paragraphs in the corpus.")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1,
+                        help="The share of corpus files repeating an earlier file.")
+    parser.add_argument('--seed', type=int, default=0, help="The seed of the corpus.")
+    parser.add_argument('--embedder', choices=("hashing", "config"), default="hashing",
+                        help="'hashing' for offline deterministic embeddings, 'config' for "
+                             "the model in config.py.")
+    parser.add_argument('--work-dir',
+                        help="The directory of the corpus and index, kept after the run "
+                             "(a temporary directory by default).")
+    parser.add_argument('--output', help="The JSON file the results are written to.")
+    parser.add_argument('--compare', help="A JSON results file to compare with.")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="ingestion_benchmark_")
+    try:
+        books_directory = os.path.join(work_dir, "books", "synthetic")
+        corpus = generate_corpus(books_directory, args.files, args.words_per_file, args.seed,
+                                 args.english_ratio, args.boilerplate_ratio,
+                                 args.duplicate_ratio)
+        print(f"{corpus['files']} files, {corpus['bytes'] / 1e6:.1f} MB in '{books_directory}'")
+        results = run_benchmark(books_directory, os.path.join(work_dir, "synthetic_faiss_index"),
+                                args.embedder)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus": corpus,
+        **results,
+        "megabytes_per_second": corpus["bytes"] / 1e6
+        / sum(stage["seconds"] for stage in results["stages"].values()),
+    }
+    print(f"{results['chunks']} chunks, {results['duplicates']} duplicates dropped, "
+          f"index {results['index_bytes'] / 1e6:.1f} MB, "
+          f"{results['megabytes_per_second']:.2f} MB/s overall, "
+          f"peak RSS {results['stages']['save']['peak_rss_mb'] or 0:.0f} MB")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            print_comparison(results, json.load(file))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to '{args.output}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+This module benchmarks the text splitters on scraped books.
+
+It splits the text files of a book directory with LangChain's
+RecursiveCharacterTextSplitter (the 'recursive' splitter) and with the single-pass
+Arabic-aware splitter (the 'arabic' splitter), and reports the throughput of each
+in megabytes of text per second, with the number and average length of the chunks.
+
+Usage:
+    python benchmark_splitting.py
+    python benchmark_splitting.py --books-dir ../book_scraper/books/8183 --repeat 5
+"""
+
+import os
+import time
+import argparse
+from document_loaders import SimpleTextLoader
+from text_processing import process_documents
+import config as cfg
+
+def load_sample_documents(books_directory, max_files):
+    """
+    Loads the text files of a book directory.
+
+    Parameters:
+        books_directory (str): The directory containing the text files.
+        max_files (int): The maximum number of files to load.
+
+    Returns:
+        list: The loaded documents.
+    """
+    documents = []
+    if not os.path.isdir(books_directory):
+        return documents
+    files = sorted(file for file in os.listdir(books_directory) if file.endswith('.txt'))
+    for file in files[:max_files]:
+        documents.extend(SimpleTextLoader(os.path.join(books_directory, file)).load())
+    return documents
+
+def run_benchmark(name, splitter, documents, chunk_size, chunk_overlap, repeat):
+    """
+    Times a splitter over the sample documents.
+
+    Parameters:
+        name (str): The label printed with the result.
+        splitter (str): The text splitter (see text_processing.SPLITTERS).
+        documents (list): The sample documents.
+        chunk_size (int): The chunk size, in the unit of the splitter.
+        chunk_overlap (int): The chunk overlap, in the unit of the splitter.
+        repeat (int): The number of passes over the sample documents.
+
+    Returns:
+        float: The throughput in megabytes of text per second.
+    """
+    text_bytes = sum(len(doc.page_content.encode('utf-8')) for doc in documents)
+    chunks = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunks = process_documents(documents, chunk_size, chunk_overlap, splitter)
+    elapsed = time.perf_counter() - start
+    megabytes_per_second = text_bytes * repeat / elapsed / 1e6
+    average_length = sum(len(chunk.page_content) for chunk in chunks) / max(len(chunks), 1)
+    print(f"{name:<32} {megabytes_per_second:8.2f} MB/s {len(chunks):8d} chunks "
+          f"{average_length:8.0f} chars/chunk")
+    return megabytes_per_second
+
+def main():
+    """
+    Runs the splitting benchmark from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the text splitters.")
+    parser.add_argument('--books-dir', default=cfg.BOOKS_DIRECTORY,
+                        help="The directory of scraped .txt books.")
+    parser.add_argument('--files', type=int, default=100, help="The number of sample files.")
+    parser.add_argument('--repeat', type=int, default=3, help="The number of timed passes.")
+    args = parser.parse_args()
+
+    documents = load_sample_documents(args.books_dir, args.files)
+    if not documents:
+        print(f"No .txt files found in '{args.books_dir}'; scrape a book first.")
+        return
+
+    text_bytes = sum(len(doc.page_content.encode('utf-8')) for doc in documents)
+    print(f"{len(documents)} sample files, {text_bytes / 1e6:.1f} MB, {args.repeat} passes")
+    baseline = run_benchmark(f"recursive ({cfg.CHUNK_SIZE} chars)", "recursive", documents,
+                             cfg.CHUNK_SIZE, cfg.CHUNK_OVERLAP, args.repeat)
+    fast = run_benchmark(f"arabic ({cfg.CHUNK_TOKENS} words)", "arabic", documents,
+                         cfg.CHUNK_TOKENS, cfg.CHUNK_OVERLAP_TOKENS, args.repeat)
+    print(f"{'':<32} {fast / baseline:8.2f}x speed-up")
+
+if __name__ == "__main__":
+    main()
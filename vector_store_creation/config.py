@@ -15,14 +15,120 @@ CHUNK_SIZE = 1000
 # Overlap between chunks
 CHUNK_OVERLAP = 200
 
+# Text splitter ('recursive': chunk sizes in characters; 'arabic': single-pass splitter
+# ending chunks at Arabic sentence and clause boundaries, with chunk sizes in words).
+# Changing it rebuilds an existing index instead of updating it incrementally.
+TEXT_SPLITTER = "recursive"
+
+# Number of words of each chunk, and of the overlap between chunks, for the 'arabic' splitter
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 40
+
 # Embedding model to use
 EMBEDDING_MODEL = "ARABIC_TRIPLET_MATRYOSHKA"
 
-# Type of embedding model ('openai' or 'huggingface')
+# Type of embedding model ('openai', 'huggingface', or 'hashing' with EMBEDDING_MODEL = "HASHING"
+# for deterministic embeddings that need no model weights, e.g. in offline benchmarks)
 MODEL_TYPE = "huggingface"
 
 # Vector store to use ('faiss', 'chroma', 'weaviate')
 VECTOR_STORE = "faiss"
 
+# Whether to build one FAISS index per book of LIBRARY_DIRECTORY, recorded in a shard
+# catalog in LIBRARY_INDEX_DIRECTORY, instead of one index of BOOKS_DIRECTORY
+SHARDED_INDEX = False
+
+# Directory containing one subdirectory of text or PDF files per book
+LIBRARY_DIRECTORY = "../book_scraper/books"
+
+# Directory of the shard catalog and of the index of every book
+LIBRARY_INDEX_DIRECTORY = "library_faiss_index"
+
 # Whether to handle metadata or not
 HANDLE_METADATA = True
+
+# Number of processes loading and splitting files (1 loads in the main process)
+LOADER_WORKERS = 4
+
+# Whether to reuse embeddings of unchanged chunks from previous runs
+USE_EMBEDDING_CACHE = True
+
+# Directory of the persistent embedding cache
+EMBEDDING_CACHE_DIRECTORY = "embedding_cache"
+
+# Maximum number of cached embeddings per model; least recently used ones are evicted
+EMBEDDING_CACHE_MAX_ENTRIES = 1_000_000
+
+# Whether to update an existing FAISS index with only the files that changed
+INCREMENTAL_INDEX = True
+
+# Number of chunks embedded and added to the index at a time
+EMBEDDING_BATCH_SIZE = 256
+
+# Maximum number of chunk batches loaded and split ahead of the embedding stage
+PIPELINE_QUEUE_SIZE = 4
+
+# Number of texts encoded per batch by Hugging Face models
+EMBEDDING_ENCODE_BATCH_SIZE = 32
+
+# Number of processes encoding with Hugging Face models (1 encodes in the main process)
+EMBEDDING_WORKERS = 4
+
+# Number of leading embedding dimensions stored in the index, for Matryoshka models
+# such as ARABIC_TRIPLET_MATRYOSHKA (e.g. 64, 128 or 256; None stores full-width vectors)
+EMBEDDING_DIMENSION = None
+
+# Whether to keep full-width vectors on disk and rescore truncated-vector search results
+TWO_STAGE_SEARCH = False
+
+# Number of candidates rescored at full width per requested search result
+RESCORE_FACTOR = 4
+
+# FAISS index type ('flat', 'hnsw', 'ivf_flat', 'ivf_pq', 'sq8')
+FAISS_INDEX_TYPE = "flat"
+
+# Number of neighbours of every node in HNSW indexes
+HNSW_M = 32
+
+# Size of the candidate list while building HNSW indexes
+HNSW_EF_CONSTRUCTION = 200
+
+# Size of the candidate list while searching HNSW indexes
+HNSW_EF_SEARCH = 64
+
+# Number of clusters of IVF indexes (reduced when the training sample is too small)
+IVF_NLIST = 1024
+
+# Number of clusters searched per query in IVF indexes
+IVF_NPROBE = 16
+
+# Number of sub-quantizers of IVF-PQ indexes (must divide the indexed dimension)
+PQ_M = 16
+
+# Number of bits per sub-quantizer code of IVF-PQ indexes
+PQ_NBITS = 8
+
+# Number of embeddings, from the first chunks indexed, used to train IVF and SQ8 indexes
+INDEX_TRAINING_SAMPLE = 50_000
+
+# Whether to drop chunks that nearly duplicate an earlier chunk before embedding them,
+# keeping their metadata as aliases of the chunk they duplicate
+DEDUPLICATE_CHUNKS = True
+
+# Minimum estimated Jaccard similarity between the word shingles of duplicate chunks
+DEDUP_THRESHOLD = 0.8
+
+# Number of consecutive words per shingle
+DEDUP_SHINGLE_SIZE = 3
+
+# Number of MinHash hash functions, and of LSH bands they are split into
+DEDUP_NUM_PERM = 128
+DEDUP_BANDS = 16
+
+# Whether to save a BM25 index of the Arabic-normalized words of the chunks next to
+# FAISS indexes, for hybrid search
+LEXICAL_INDEX = True
+
+# BM25 term frequency saturation and length normalization of the lexical index
+BM25_K1 = 1.2
+BM25_B = 0.75
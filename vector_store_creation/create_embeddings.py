@@ -1,67 +1,563 @@
 """
 This module processes text or PDF files in a given directory by splitting the text into chunks,
 generating embeddings, and creating a vector store index for document retrieval.
+
+FAISS indexes are built by a streaming pipeline that embeds and adds chunks in batches,
+so memory use does not depend on the size of the corpus. When INCREMENTAL_INDEX is enabled
+and a FAISS index from a previous run exists, only the files that were added, changed or
+removed since that run are processed. With EMBEDDING_DIMENSION set, FAISS indexes store
+truncated Matryoshka embeddings, and TWO_STAGE_SEARCH keeps the full-width embeddings on
+disk next to the index for rescoring. FAISS_INDEX_TYPE selects an exact flat index or
+an approximate HNSW, IVF or scalar-quantized index. FAISS indexes are also saved with a
+compressed chunk store, so the query app can open them memory-mapped, and with
+LEXICAL_INDEX enabled, with a BM25 index of their Arabic-normalized words for hybrid search.
+With DEDUPLICATE_CHUNKS enabled, chunks that nearly duplicate an earlier chunk of the run
+are dropped before embedding and recorded as aliases of that chunk. With SHARDED_INDEX
+enabled, every book of LIBRARY_DIRECTORY gets its own FAISS index, recorded in a shard
+catalog that the query app searches in parallel.
 """
 
 import os
+import sys
+import uuid
 from dotenv import load_dotenv
+
+# Entry point: make the shared `common` package at the repository root importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# pylint: disable=wrong-import-position
 from document_loaders import SimpleTextLoader
 from langchain_community.document_loaders import PyPDFLoader  # pylint: disable=no-name-in-module
-from models import get_embeddings_model
+from langchain_community.vectorstores import FAISS  # pylint: disable=no-name-in-module
+from models import (get_embeddings_model, get_model_identity, check_truncation,
+                    CustomArabicEmbeddings)
+from embedding_cache import CachedEmbeddings
 from vector_stores import get_vector_store
-from text_processing import process_documents
+from parallel_loading import load_files
+from index_manifest import IndexManifest, hash_file
+from pipeline import batched, prefetch, index_batches
+from full_vectors import FullVectorStore
+from retrieval import save_index_meta, load_index_meta
+from faiss_index import INDEX_TYPES, REMOVABLE_INDEX_TYPES, get_index_type
+from index_store import save_index_files, save_chunk_store, has_chunk_store
+from lexical_index import save_lexical_index, has_lexical_index, remove_lexical_index
+from deduplication import ChunkDeduplicator, apply_aliases, remove_aliases
+from sharding import ShardCatalog
 import config as cfg
+from common import metrics  # pylint: disable=import-error
 
 load_dotenv()
 
-def create_chunks_embeddings():
+def list_files(books_directory, file_type):
     """
-    Processes files in the given directory, splits the text into chunks, generates embeddings,
-    and creates a vector store index using configuration from config.py.
-    """
-    books_directory = cfg.BOOKS_DIRECTORY
-    file_type = cfg.FILE_TYPE
-    chunk_size = cfg.CHUNK_SIZE
-    chunk_overlap = cfg.CHUNK_OVERLAP
-    embedding_model = cfg.EMBEDDING_MODEL
-    model_type = cfg.MODEL_TYPE
-    vector_store = cfg.VECTOR_STORE
-    handle_metadata = cfg.HANDLE_METADATA
+    Lists the files of the given type in the books directory.
+
+    Parameters:
+        books_directory (str): The directory containing the files.
+        file_type (str): The type of file to process ('pdf' or 'txt').
+
+    Returns:
+        tuple: The sorted file names and the loader class for the file type.
 
+    Raises:
+        ValueError: If the file type is unsupported.
+    """
     if file_type == 'pdf':
-        files = [f for f in os.listdir(books_directory) if f.lower().endswith('.pdf')]
         loader_class = PyPDFLoader
     elif file_type == 'txt':
-        files = [f for f in os.listdir(books_directory) if f.lower().endswith('.txt')]
         loader_class = SimpleTextLoader
     else:
         raise ValueError("Unsupported file type. Choose 'pdf' or 'txt'.")
+    files = sorted(f for f in os.listdir(books_directory) if f.lower().endswith(f'.{file_type}'))
+    return files, loader_class
 
-    file_count = len(files)
-    print(f"Found {file_count} {file_type.upper()} files in the directory '{books_directory}'.")
+def get_chunk_size():
+    """
+    Returns the chunk size and overlap in the unit of the configured text splitter.
+
+    Returns:
+        tuple: CHUNK_TOKENS and CHUNK_OVERLAP_TOKENS for the 'arabic' splitter, and
+        CHUNK_SIZE and CHUNK_OVERLAP otherwise.
+    """
+    if cfg.TEXT_SPLITTER == "arabic":
+        return cfg.CHUNK_TOKENS, cfg.CHUNK_OVERLAP_TOKENS
+    return cfg.CHUNK_SIZE, cfg.CHUNK_OVERLAP
+
+def get_deduplicator():
+    """
+    Creates the near-duplicate detector of an indexing run, if deduplication is enabled.
+
+    Returns:
+        ChunkDeduplicator: The detector, or None if DEDUPLICATE_CHUNKS is disabled.
+    """
+    if not cfg.DEDUPLICATE_CHUNKS:
+        return None
+    return ChunkDeduplicator(cfg.DEDUP_THRESHOLD, cfg.DEDUP_SHINGLE_SIZE, cfg.DEDUP_NUM_PERM,
+                             cfg.DEDUP_BANDS)
+
+def iter_chunks(books_directory, files, loader_class, file_chunk_ids, deduplicator=None):
+    """
+    Loads and splits the given files in LOADER_WORKERS processes, yielding chunks with
+    new chunk IDs in the order of the files.
+
+    Files that fail to load are reported and skipped; they are left out of
+    `file_chunk_ids`, so they are not recorded in the manifest and are retried on
+    the next run. Chunks found to be near-duplicates by the deduplicator are not
+    yielded, and get no chunk ID.
+
+    Parameters:
+        books_directory (str): The directory containing the files.
+        files (list): The names of the files to load.
+        loader_class: The loader class for the file type.
+        file_chunk_ids (dict): Filled with the chunk IDs of every file as it is split.
+        deduplicator (ChunkDeduplicator, optional): The near-duplicate detector.
+            Defaults to None.
 
-    all_documents = []
-    for i, file in enumerate(files):
+    Yields:
+        tuple: The chunk ID and the chunked document.
+    """
+    file_count = len(files)
+    chunk_size, chunk_overlap = get_chunk_size()
+    loaded_files = load_files(books_directory, files, loader_class, chunk_size, chunk_overlap,
+                              cfg.HANDLE_METADATA, cfg.LOADER_WORKERS, cfg.TEXT_SPLITTER)
+    for i, (file, chunks, error) in enumerate(loaded_files):
         file_path = os.path.join(books_directory, file)
-        print(f"Processing {file_type.upper()} file {i + 1} out of {file_count}: {file_path}")
-        loader = loader_class(file_path)
-        documents = loader.load()
+        if error is not None:
+            print(f"Failed to load {cfg.FILE_TYPE.upper()} file {i + 1} out of {file_count}: "
+                  f"{file_path} ({type(error).__name__}: {error})")
+            metrics.increment("ingestion_files_total", status="failed")
+            continue
+        print(f"Processing {cfg.FILE_TYPE.upper()} file {i + 1} out of {file_count}: {file_path}")
+        metrics.increment("ingestion_files_total", status="loaded")
+        metrics.increment("ingestion_chunks_split_total", len(chunks))
+
+        chunk_ids = file_chunk_ids.setdefault(file, [])
+        for chunk in chunks:
+            chunk_id = uuid.uuid4().hex
+            if (deduplicator is not None
+                    and deduplicator.add(chunk_id, chunk, file) is not None):
+                metrics.increment("ingestion_chunks_deduplicated_total")
+                continue
+            chunk_ids.append(chunk_id)
+            yield chunk_id, chunk
+
+def report_failed_files(files, file_chunk_ids):
+    """
+    Reports the files that failed to load.
+
+    Parameters:
+        files (list): The names of the files that were to be loaded.
+        file_chunk_ids (dict): The chunk IDs of every file that was loaded.
+
+    Returns:
+        list: The names of the files that failed to load.
+    """
+    failed_files = [file for file in files if file not in file_chunk_ids]
+    if failed_files:
+        print(f"{len(failed_files)} files failed to load and will be retried on the next run: "
+              f"{', '.join(failed_files)}")
+    return failed_files
+
+def index_files(books_directory, files, loader_class, embeddings_model, meta,
+                vector_store_index=None, full_vectors=None, deduplicator=None):
+    """
+    Streams the given files through the ingestion pipeline into a FAISS index.
+
+    Files are loaded and split in a background thread, and their chunks are embedded
+    and added to the index in batches of EMBEDDING_BATCH_SIZE. At most
+    PIPELINE_QUEUE_SIZE batches wait between the two stages, so memory use does not
+    depend on the size of the corpus.
+
+    Parameters:
+        books_directory (str): The directory containing the files.
+        files (list): The names of the files to index.
+        loader_class: The loader class for the file type.
+        embeddings_model: The embeddings model used to embed the chunks.
+        meta (dict): The metadata of the index, from get_index_meta.
+        vector_store_index (FAISS, optional): The index to add to; a new one is
+            created if None. Defaults to None.
+        full_vectors (FullVectorStore, optional): The store the full-width embeddings
+            are added to. Defaults to None.
+        deduplicator (ChunkDeduplicator, optional): The near-duplicate detector; the
+            aliases of the chunks it drops are added to the chunks they duplicate.
+            Defaults to None.
+
+    Returns:
+        tuple: The FAISS index (None if there were no chunks), the number of chunks
+        added, and the chunk IDs of every file.
+    """
+    file_chunk_ids = {}
+    chunks = iter_chunks(books_directory, files, loader_class, file_chunk_ids, deduplicator)
+    batches = prefetch(batched(chunks, cfg.EMBEDDING_BATCH_SIZE), cfg.PIPELINE_QUEUE_SIZE)
+    vector_store_index, chunk_count = index_batches(batches, embeddings_model,
+                                                    vector_store_index, meta["dimension"],
+                                                    full_vectors, meta["index_type"],
+                                                    meta["index_params"])
+    report_failed_files(files, file_chunk_ids)
+    if deduplicator is not None:
+        print(f"Dropped {deduplicator.duplicates} near-duplicate chunks.")
+        if vector_store_index is not None:
+            apply_aliases(deduplicator.aliases, vector_store_index.docstore.search)
+    return vector_store_index, chunk_count, file_chunk_ids
+
+def get_index_settings():
+    """
+    Returns the settings that determine the content of an index.
+
+    An incremental update is only possible if the existing index was built with the
+    same settings; otherwise the index is rebuilt.
+
+    Returns:
+        dict: The ingestion settings from config.py.
+    """
+    chunk_size, chunk_overlap = get_chunk_size()
+    return {
+        "file_type": cfg.FILE_TYPE,
+        "text_splitter": cfg.TEXT_SPLITTER,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "embedding_model": cfg.EMBEDDING_MODEL,
+        "model_type": cfg.MODEL_TYPE,
+        "handle_metadata": cfg.HANDLE_METADATA,
+        "deduplicate_chunks": cfg.DEDUPLICATE_CHUNKS,
+        "dedup_threshold": cfg.DEDUP_THRESHOLD,
+        "dedup_shingle_size": cfg.DEDUP_SHINGLE_SIZE,
+        "dedup_num_perm": cfg.DEDUP_NUM_PERM,
+        "dedup_bands": cfg.DEDUP_BANDS,
+        "embedding_dimension": cfg.EMBEDDING_DIMENSION,
+        "two_stage_search": cfg.TWO_STAGE_SEARCH,
+        "faiss_index_type": cfg.FAISS_INDEX_TYPE,
+        "hnsw_m": cfg.HNSW_M,
+        "hnsw_ef_construction": cfg.HNSW_EF_CONSTRUCTION,
+        "ivf_nlist": cfg.IVF_NLIST,
+        "pq_m": cfg.PQ_M,
+        "pq_nbits": cfg.PQ_NBITS,
+        "index_training_sample": cfg.INDEX_TRAINING_SAMPLE,
+    }
+
+def get_index_params():
+    """
+    Returns the parameters of approximate FAISS indexes.
+
+    Returns:
+        dict: The build, training and search parameters from config.py.
+    """
+    return {
+        "hnsw_m": cfg.HNSW_M,
+        "ef_construction": cfg.HNSW_EF_CONSTRUCTION,
+        "ef_search": cfg.HNSW_EF_SEARCH,
+        "nlist": cfg.IVF_NLIST,
+        "nprobe": cfg.IVF_NPROBE,
+        "pq_m": cfg.PQ_M,
+        "pq_nbits": cfg.PQ_NBITS,
+        "training_sample": cfg.INDEX_TRAINING_SAMPLE,
+    }
+
+def get_index_meta(embeddings_model):
+    """
+    Returns the metadata saved with a FAISS index to load it for searching.
+
+    Parameters:
+        embeddings_model: The embeddings model returned by get_embeddings_model.
 
-        if handle_metadata:
-            for doc in documents:
-                doc.metadata.update({
-                    "source": file,
-                    "file_path": file_path
-                })
+    Returns:
+        dict: The embeddings model, the dimensions of the indexed and full-width
+        vectors, the two-stage search settings, the FAISS index type and parameters,
+        and the lexical index settings.
+
+    Raises:
+        ValueError: If EMBEDDING_DIMENSION is larger than the dimension of the model or
+            not supported by it, or FAISS_INDEX_TYPE is unsupported.
+    """
+    if cfg.FAISS_INDEX_TYPE not in INDEX_TYPES:
+        raise ValueError(f"Unsupported FAISS index type: {cfg.FAISS_INDEX_TYPE}")
+    _, full_dimension = get_model_identity(embeddings_model)
+    dimension = cfg.EMBEDDING_DIMENSION or full_dimension
+    if dimension > full_dimension:
+        raise ValueError(f"EMBEDDING_DIMENSION ({dimension}) is larger than the "
+                         f"dimension of {cfg.EMBEDDING_MODEL} ({full_dimension}).")
+    if dimension < full_dimension:
+        check_truncation(cfg.EMBEDDING_MODEL, cfg.MODEL_TYPE, dimension)
+    return {
+        "embedding_model": cfg.EMBEDDING_MODEL,
+        "model_type": cfg.MODEL_TYPE,
+        "dimension": dimension,
+        "full_dimension": full_dimension,
+        "two_stage": cfg.TWO_STAGE_SEARCH and dimension < full_dimension,
+        "rescore_factor": cfg.RESCORE_FACTOR,
+        "index_type": cfg.FAISS_INDEX_TYPE,
+        "index_params": get_index_params(),
+        "lexical": cfg.LEXICAL_INDEX,
+        "lexical_params": {"k1": cfg.BM25_K1, "b": cfg.BM25_B},
+    }
+
+def save_faiss_index(vector_store_index, index_path, meta, full_vectors=None):
+    """
+    Saves a FAISS index with its full-width vectors, chunk store, lexical index and
+    metadata.
+
+    The metadata is given a new version, so caches of answers derived from the
+    previous content of the index can tell that it changed.
+
+    Parameters:
+        vector_store_index (FAISS): The vector store.
+        index_path (str): The directory of the saved index.
+        meta (dict): The metadata of the index.
+        full_vectors (FullVectorStore, optional): The full-width vectors of the chunks.
+            Defaults to None.
+
+    Returns:
+        None
+    """
+    save_index_files(vector_store_index, index_path)
+    if full_vectors is not None:
+        full_vectors.save()
+    save_chunk_store(vector_store_index, index_path, full_vectors)
+    if meta["lexical"]:
+        docstore = vector_store_index.docstore
+        chunk_ids = vector_store_index.index_to_docstore_id
+        save_lexical_index((docstore.search(chunk_ids[position]).page_content
+                            for position in range(vector_store_index.index.ntotal)), index_path)
+    else:
+        remove_lexical_index(index_path)
+    save_index_meta(index_path, dict(meta, version=uuid.uuid4().hex))
+
+def update_index(index_path, manifest, meta, books_directory, files, loader_class,
+                 embeddings_model):
+    """
+    Updates a saved FAISS index with the files that changed since it was built.
+
+    Chunks of added and changed files are embedded and added, and then the previous
+    chunks of removed and changed files are deleted from the index and docstore. A
+    changed file that fails to load keeps its previous chunks, and is retried on the
+    next run. Files whose dropped near-duplicate chunks alias deleted chunks are
+    indexed again, and the aliases of changed and removed files are removed. HNSW and
+    IVF indexes cannot delete chunks, so they are only updated when files were added.
+
+    Parameters:
+        index_path (str): The directory of the saved index.
+        manifest (IndexManifest): The manifest of the saved index.
+        meta (dict): The metadata of the index, from get_index_meta.
+        books_directory (str): The directory containing the files.
+        files (list): The names of the files currently in the directory.
+        loader_class: The loader class for the file type.
+        embeddings_model: The embeddings model the index was built with.
+
+    Returns:
+        bool: True if the index was updated, False if it has to be rebuilt.
+    """
+    file_hashes = {file: hash_file(os.path.join(books_directory, file)) for file in files}
+    added, changed, removed = manifest.diff(file_hashes)
+    print(f"Incremental update: {len(added)} added, {len(changed)} changed, "
+          f"{len(removed)} removed files.")
+    saved_meta = load_index_meta(index_path)
+    meta = dict(meta, index_type=saved_meta["index_type"], version=saved_meta.get("version"))
+    if (changed or removed) and meta["index_type"] not in REMOVABLE_INDEX_TYPES:
+        print(f"Chunks cannot be deleted from the {meta['index_type']} index; "
+              "rebuilding the index.")
+        return False
+    if (not (added or changed or removed) and has_chunk_store(index_path)
+            and (has_lexical_index(index_path) or not meta["lexical"])):
+        save_index_meta(index_path, meta)
+        return True
+
+    vector_store_index = FAISS.load_local(index_path, embeddings_model,
+                                          allow_dangerous_deserialization=True)
+    full_vectors = None
+    if meta["two_stage"]:
+        full_vectors = FullVectorStore.load(index_path, meta["full_dimension"])
+
+    # Files whose dropped duplicates alias deleted chunks are indexed again
+    dependents = manifest.dependent_files(changed + removed)
+    if dependents:
+        print(f"Re-indexing {len(dependents)} files with duplicates of deleted chunks.")
+    changed = changed + dependents
+
+    # Changed files are loaded before their old chunks are deleted, so a file that fails
+    # to load keeps its previous chunks
+    deduplicator = get_deduplicator()
+    vector_store_index, chunk_count, file_chunk_ids = index_files(
+        books_directory, added + changed, loader_class, embeddings_model, meta,
+        vector_store_index, full_vectors, deduplicator)
+    failed_files = [file for file in changed if file not in file_chunk_ids]
+    for file in failed_files:
+        # A file without its hash counts as changed, so the next run retries it
+        record = manifest.files[file]
+        manifest.record(file, None, record["chunk_ids"], record.get("alias_ids"))
+
+    stale_ids = []
+    old_alias_ids = {}
+    for file in [file for file in changed if file in file_chunk_ids] + removed:
+        old_alias_ids[file] = manifest.files[file].get("alias_ids", [])
+        stale_ids.extend(manifest.forget(file))
+    deleted_ids = set(stale_ids)
+    for file, chunk_ids in old_alias_ids.items():
+        remove_aliases(file, [chunk_id for chunk_id in chunk_ids if chunk_id not in deleted_ids],
+                       vector_store_index.docstore.search)
+    if stale_ids:
+        vector_store_index.delete(stale_ids)
+        if full_vectors is not None:
+            full_vectors.delete(stale_ids)
+
+    alias_ids = deduplicator.aliased_chunk_ids() if deduplicator is not None else {}
+    for file, chunk_ids in file_chunk_ids.items():
+        manifest.record(file, file_hashes[file], chunk_ids, alias_ids.get(file))
+
+    print(f"Deleted {len(stale_ids)} chunks and added {chunk_count} chunks.")
+    save_faiss_index(vector_store_index, index_path, meta, full_vectors)
+    manifest.save()
+    return True
+
+def build_index(index_path, books_directory, files, loader_class, embeddings_model, meta):
+    """
+    Builds the vector store index, or updates it incrementally when possible.
+
+    Parameters:
+        index_path (str): The directory of the saved index.
+        books_directory (str): The directory containing the files.
+        files (list): The names of the files to index.
+        loader_class: The loader class for the file type.
+        embeddings_model: The embeddings model used to embed the chunks.
+        meta (dict): The metadata of the index, from get_index_meta.
+
+    Returns:
+        None
+    """
+    vector_store = cfg.VECTOR_STORE
+    settings = get_index_settings()
+
+    manifest = IndexManifest.load(index_path) if cfg.INCREMENTAL_INDEX else None
+    if vector_store == "faiss" and manifest is not None and manifest.settings == settings:
+        if update_index(index_path, manifest, meta, books_directory, files, loader_class,
+                        embeddings_model):
+            return
+    elif manifest is not None:
+        print("Index settings changed since the last run; rebuilding the index.")
+    full_vectors = None
+    deduplicator = get_deduplicator()
+    if vector_store == "faiss":
+        if meta["two_stage"]:
+            full_vectors = FullVectorStore.create(index_path, meta["full_dimension"])
+        vector_store_index, _, file_chunk_ids = index_files(
+            books_directory, files, loader_class, embeddings_model, meta,
+            full_vectors=full_vectors, deduplicator=deduplicator)
+    else:
+        if cfg.EMBEDDING_DIMENSION:
+            print("EMBEDDING_DIMENSION only applies to FAISS indexes; storing full-width "
+                  "vectors.")
+        file_chunk_ids = {}
+        chunks = list(iter_chunks(books_directory, files, loader_class, file_chunk_ids,
+                                  deduplicator))
+        report_failed_files(files, file_chunk_ids)
+        if deduplicator is not None:
+            print(f"Dropped {deduplicator.duplicates} near-duplicate chunks.")
+            apply_aliases(deduplicator.aliases, dict(chunks).get)
+        vector_store_index = get_vector_store(vector_store, [doc for _, doc in chunks],
+                                              embeddings_model,
+                                              ids=[chunk_id for chunk_id, _ in chunks])
+    if vector_store_index is None:
+        print("No chunks to index.")
+        return
+    if vector_store == "faiss":
+        meta = dict(meta, index_type=get_index_type(vector_store_index.index))
+        save_faiss_index(vector_store_index, index_path, meta, full_vectors)
+    else:
+        save_index_files(vector_store_index, index_path)
+
+    manifest = IndexManifest(index_path, settings)
+    alias_ids = deduplicator.aliased_chunk_ids() if deduplicator is not None else {}
+    for file, chunk_ids in file_chunk_ids.items():
+        manifest.record(file, hash_file(os.path.join(books_directory, file)), chunk_ids,
+                        alias_ids.get(file))
+    manifest.save()
+
+def build_library(library_directory, catalog_directory, embeddings_model, meta):
+    """
+    Builds one FAISS index per book of a library and records them in a shard catalog.
+
+    Every subdirectory of the library directory is a book, indexed on its own into a
+    shard named after it. Shards are updated incrementally like single indexes, so
+    adding or changing a book leaves the indexes of the other books untouched. The
+    shards of books no longer in the library are deleted.
+
+    Parameters:
+        library_directory (str): The directory containing one directory per book.
+        catalog_directory (str): The directory of the catalog and its shards.
+        embeddings_model: The embeddings model used to embed the chunks.
+        meta (dict): The metadata of the indexes, from get_index_meta.
+
+    Returns:
+        ShardCatalog: The saved catalog.
+
+    Raises:
+        ValueError: If VECTOR_STORE is not 'faiss'.
+    """
+    if cfg.VECTOR_STORE != "faiss":
+        raise ValueError("Sharded indexes are only supported for the 'faiss' vector store.")
+    books = sorted(entry for entry in os.listdir(library_directory)
+                   if os.path.isdir(os.path.join(library_directory, entry)))
+    catalog = ShardCatalog.load(catalog_directory)
+    for i, book in enumerate(books):
+        book_directory = os.path.join(library_directory, book)
+        files, loader_class = list_files(book_directory, cfg.FILE_TYPE)
+        print(f"Indexing book {i + 1} out of {len(books)}: {book} ({len(files)} files)")
+        index_path = catalog.shard_path(book)
+        build_index(index_path, book_directory, files, loader_class, embeddings_model, meta)
+        if load_index_meta(index_path) is not None:
+            catalog.register(book, index_path)
+    for book in sorted(set(catalog.shards) - set(books)):
+        print(f"Removing the shard of {book}, which is no longer in the library.")
+        catalog.remove(book)
+    catalog.save()
+    print(f"Saved a catalog of {len(catalog.shards)} shards to '{catalog_directory}'.")
+    return catalog
+
+def create_chunks_embeddings():
+    """
+    Processes files in the given directory, splits the text into chunks, generates embeddings,
+    and creates a vector store index using configuration from config.py.
+    """
+    books_directory = cfg.BOOKS_DIRECTORY
+    file_type = cfg.FILE_TYPE
+    embedding_model = cfg.EMBEDDING_MODEL
+    model_type = cfg.MODEL_TYPE
+    vector_store = cfg.VECTOR_STORE
+    use_embedding_cache = cfg.USE_EMBEDDING_CACHE
+
+    if cfg.SHARDED_INDEX:
+        print(f"Indexing every book in the directory '{cfg.LIBRARY_DIRECTORY}' on its own.")
+    else:
+        files, loader_class = list_files(books_directory, file_type)
+        file_count = len(files)
+        print(f"Found {file_count} {file_type.upper()} files in the directory "
+              f"'{books_directory}'.")
 
-        all_documents.extend(documents)
+    base_model = get_embeddings_model(embedding_model, model_type,
+                                      cfg.EMBEDDING_ENCODE_BATCH_SIZE, cfg.EMBEDDING_WORKERS)
+    embeddings_model = base_model
+    if use_embedding_cache:
+        embeddings_model = CachedEmbeddings(embeddings_model, cfg.EMBEDDING_CACHE_DIRECTORY,
+                                            cfg.EMBEDDING_CACHE_MAX_ENTRIES)
 
-    chunked_documents = process_documents(all_documents, chunk_size, chunk_overlap)
+    try:
+        if cfg.SHARDED_INDEX:
+            build_library(cfg.LIBRARY_DIRECTORY, cfg.LIBRARY_INDEX_DIRECTORY, embeddings_model,
+                          get_index_meta(base_model))
+        else:
+            last_folder_name = os.path.basename(os.path.normpath(books_directory))
+            index_path = f"{last_folder_name}_{vector_store}_index_books"
+            build_index(index_path, books_directory, files, loader_class, embeddings_model,
+                        get_index_meta(base_model))
+    finally:
+        if isinstance(base_model, CustomArabicEmbeddings):
+            base_model.close()
+        if isinstance(base_model, CustomArabicEmbeddings) and base_model.chunks_embedded:
+            print(f"Embedded {base_model.chunks_embedded} chunks at "
+                  f"{base_model.chunks_per_second:.1f} chunks/s.")
 
-    embeddings_model = get_embeddings_model(embedding_model, model_type)
-    vector_store_index = get_vector_store(vector_store, chunked_documents, embeddings_model)
-    last_folder_name = os.path.basename(os.path.normpath(books_directory))
-    vector_store_index.save_local(f"{last_folder_name}_{vector_store}_index_books")
+    if use_embedding_cache:
+        print(f"Embedding cache: {embeddings_model.hits} chunks reused, "
+              f"{embeddings_model.misses} chunks embedded.")
 
 if __name__ == "__main__":
+    metrics.configure_from_env()
     create_chunks_embeddings()
@@ -0,0 +1,199 @@
+"""
+This module finds near-duplicate chunks before they are embedded.
+
+Scraped books repeat headers, chains of narrators (isnads) and boilerplate, and
+overlapping chunks repeat text again. Every chunk is reduced to a MinHash signature
+of the shingles (runs of consecutive words) of its Arabic-normalized text, and a
+locality-sensitive hashing (LSH) index of the signatures finds earlier chunks that
+probably share most of its shingles. If the estimated Jaccard similarity with one
+of them reaches the threshold, the chunk is dropped, and its metadata is kept as an
+alias of the chunk it duplicates, so the sources of the text are not lost.
+"""
+
+import zlib
+import numpy as np
+from arabic_text import tokenize
+
+# Odd multipliers of the multiply-shift hash family combining word hashes into shingles
+SHINGLE_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                                0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD], dtype=np.uint64)
+
+def shingle_hashes(text, shingle_size=3):
+    """
+    Hashes the shingles of the Arabic-normalized words of a text.
+
+    Parameters:
+        text (str): The text.
+        shingle_size (int): The number of consecutive words per shingle. Defaults to 3.
+
+    Returns:
+        numpy.ndarray: The 32-bit hashes of the distinct shingles, as uint64. Texts
+        shorter than a shingle have one shingle of all their words.
+    """
+    words = tokenize(text)
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    word_hashes = np.array([zlib.crc32(word.encode('utf-8')) for word in words],
+                           dtype=np.uint64)
+    size = min(shingle_size, len(word_hashes), len(SHINGLE_MULTIPLIERS))
+    count = len(word_hashes) - size + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        combined += word_hashes[offset:offset + count] * SHINGLE_MULTIPLIERS[offset]
+    return np.unique(combined >> np.uint64(32))
+
+class ChunkDeduplicator:
+    """
+    Drops chunks whose text nearly duplicates an earlier chunk, keeping them as aliases.
+
+    Attributes:
+        threshold (float): The minimum estimated Jaccard similarity of duplicates.
+        shingle_size (int): The number of consecutive words per shingle.
+        bands (int): The number of LSH bands the signatures are split into.
+        aliases (dict): The metadata of the dropped duplicates of every kept chunk,
+            by chunk ID.
+        duplicates (int): The number of dropped chunks.
+    """
+    def __init__(self, threshold=0.8, shingle_size=3, num_perm=128, bands=16, seed=0):
+        """
+        Initializes a ChunkDeduplicator instance.
+
+        Parameters:
+            threshold (float): The minimum estimated Jaccard similarity between the
+                shingles of two chunks for them to be duplicates. Defaults to 0.8.
+            shingle_size (int): The number of consecutive words per shingle. Defaults to 3.
+            num_perm (int): The number of hash functions of the MinHash signatures.
+                Defaults to 128.
+            bands (int): The number of LSH bands; must divide `num_perm`. More bands
+                find less similar candidates. Defaults to 16.
+            seed (int): The seed of the hash functions. Defaults to 0.
+
+        Raises:
+            ValueError: If `bands` does not divide `num_perm`.
+        """
+        if num_perm % bands:
+            raise ValueError(f"The number of bands ({bands}) must divide the number of "
+                             f"hash functions ({num_perm}).")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.aliases = {}
+        self.duplicates = 0
+        rng = np.random.default_rng(seed)
+        self._multipliers = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) * 2 + 1
+        self._offsets = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        self._chunk_ids = []
+
+    def signature(self, text):
+        """
+        Computes the MinHash signature of a text.
+
+        Parameters:
+            text (str): The text.
+
+        Returns:
+            numpy.ndarray: The signature, as uint32, or None if the text has no words.
+        """
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not len(hashes):
+            return None
+        # Multiply-shift hashing of every shingle by every hash function
+        permuted = (hashes[np.newaxis, :] * self._multipliers[:, np.newaxis]
+                    + self._offsets[:, np.newaxis]) >> np.uint64(32)
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def add(self, chunk_id, doc, source=None):
+        """
+        Adds a chunk, unless it nearly duplicates a chunk added before.
+
+        Parameters:
+            chunk_id (str): The ID of the chunk.
+            doc (Document): The chunk.
+            source (str, optional): The name of the file of the chunk, recorded as the
+                'source' of its alias. Defaults to None.
+
+        Returns:
+            str: The ID of the chunk it duplicates, in which case its metadata is
+            recorded as an alias of that chunk, or None if the chunk is kept.
+        """
+        signature = self.signature(doc.page_content)
+        if signature is None:
+            return None
+        band_keys = [band.tobytes() for band in np.split(signature, self.bands)]
+
+        candidates = set()
+        for buckets, key in zip(self._buckets, band_keys):
+            candidates.update(buckets.get(key, ()))
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = np.mean(self._signatures[candidate] == signature)
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        if best is not None:
+            original_id = self._chunk_ids[best]
+            alias = dict(doc.metadata)
+            if source is not None:
+                alias["source"] = source
+            self.aliases.setdefault(original_id, []).append(alias)
+            self.duplicates += 1
+            return original_id
+
+        position = len(self._chunk_ids)
+        self._signatures.append(signature)
+        self._chunk_ids.append(chunk_id)
+        for buckets, key in zip(self._buckets, band_keys):
+            buckets.setdefault(key, []).append(position)
+        return None
+
+    def aliased_chunk_ids(self):
+        """
+        Returns the chunks duplicated by the dropped chunks of every source file.
+
+        Returns:
+            dict: The IDs of the kept chunks aliasing chunks of every file, by the
+            'source' of the aliases.
+        """
+        chunk_ids = {}
+        for chunk_id, chunk_aliases in self.aliases.items():
+            for alias in chunk_aliases:
+                source_ids = chunk_ids.setdefault(alias.get("source"), [])
+                if chunk_id not in source_ids:
+                    source_ids.append(chunk_id)
+        return chunk_ids
+
+def apply_aliases(aliases, get_document):
+    """
+    Adds the metadata of dropped duplicates to the chunks they duplicate.
+
+    Parameters:
+        aliases (dict): The aliases of every kept chunk, by chunk ID.
+        get_document (callable): Returns the Document of a chunk ID.
+
+    Returns:
+        None
+    """
+    for chunk_id, chunk_aliases in aliases.items():
+        metadata = get_document(chunk_id).metadata
+        metadata["aliases"] = metadata.get("aliases", []) + chunk_aliases
+
+def remove_aliases(source, chunk_ids, get_document):
+    """
+    Removes the aliases of a source file from the chunks they duplicate.
+
+    Parameters:
+        source (str): The name of the source file.
+        chunk_ids (iterable): The IDs of the chunks with aliases from the file.
+        get_document (callable): Returns the Document of a chunk ID.
+
+    Returns:
+        None
+    """
+    for chunk_id in chunk_ids:
+        metadata = get_document(chunk_id).metadata
+        aliases = [alias for alias in metadata.get("aliases", []) if alias.get("source") != source]
+        if aliases:
+            metadata["aliases"] = aliases
+        else:
+            metadata.pop("aliases", None)
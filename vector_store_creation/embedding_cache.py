@@ -0,0 +1,226 @@
+"""
+This module provides a persistent cache of chunk embeddings.
+
+Vectors are stored compactly as rows of a float32 file, and a SQLite index maps the
+hash of each chunk text to its row. The cache of each embeddings model lives in its
+own directory, named after the model and its dimension, so every entry is keyed by
+(model name, dimension, text hash). When the cache holds more than its maximum
+number of entries, the least recently used ones are evicted and their rows reused.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from models import get_model_identity
+
+class EmbeddingCache:
+    """
+    An on-disk cache of embeddings for one model and dimension.
+
+    Attributes:
+        directory (str): The directory holding the vector file and its index.
+        dimension (int): The dimension of the cached vectors.
+        max_entries (int): The maximum number of cached vectors.
+    """
+    def __init__(self, root_directory, model_name, dimension, max_entries):
+        """
+        Initializes an EmbeddingCache instance, creating its files if needed.
+
+        Parameters:
+            root_directory (str): The directory holding the caches of all models.
+            model_name (str): The name of the embeddings model.
+            dimension (int): The dimension of the embeddings.
+            max_entries (int): The maximum number of cached vectors.
+        """
+        safe_name = model_name.replace('/', '__')
+        self.directory = os.path.join(root_directory, f"{safe_name}-{dimension}")
+        self.dimension = dimension
+        self.max_entries = max_entries
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.vectors_path = os.path.join(self.directory, 'vectors.f32')
+        if not os.path.exists(self.vectors_path):
+            open(self.vectors_path, 'wb').close()  # pylint: disable=consider-using-with
+
+        self.connection = sqlite3.connect(os.path.join(self.directory, 'index.sqlite'))
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key BLOB PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY);
+        ''')
+
+    @staticmethod
+    def text_key(text):
+        """
+        Returns the cache key of a chunk text.
+
+        Parameters:
+            text (str): The chunk text.
+
+        Returns:
+            bytes: The SHA-256 digest of the text.
+        """
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def _row_count(self):
+        return os.path.getsize(self.vectors_path) // (self.dimension * 4)
+
+    def _lookup_rows(self, keys):
+        rows = {}
+        unique_keys = list(set(keys))
+        for start in range(0, len(unique_keys), 500):
+            batch = unique_keys[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows.update(self.connection.execute(
+                f'SELECT key, row FROM entries WHERE key IN ({placeholders})', batch))
+        return rows
+
+    def get_many(self, keys):
+        """
+        Looks up the cached vectors of several keys.
+
+        Parameters:
+            keys (list): The keys returned by text_key.
+
+        Returns:
+            dict: The cached vectors (numpy arrays), keyed by their position in `keys`.
+        """
+        rows = self._lookup_rows(keys)
+        if not rows:
+            return {}
+
+        now = time.time()
+        self.connection.executemany('UPDATE entries SET last_used = ? WHERE key = ?',
+                                    [(now, key) for key in rows])
+        self.connection.commit()
+
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                            shape=(self._row_count(), self.dimension))
+        return {i: np.array(vectors[rows[key]]) for i, key in enumerate(keys) if key in rows}
+
+    def put_many(self, keys, vectors):
+        """
+        Stores vectors in the cache, evicting the least recently used entries if needed.
+
+        Parameters:
+            keys (list): The keys returned by text_key.
+            vectors (array-like): The vectors, one per key.
+
+        Returns:
+            None
+        """
+        new_entries = dict(zip(keys, vectors))
+        for key in self._lookup_rows(list(new_entries)):
+            del new_entries[key]
+        if not new_entries:
+            return
+
+        overflow = len(self) + len(new_entries) - self.max_entries
+        if overflow > 0:
+            self._evict(overflow)
+
+        free_rows = [row for row, in self.connection.execute(
+            'SELECT row FROM free_rows ORDER BY row LIMIT ?', (len(new_entries),))]
+        next_row = self._row_count()
+        while len(free_rows) < len(new_entries):
+            free_rows.append(next_row)
+            next_row += 1
+
+        now = time.time()
+        with open(self.vectors_path, 'r+b') as file:
+            for row, vector in sorted(zip(free_rows, new_entries.values()), key=lambda x: x[0]):
+                file.seek(row * self.dimension * 4)
+                file.write(np.asarray(vector, dtype=np.float32).tobytes())
+        self.connection.executemany('DELETE FROM free_rows WHERE row = ?',
+                                    [(row,) for row in free_rows])
+        self.connection.executemany('INSERT INTO entries (key, row, last_used) VALUES (?, ?, ?)',
+                                    [(key, row, now) for key, row in zip(new_entries, free_rows)])
+        self.connection.commit()
+
+    def _evict(self, count):
+        evicted = self.connection.execute(
+            'SELECT key, row FROM entries ORDER BY last_used LIMIT ?', (count,)).fetchall()
+        self.connection.executemany('DELETE FROM entries WHERE key = ?',
+                                    [(key,) for key, _ in evicted])
+        self.connection.executemany('INSERT OR IGNORE INTO free_rows (row) VALUES (?)',
+                                    [(row,) for _, row in evicted])
+
+    def close(self):
+        """
+        Closes the index of the cache.
+
+        Returns:
+            None
+        """
+        self.connection.close()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model so chunks that were embedded before are read from the cache.
+
+    Attributes:
+        embeddings_model: The wrapped embeddings model.
+        cache (EmbeddingCache): The cache of the model's embeddings.
+        hits (int): The number of chunks served from the cache.
+        misses (int): The number of chunks embedded by the model.
+    """
+    def __init__(self, embeddings_model, cache_directory, max_entries):
+        """
+        Initializes a CachedEmbeddings instance.
+
+        Parameters:
+            embeddings_model: An embeddings model returned by get_embeddings_model.
+            cache_directory (str): The directory holding the caches of all models.
+            max_entries (int): The maximum number of cached vectors.
+        """
+        model_name, dimension = get_model_identity(embeddings_model)
+        self.embeddings_model = embeddings_model
+        self.cache = EmbeddingCache(cache_directory, model_name, dimension, max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        """
+        Generates embeddings for a list of texts, embedding only those not in the cache.
+
+        Parameters:
+            texts (list): List of texts to embed.
+
+        Returns:
+            numpy.ndarray: The embeddings of the texts, one row per text.
+        """
+        keys = [EmbeddingCache.text_key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i in range(len(texts)) if i not in cached]
+
+        vectors = np.empty((len(texts), self.cache.dimension), dtype=np.float32)
+        for i, vector in cached.items():
+            vectors[i] = vector
+        if missing:
+            new_vectors = self.embeddings_model.embed_documents([texts[i] for i in missing])
+            new_vectors = np.asarray(new_vectors, dtype=np.float32)
+            vectors[missing] = new_vectors
+            self.cache.put_many([keys[i] for i in missing], new_vectors)
+
+        self.hits += len(cached)
+        self.misses += len(missing)
+        return vectors
+
+    def embed_query(self, text):
+        """
+        Generates the embedding of a query; queries are not cached.
+
+        Parameters:
+            text (str): The query to embed.
+
+        Returns:
+            list: The embedding of the query.
+        """
+        return self.embeddings_model.embed_query(text)
@@ -0,0 +1,135 @@
+"""
+This module creates the FAISS indexes behind FAISS vector stores.
+
+Besides the exact flat index, approximate indexes can be selected: HNSW graphs,
+inverted-file indexes storing full vectors (IVF-Flat) or product-quantized codes
+(IVF-PQ), and 8-bit scalar-quantized indexes (SQ8). Indexes that need training are
+trained on a sample of the embeddings before any vector is added. Their search
+parameters (nprobe for IVF indexes, efSearch for HNSW) are saved in the index
+metadata and applied again when the index is loaded.
+"""
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS  # pylint: disable=no-name-in-module
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq8")
+
+# Index types whose vectors can be removed with the positions of the remaining
+# vectors shifted down, as LangChain's FAISS.delete expects
+REMOVABLE_INDEX_TYPES = ("flat", "sq8")
+
+# Minimum number of training points per cluster recommended by FAISS
+POINTS_PER_CENTROID = 39
+
+def get_index_description(index_type, dimension, params, training_size):
+    """
+    Returns the FAISS index factory string of an index type.
+
+    The number of IVF clusters is reduced when the training sample is too small to
+    train them well.
+
+    Parameters:
+        index_type (str): One of INDEX_TYPES.
+        dimension (int): The dimension of the indexed vectors.
+        params (dict): The index parameters ('hnsw_m', 'nlist', 'pq_m', 'pq_nbits').
+        training_size (int): The number of vectors the index is trained on.
+
+    Returns:
+        str: The factory string, or 'Flat' if the sample is too small to train
+        a product quantizer.
+
+    Raises:
+        ValueError: If the index type is unknown or 'pq_m' does not divide the dimension.
+    """
+    nlist = max(1, min(params["nlist"], training_size // POINTS_PER_CENTROID))
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{params['hnsw_m']}"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        if dimension % params["pq_m"]:
+            raise ValueError(f"PQ_M ({params['pq_m']}) must divide the dimension ({dimension}).")
+        if training_size < 2 ** params["pq_nbits"]:
+            print(f"Only {training_size} vectors to train IVF-PQ; using a flat index.")
+            return "Flat"
+        return f"IVF{nlist},PQ{params['pq_m']}x{params['pq_nbits']}"
+    if index_type == "sq8":
+        return "SQ8"
+    raise ValueError(f"Unsupported FAISS index type: {index_type}")
+
+def set_search_params(index, params):
+    """
+    Applies the search parameters of an index.
+
+    Parameters:
+        index (faiss.Index): The index.
+        params (dict): The index parameters ('nprobe', 'ef_search').
+
+    Returns:
+        None
+    """
+    ivf_index = faiss.try_extract_index_ivf(index)
+    if ivf_index is not None and params.get("nprobe"):
+        ivf_index.nprobe = params["nprobe"]
+    if hasattr(index, "hnsw") and params.get("ef_search"):
+        index.hnsw.efSearch = params["ef_search"]
+
+def create_index(index_type, params, training_vectors):
+    """
+    Creates an empty FAISS index, trained on a sample of the vectors it will hold.
+
+    Parameters:
+        index_type (str): One of INDEX_TYPES.
+        params (dict): The index parameters.
+        training_vectors (numpy.ndarray): The training sample, one row per vector.
+
+    Returns:
+        faiss.Index: The trained, empty index.
+    """
+    training_size, dimension = training_vectors.shape
+    description = get_index_description(index_type, dimension, params, training_size)
+    index = faiss.index_factory(dimension, description, faiss.METRIC_L2)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = params["ef_construction"]
+    if not index.is_trained:
+        print(f"Training {description} index on {training_size} vectors.")
+        index.train(training_vectors)
+    set_search_params(index, params)
+    return index
+
+def get_index_type(index):
+    """
+    Returns the type of a FAISS index.
+
+    Parameters:
+        index (faiss.Index): The index.
+
+    Returns:
+        str: One of INDEX_TYPES.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+def create_vector_store(embeddings_model, index):
+    """
+    Wraps an empty FAISS index in a LangChain vector store.
+
+    Parameters:
+        embeddings_model: The embeddings model used to embed queries.
+        index (faiss.Index): The empty index.
+
+    Returns:
+        FAISS: The empty vector store.
+    """
+    return FAISS(embeddings_model, index, InMemoryDocstore(), {})
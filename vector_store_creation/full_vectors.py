@@ -0,0 +1,170 @@
+"""
+This module stores the full-width embeddings of an index whose vectors were truncated.
+
+When an index holds truncated Matryoshka embeddings, the full-width embedding of every
+chunk is kept on disk next to it, so the top candidates of a search can be rescored
+exactly. The vectors are rows of a float32 file that is memory-mapped for reading,
+and a JSON list maps every row to its chunk ID.
+"""
+
+import os
+import json
+import numpy as np
+
+VECTORS_FILENAME = "full_vectors.f32"
+IDS_FILENAME = "full_vectors_ids.json"
+
+class FullVectorStore:
+    """
+    The full-width embeddings of the chunks of an index, keyed by chunk ID.
+
+    Rows of deleted chunks stay in the vector file until more than half of the rows
+    are unused, at which point the file is compacted when the store is saved.
+
+    Attributes:
+        directory (str): The directory of the index.
+        dimension (int): The dimension of the stored vectors.
+        ids (list): The chunk ID of every row, or None for rows of deleted chunks.
+        rows (dict): The row of every chunk ID.
+    """
+    def __init__(self, directory, dimension, ids=None):
+        """
+        Initializes a FullVectorStore instance.
+
+        Parameters:
+            directory (str): The directory of the index.
+            dimension (int): The dimension of the stored vectors.
+            ids (list, optional): The chunk ID of every row. Defaults to None (empty).
+        """
+        self.directory = directory
+        self.dimension = dimension
+        self.ids = ids or []
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)
+                     if chunk_id is not None}
+        self.vectors_path = os.path.join(directory, VECTORS_FILENAME)
+        self._vectors = None
+
+    @classmethod
+    def create(cls, directory, dimension):
+        """
+        Creates an empty store, replacing any vectors saved in the directory.
+
+        Parameters:
+            directory (str): The directory of the index.
+            dimension (int): The dimension of the stored vectors.
+
+        Returns:
+            FullVectorStore: The empty store.
+        """
+        os.makedirs(directory, exist_ok=True)
+        store = cls(directory, dimension)
+        open(store.vectors_path, 'wb').close()  # pylint: disable=consider-using-with
+        return store
+
+    @classmethod
+    def load(cls, directory, dimension):
+        """
+        Loads the store saved in a directory.
+
+        Rows appended after the store was last saved, by a run that did not finish,
+        are discarded.
+
+        Parameters:
+            directory (str): The directory of the index.
+            dimension (int): The dimension of the stored vectors.
+
+        Returns:
+            FullVectorStore: The store, or None if the directory has no saved store.
+        """
+        try:
+            with open(os.path.join(directory, IDS_FILENAME), 'r', encoding='utf-8') as file:
+                ids = json.load(file)
+        except FileNotFoundError:
+            return None
+        store = cls(directory, dimension, ids)
+        if os.path.getsize(store.vectors_path) > len(ids) * dimension * 4:
+            os.truncate(store.vectors_path, len(ids) * dimension * 4)
+        return store
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, ids, vectors):
+        """
+        Appends the vectors of new chunks.
+
+        Parameters:
+            ids (list): The chunk IDs.
+            vectors (array-like): The full-width vectors, one per chunk ID.
+
+        Returns:
+            None
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with open(self.vectors_path, 'ab') as file:
+            file.write(vectors.tobytes())
+        for chunk_id in ids:
+            self.rows[chunk_id] = len(self.ids)
+            self.ids.append(chunk_id)
+        self._vectors = None
+
+    def delete(self, ids):
+        """
+        Removes the vectors of deleted chunks.
+
+        Parameters:
+            ids (list): The chunk IDs.
+
+        Returns:
+            None
+        """
+        for chunk_id in ids:
+            row = self.rows.pop(chunk_id, None)
+            if row is not None:
+                self.ids[row] = None
+
+    def get(self, ids):
+        """
+        Reads the vectors of several chunks.
+
+        Parameters:
+            ids (list): The chunk IDs.
+
+        Returns:
+            numpy.ndarray: The vectors, one row per chunk ID.
+
+        Raises:
+            KeyError: If a chunk ID is not in the store.
+        """
+        if self._vectors is None:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                      shape=(len(self.ids), self.dimension))
+        return np.asarray(self._vectors[[self.rows[chunk_id] for chunk_id in ids]])
+
+    def save(self):
+        """
+        Saves the row IDs, compacting the vector file first if most rows are unused.
+
+        Returns:
+            None
+        """
+        if len(self.rows) * 2 < len(self.ids):
+            self._compact()
+        ids_path = os.path.join(self.directory, IDS_FILENAME)
+        with open(f"{ids_path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump(self.ids, file)
+        os.replace(f"{ids_path}.tmp", ids_path)
+
+    def _compact(self):
+        live_ids = [chunk_id for chunk_id in self.ids if chunk_id is not None]
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                            shape=(len(self.ids), self.dimension))
+        with open(f"{self.vectors_path}.tmp", 'wb') as file:
+            for start in range(0, len(live_ids), 4096):
+                batch = live_ids[start:start + 4096]
+                file.write(np.asarray(vectors[[self.rows[i] for i in batch]]).tobytes())
+        del vectors
+        os.replace(f"{self.vectors_path}.tmp", self.vectors_path)
+        self.ids = live_ids
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(live_ids)}
+        self._vectors = None
@@ -0,0 +1,155 @@
+"""
+This module keeps track of which source files make up a saved vector store index.
+
+The manifest is saved next to the index and maps every source file to the hash of
+its content and the IDs of the chunks it contributed. Comparing it with the files
+on disk tells an incremental run which chunks to add and which to delete.
+"""
+
+import os
+import json
+import hashlib
+
+MANIFEST_FILENAME = "files_manifest.json"
+
+def hash_file(file_path):
+    """
+    Computes the SHA-256 hash of a file's content.
+
+    Parameters:
+        file_path (str): The path of the file.
+
+    Returns:
+        str: The hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class IndexManifest:
+    """
+    The record of the source files and chunk IDs of a saved index.
+
+    Attributes:
+        index_path (str): The directory of the saved index.
+        settings (dict): The ingestion settings the index was built with.
+        files (dict): For every source file, its hash and the IDs of its chunks.
+    """
+    def __init__(self, index_path, settings=None, files=None):
+        """
+        Initializes an IndexManifest instance.
+
+        Parameters:
+            index_path (str): The directory of the saved index.
+            settings (dict, optional): The ingestion settings. Defaults to None.
+            files (dict, optional): The source file records. Defaults to None.
+        """
+        self.index_path = index_path
+        self.settings = settings or {}
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, index_path):
+        """
+        Loads the manifest of a saved index.
+
+        Parameters:
+            index_path (str): The directory of the saved index.
+
+        Returns:
+            IndexManifest: The manifest, or None if the index has no manifest.
+        """
+        try:
+            with open(os.path.join(index_path, MANIFEST_FILENAME), 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return None
+        return cls(index_path, data["settings"], data["files"])
+
+    def save(self):
+        """
+        Saves the manifest next to the index.
+
+        Returns:
+            None
+        """
+        os.makedirs(self.index_path, exist_ok=True)
+        manifest_path = os.path.join(self.index_path, MANIFEST_FILENAME)
+        with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump({"settings": self.settings, "files": self.files}, file,
+                      ensure_ascii=False, indent=2)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def diff(self, file_hashes):
+        """
+        Compares the recorded files with the files currently on disk.
+
+        Parameters:
+            file_hashes (dict): The current hash of every source file, keyed by file name.
+
+        Returns:
+            tuple: The lists of added, changed and removed file names.
+        """
+        added = [name for name in file_hashes if name not in self.files]
+        changed = [name for name in file_hashes
+                   if name in self.files and self.files[name]["hash"] != file_hashes[name]]
+        removed = [name for name in self.files if name not in file_hashes]
+        return added, changed, removed
+
+    def record(self, file_name, file_hash, chunk_ids, alias_ids=None):
+        """
+        Records the chunks a source file contributed to the index.
+
+        Parameters:
+            file_name (str): The name of the source file.
+            file_hash (str): The hash of the file's content.
+            chunk_ids (list): The IDs of the file's chunks in the index.
+            alias_ids (list, optional): The IDs of the chunks its near-duplicate
+                chunks were dropped in favour of. Defaults to None.
+
+        Returns:
+            None
+        """
+        self.files[file_name] = {"hash": file_hash, "chunk_ids": chunk_ids}
+        if alias_ids:
+            self.files[file_name]["alias_ids"] = alias_ids
+
+    def dependent_files(self, file_names):
+        """
+        Finds the files whose dropped duplicates alias chunks of the given files.
+
+        When the chunks of a file are deleted, the files whose near-duplicate chunks
+        were dropped in their favour have to be indexed again, and so on.
+
+        Parameters:
+            file_names (list): The names of the files whose chunks are deleted.
+
+        Returns:
+            list: The names of the other files to index again.
+        """
+        stale_files = set(file_names)
+        stale_ids = set()
+        dependents = []
+        pending = list(file_names)
+        while pending:
+            for file_name in pending:
+                stale_ids.update(self.files[file_name]["chunk_ids"])
+            pending = [name for name, record in self.files.items() if name not in stale_files
+                       and stale_ids.intersection(record.get("alias_ids", ()))]
+            stale_files.update(pending)
+            dependents.extend(pending)
+        return dependents
+
+    def forget(self, file_name):
+        """
+        Removes a source file from the manifest.
+
+        Parameters:
+            file_name (str): The name of the source file.
+
+        Returns:
+            list: The IDs of the chunks the file contributed.
+        """
+        return self.files.pop(file_name)["chunk_ids"]
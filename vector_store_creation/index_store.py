@@ -0,0 +1,260 @@
+"""
+This module saves and opens FAISS indexes in a memory-mapped format for searching.
+
+LangChain's FAISS.load_local reads every vector into memory and unpickles the text of
+every chunk before it can answer a query. Next to the files written by save_local,
+this module saves the chunks of an index in a compressed chunk store: every chunk is
+a zlib-compressed record in `chunks.bin`, found through an array of record offsets
+in `chunks_index.npy`, in the order of the vectors of the index. A MappedIndex opens
+the FAISS index memory-mapped where FAISS supports it, maps the offset arrays, and
+reads and decompresses only the chunks a search returns, so opening an index takes
+about the same time and memory whatever its size.
+
+Every file is written next to its destination and moved into place, so a service that
+has the previous files mapped keeps reading them while an index is rebuilt.
+"""
+
+import os
+import json
+import zlib
+import shutil
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+FAISS_FILENAME = "index.faiss"
+CHUNKS_FILENAME = "chunks.bin"
+OFFSETS_FILENAME = "chunks_index.npy"
+IDS_FILENAME = "chunk_ids.npy"
+FULL_ROWS_FILENAME = "full_vector_rows.npy"
+
+def _save_array(path, array):
+    with open(f"{path}.tmp", 'wb') as file:
+        np.save(file, array)
+    os.replace(f"{path}.tmp", path)
+
+def save_index_files(vector_store_index, index_path):
+    """
+    Saves a vector store with save_local, replacing the files of a previous save atomically.
+
+    The files are saved in a staging directory and then moved over the old ones, so the
+    old files are never written over in place while they are memory-mapped.
+
+    Parameters:
+        vector_store_index: The vector store.
+        index_path (str): The directory of the saved index.
+
+    Returns:
+        None
+    """
+    staging_path = f"{os.path.normpath(index_path)}.tmp"
+    shutil.rmtree(staging_path, ignore_errors=True)
+    vector_store_index.save_local(staging_path)
+    os.makedirs(index_path, exist_ok=True)
+    for filename in os.listdir(staging_path):
+        os.replace(os.path.join(staging_path, filename), os.path.join(index_path, filename))
+    os.rmdir(staging_path)
+
+def has_chunk_store(index_path):
+    """
+    Checks whether an index was saved with a chunk store.
+
+    Parameters:
+        index_path (str): The directory of the saved index.
+
+    Returns:
+        bool: True if the chunk store exists.
+    """
+    return os.path.exists(os.path.join(index_path, OFFSETS_FILENAME))
+
+def save_chunk_store(vector_store_index, index_path, full_vectors=None):
+    """
+    Saves the chunks of a FAISS vector store in a compressed, offset-indexed store.
+
+    Parameters:
+        vector_store_index (FAISS): The vector store, already saved with save_index_files.
+        index_path (str): The directory of the saved index.
+        full_vectors (FullVectorStore, optional): The full-width vectors of the
+            chunks, whose rows are saved in the order of the index. Defaults to None.
+
+    Returns:
+        None
+    """
+    chunk_ids = [vector_store_index.index_to_docstore_id[position]
+                 for position in range(vector_store_index.index.ntotal)]
+    offsets = np.zeros(len(chunk_ids) + 1, dtype=np.int64)
+    chunks_path = os.path.join(index_path, CHUNKS_FILENAME)
+    with open(f"{chunks_path}.tmp", 'wb') as file:
+        for position, chunk_id in enumerate(chunk_ids):
+            doc = vector_store_index.docstore.search(chunk_id)
+            record = json.dumps({"text": doc.page_content, "metadata": doc.metadata},
+                                ensure_ascii=False)
+            offsets[position + 1] = offsets[position] + file.write(
+                zlib.compress(record.encode('utf-8')))
+    os.replace(f"{chunks_path}.tmp", chunks_path)
+
+    _save_array(os.path.join(index_path, IDS_FILENAME), np.array(chunk_ids, dtype=np.bytes_))
+    if full_vectors is not None:
+        _save_array(os.path.join(index_path, FULL_ROWS_FILENAME),
+                    np.array([full_vectors.rows[chunk_id] for chunk_id in chunk_ids],
+                             dtype=np.int64))
+    _save_array(os.path.join(index_path, OFFSETS_FILENAME), offsets)
+
+def read_index_mapped(file_path, index_type):
+    """
+    Reads a FAISS index, memory-mapping its vectors where FAISS supports it.
+
+    Parameters:
+        file_path (str): The path of the FAISS index file.
+        index_type (str): The type of the index (see faiss_index.INDEX_TYPES).
+
+    Returns:
+        faiss.Index: The read-only index.
+    """
+    if index_type.startswith("ivf"):
+        flags = faiss.IO_FLAG_MMAP
+    else:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    return faiss.read_index(file_path, flags | faiss.IO_FLAG_READ_ONLY)
+
+class MappedIndex:
+    """
+    A FAISS index opened for searching, with its chunks read lazily from the chunk store.
+
+    Attributes:
+        index (faiss.Index): The FAISS index.
+        embeddings_model: The embeddings model used to embed queries.
+    """
+    def __init__(self, index_path, embeddings_model, index_type="flat"):
+        """
+        Initializes a MappedIndex instance.
+
+        Parameters:
+            index_path (str): The directory of the saved index.
+            embeddings_model: The embeddings model used to embed queries.
+            index_type (str): The type of the index. Defaults to 'flat'.
+
+        Raises:
+            ValueError: If the chunk store does not match the FAISS index.
+        """
+        self.index = read_index_mapped(os.path.join(index_path, FAISS_FILENAME), index_type)
+        self.embeddings_model = embeddings_model
+        self._offsets = np.load(os.path.join(index_path, OFFSETS_FILENAME), mmap_mode='r')
+        self._ids = np.load(os.path.join(index_path, IDS_FILENAME), mmap_mode='r')
+        full_rows_path = os.path.join(index_path, FULL_ROWS_FILENAME)
+        self._full_rows = (np.load(full_rows_path, mmap_mode='r')
+                           if os.path.exists(full_rows_path) else None)
+        if len(self._offsets) - 1 != self.index.ntotal:
+            raise ValueError(f"The chunk store in {index_path} does not match its FAISS index; "
+                             "run create_embeddings.py again.")
+        self._chunks_fd = os.open(os.path.join(index_path, CHUNKS_FILENAME), os.O_RDONLY)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def chunk_ids(self, positions):
+        """
+        Returns the chunk IDs of vectors of the index.
+
+        Parameters:
+            positions (list): The positions of the vectors in the index.
+
+        Returns:
+            list: The chunk IDs.
+        """
+        return [self._ids[position].decode() for position in positions]
+
+    def full_vector_rows(self, positions):
+        """
+        Returns the rows of the full-width vectors of vectors of the index.
+
+        Parameters:
+            positions (list): The positions of the vectors in the index.
+
+        Returns:
+            numpy.ndarray: The rows in the full-width vector file.
+        """
+        return self._full_rows[positions]
+
+    def documents(self, positions):
+        """
+        Reads the chunks of vectors of the index from the chunk store.
+
+        Parameters:
+            positions (list): The positions of the vectors in the index.
+
+        Returns:
+            list: The chunks, as Documents.
+        """
+        docs = []
+        for position in positions:
+            start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+            record = json.loads(zlib.decompress(os.pread(self._chunks_fd, end - start, start)))
+            docs.append(Document(page_content=record["text"], metadata=record["metadata"]))
+        return docs
+
+    def search_positions(self, embedding, k=4):
+        """
+        Finds the positions of the vectors nearest to a query vector.
+
+        Parameters:
+            embedding (list): The query vector.
+            k (int): The number of positions to return. Defaults to 4.
+
+        Returns:
+            list: (position, distance) pairs, nearest first.
+        """
+        distances, indices = self.index.search(np.array([embedding], dtype=np.float32), k)
+        return [(int(position), float(distance))
+                for position, distance in zip(indices[0], distances[0]) if position != -1]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        """
+        Finds the chunks nearest to a query vector.
+
+        Parameters:
+            embedding (list): The query vector.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: (Document, distance) pairs, nearest first.
+        """
+        hits = self.search_positions(embedding, k)
+        docs = self.documents([position for position, _ in hits])
+        return [(doc, float(distance)) for doc, (_, distance) in zip(docs, hits)]
+
+    def similarity_search_with_score(self, query, k=4):
+        """
+        Finds the chunks most similar to a query.
+
+        Parameters:
+            query (str): The query.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: (Document, distance) pairs, nearest first.
+        """
+        return self.similarity_search_with_score_by_vector(
+            self.embeddings_model.embed_query(query), k)
+
+    def similarity_search(self, query, k=4):
+        """
+        Finds the chunks most similar to a query.
+
+        Parameters:
+            query (str): The query.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: The documents, nearest first.
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def close(self):
+        """
+        Closes the chunk store.
+
+        Returns:
+            None
+        """
+        os.close(self._chunks_fd)
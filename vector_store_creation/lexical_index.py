@@ -0,0 +1,222 @@
+"""
+This module builds and searches a BM25 inverted index of the chunks of an index.
+
+Dense search can miss exact words, such as names, that the embeddings model does not
+distinguish well. The lexical index maps every normalized word (see arabic_text.py)
+to the chunks containing it, in the order of the vectors of the FAISS index, so its
+results are positions in the chunk store like those of a FAISS search.
+
+Postings are compressed: the chunk positions of a word are stored as gaps from the
+previous position, and the gaps and term frequencies as variable-length integers of
+7 bits per byte. The postings file is memory-mapped, and a search decodes only the
+postings of the words of the query, so it is cheap enough to run before or alongside
+the dense search on large libraries.
+"""
+
+import os
+import json
+from collections import Counter
+import numpy as np
+from arabic_text import tokenize
+
+TERMS_FILENAME = "lexical_terms.json"
+POSTINGS_FILENAME = "lexical_postings.bin"
+OFFSETS_FILENAME = "lexical_offsets.npy"
+LENGTHS_FILENAME = "lexical_lengths.npy"
+LEXICAL_FILENAMES = (TERMS_FILENAME, POSTINGS_FILENAME, OFFSETS_FILENAME, LENGTHS_FILENAME)
+
+def encode_varints(values):
+    """
+    Encodes non-negative integers as variable-length integers, 7 bits per byte.
+
+    Parameters:
+        values (numpy.ndarray): The integers.
+
+    Returns:
+        numpy.ndarray: The encoded bytes, as uint8.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    byte_counts = np.ones(len(values), dtype=np.int64)
+    for bits in range(7, 64, 7):
+        byte_counts += values >= np.uint64(1 << bits)
+    starts = np.cumsum(byte_counts) - byte_counts
+    byte_values = np.repeat(values, byte_counts)
+    byte_indices = np.arange(byte_counts.sum()) - np.repeat(starts, byte_counts)
+    encoded = (byte_values >> (7 * byte_indices).astype(np.uint64)) & np.uint64(0x7F)
+    # Every byte but the last of a value has its high bit set
+    last = np.zeros(len(encoded), dtype=bool)
+    last[starts + byte_counts - 1] = True
+    encoded[~last] |= np.uint64(0x80)
+    return encoded.astype(np.uint8)
+
+def decode_varints(data):
+    """
+    Decodes variable-length integers encoded by encode_varints.
+
+    Parameters:
+        data (numpy.ndarray): The encoded bytes, as uint8.
+
+    Returns:
+        numpy.ndarray: The integers, as int64.
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    byte_indices = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7F).astype(np.int64) << (7 * byte_indices)
+    return np.add.reduceat(parts, starts)
+
+def _save_array(path, array):
+    with open(f"{path}.tmp", 'wb') as file:
+        np.save(file, array)
+    os.replace(f"{path}.tmp", path)
+
+def has_lexical_index(index_path):
+    """
+    Checks whether an index was saved with a lexical index.
+
+    Parameters:
+        index_path (str): The directory of the saved index.
+
+    Returns:
+        bool: True if the lexical index exists.
+    """
+    return os.path.exists(os.path.join(index_path, TERMS_FILENAME))
+
+def remove_lexical_index(index_path):
+    """
+    Removes the lexical index of an index, if it has one.
+
+    Parameters:
+        index_path (str): The directory of the saved index.
+
+    Returns:
+        None
+    """
+    for filename in LEXICAL_FILENAMES:
+        path = os.path.join(index_path, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+def save_lexical_index(texts, index_path):
+    """
+    Builds the lexical index of the chunks of an index and saves it next to it.
+
+    Parameters:
+        texts (iterable): The texts of the chunks, in the order of the vectors of
+            the index.
+        index_path (str): The directory of the saved index.
+
+    Returns:
+        None
+    """
+    postings = {}
+    lengths = []
+    for position, text in enumerate(texts):
+        words = Counter(tokenize(text))
+        lengths.append(sum(words.values()))
+        for word, frequency in words.items():
+            postings.setdefault(word, ([], []))
+            postings[word][0].append(position)
+            postings[word][1].append(frequency)
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    postings_path = os.path.join(index_path, POSTINGS_FILENAME)
+    with open(f"{postings_path}.tmp", 'wb') as file:
+        for term_id, term in enumerate(terms):
+            positions, frequencies = postings.pop(term)
+            gaps = np.diff(np.asarray(positions, dtype=np.int64), prepend=0)
+            offsets[term_id + 1] = offsets[term_id] + file.write(
+                encode_varints(np.concatenate((gaps, frequencies))).tobytes())
+    os.replace(f"{postings_path}.tmp", postings_path)
+
+    _save_array(os.path.join(index_path, OFFSETS_FILENAME), offsets)
+    _save_array(os.path.join(index_path, LENGTHS_FILENAME), np.array(lengths, dtype=np.int32))
+    terms_path = os.path.join(index_path, TERMS_FILENAME)
+    with open(f"{terms_path}.tmp", 'w', encoding='utf-8') as file:
+        json.dump(terms, file, ensure_ascii=False)
+    os.replace(f"{terms_path}.tmp", terms_path)
+
+class LexicalIndex:
+    """
+    A BM25 index of the chunks of an index, opened for searching.
+
+    Attributes:
+        k1 (float): The BM25 term frequency saturation.
+        b (float): The BM25 length normalization.
+    """
+    def __init__(self, index_path, k1=1.2, b=0.75):
+        """
+        Initializes a LexicalIndex instance.
+
+        Parameters:
+            index_path (str): The directory of the saved index.
+            k1 (float): The BM25 term frequency saturation. Defaults to 1.2.
+            b (float): The BM25 length normalization. Defaults to 0.75.
+        """
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(index_path, TERMS_FILENAME), 'r', encoding='utf-8') as file:
+            self._term_ids = {term: term_id for term_id, term in enumerate(json.load(file))}
+        self._offsets = np.load(os.path.join(index_path, OFFSETS_FILENAME), mmap_mode='r')
+        self._lengths = np.load(os.path.join(index_path, LENGTHS_FILENAME))
+        postings_path = os.path.join(index_path, POSTINGS_FILENAME)
+        self._postings = (np.memmap(postings_path, dtype=np.uint8, mode='r')
+                          if os.path.getsize(postings_path) else np.zeros(0, dtype=np.uint8))
+        self._average_length = max(float(self._lengths.mean()), 1.0) if len(self._lengths) else 1.0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def postings(self, term):
+        """
+        Returns the postings of a normalized word.
+
+        Parameters:
+            term (str): The normalized word.
+
+        Returns:
+            tuple: The positions of the chunks containing the word, and the number
+            of times it occurs in each.
+        """
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        start, end = int(self._offsets[term_id]), int(self._offsets[term_id + 1])
+        values = decode_varints(self._postings[start:end])
+        count = len(values) // 2
+        return np.cumsum(values[:count]), values[count:]
+
+    def search(self, query, k=4):
+        """
+        Finds the chunks that best match the words of a query by BM25.
+
+        Parameters:
+            query (str): The query.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            tuple: The positions of the chunks, best first, and their BM25 scores.
+        """
+        positions, scores = [], []
+        chunk_count = len(self._lengths)
+        for term in set(tokenize(query)):
+            term_positions, frequencies = self.postings(term)
+            if not len(term_positions):
+                continue
+            idf = np.log(1 + (chunk_count - len(term_positions) + 0.5)
+                         / (len(term_positions) + 0.5))
+            norms = self.k1 * (1 - self.b + self.b * self._lengths[term_positions]
+                               / self._average_length)
+            positions.append(term_positions)
+            scores.append(idf * frequencies * (self.k1 + 1) / (frequencies + norms))
+        if not positions:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        positions, inverse = np.unique(np.concatenate(positions), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        best = np.argsort(-totals, kind='stable')[:k]
+        return positions[best], totals[best]
@@ -3,9 +3,13 @@ This module defines various embedding models and provides functionality to retri
 the appropriate model based on the specified type and name.
 """
 # pylint: disable=too-few-public-methods
+import time
+import zlib
 from enum import Enum
-from sentence_transformers import SentenceTransformer
+import numpy as np
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
+from arabic_text import tokenize
 
 class OpenAIModels(Enum):
     """
@@ -14,6 +18,12 @@ class OpenAIModels(Enum):
     ADA_002 = 'text-embedding-ada-002'
     TEXT_3_LARGE = 'text-embedding-3-large'
 
+# Output dimensions of the OpenAI embedding models
+OPENAI_DIMENSIONS = {
+    OpenAIModels.ADA_002.value: 1536,
+    OpenAIModels.TEXT_3_LARGE.value: 3072,
+}
+
 class HuggingFaceModels(Enum):
     """
     Enum class for Hugging Face model names.
@@ -24,18 +34,111 @@ class HuggingFaceModels(Enum):
     E5_MISTRAL_7B = 'intfloat/e5-mistral-7b-instruct'
     GTE_MULTILINGUAL = 'Alibaba-NLP/gte-multilingual-base'
 
-class CustomArabicEmbeddings:
+# OpenAI models whose embeddings can be shortened with the `dimensions` parameter
+OPENAI_TRUNCATABLE_MODELS = {OpenAIModels.TEXT_3_LARGE.name}
+
+def check_truncation(model_name, model_type, dimension):
+    """
+    Checks that a model's embeddings can be truncated to a dimension.
+
+    Parameters:
+        model_name (str): The name of the model.
+        model_type (str): The type of the model.
+        dimension (int, optional): The dimension embeddings are truncated to, or None.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If an OpenAI model other than text-embedding-3 is truncated.
+    """
+    if dimension and model_type == "openai" and model_name not in OPENAI_TRUNCATABLE_MODELS:
+        raise ValueError(f"EMBEDDING_DIMENSION is not supported by {model_name}; only "
+                         "text-embedding-3 models can be truncated.")
+
+# Output dimension of the hashing embeddings model
+HASHING_DIMENSION = 384
+
+def truncate_embeddings(embeddings, dimension):
+    """
+    Truncates Matryoshka embeddings to their leading dimensions.
+
+    Matryoshka models are trained so that a prefix of each embedding is an embedding
+    on its own; the truncated vectors are scaled back to unit length.
+
+    Parameters:
+        embeddings (array-like): The embeddings, one row per text.
+        dimension (int): The number of leading dimensions to keep.
+
+    Returns:
+        numpy.ndarray: The truncated and normalized embeddings.
+
+    Raises:
+        ValueError: If the dimension is larger than that of the embeddings.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dimension > embeddings.shape[-1]:
+        raise ValueError(f"Cannot truncate {embeddings.shape[-1]}-dimensional embeddings "
+                         f"to {dimension} dimensions.")
+    truncated = embeddings[..., :dimension]
+    norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-12)
+
+class CustomArabicEmbeddings(Embeddings):
     """
     A class for handling Arabic embeddings using the SentenceTransformer model.
+
+    Texts are sorted by length before batching, so each batch holds texts of similar
+    length and little compute is spent on padding; the embeddings are returned in the
+    original order. With more than one worker, batches are spread over a pool of
+    processes, one per worker. If a dimension is given, the embeddings of Matryoshka
+    models are truncated to it.
+
+    Attributes:
+        model_name (str): The name of the SentenceTransformer model.
+        batch_size (int): The number of texts encoded per batch.
+        workers (int): The number of encoding processes.
+        truncate_dimension (int): The dimension embeddings are truncated to, or None.
+        chunks_embedded (int): The number of texts embedded so far.
+        seconds_embedding (float): The time spent embedding so far.
     """
-    def __init__(self, model_name):
+    def __init__(self, model_name, batch_size=32, workers=1, dimension=None):
         """
         Initializes the CustomArabicEmbeddings with a specified model.
 
         Parameters:
             model_name (str): The name of the SentenceTransformer model.
+            batch_size (int): The number of texts encoded per batch. Defaults to 32.
+            workers (int): The number of encoding processes. Defaults to 1.
+            dimension (int, optional): The dimension embeddings are truncated to.
+                Defaults to None (full width).
         """
+        # Imported here, so the other models work without sentence-transformers installed
+        # pylint: disable-next=import-outside-toplevel
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.truncate_dimension = dimension
+        self.chunks_embedded = 0
+        self.seconds_embedding = 0.0
+        self._pool = None
+
+    @property
+    def full_dimension(self):
+        """int: The dimension of the embeddings produced by the model."""
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def dimension(self):
+        """int: The dimension of the embeddings returned, after any truncation."""
+        return self.truncate_dimension or self.full_dimension
+
+    @property
+    def chunks_per_second(self):
+        """float: The average embedding throughput so far."""
+        return self.chunks_embedded / self.seconds_embedding if self.seconds_embedding else 0.0
 
     def embed_documents(self, texts):
         """
@@ -45,30 +148,190 @@ class CustomArabicEmbeddings:
             texts (list): List of texts to embed.
 
         Returns:
-            list: List of embeddings for the given texts.
+            numpy.ndarray: The embeddings of the texts, one row per text.
+        """
+        start = time.perf_counter()
+        order = np.argsort([len(text) for text in texts], kind='stable')
+        sorted_texts = [texts[i] for i in order]
+
+        if self.workers > 1 and len(texts) > self.batch_size:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(['cpu'] * self.workers)
+            sorted_embeddings = self.model.encode_multi_process(
+                sorted_texts, self._pool, batch_size=self.batch_size,
+                chunk_size=max(self.batch_size, len(texts) // (self.workers * 4)))
+        else:
+            sorted_embeddings = self.model.encode(sorted_texts, batch_size=self.batch_size)
+
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        if self.truncate_dimension:
+            embeddings = truncate_embeddings(embeddings, self.truncate_dimension)
+
+        self.chunks_embedded += len(texts)
+        self.seconds_embedding += time.perf_counter() - start
+        return embeddings
+
+    def embed_query(self, text):
+        """
+        Generates the embedding of a query.
+
+        Parameters:
+            text (str): The query to embed.
+
+        Returns:
+            list: The embedding of the query.
         """
-        return self.model.encode(texts)
+        return self.embed_documents([text])[0].tolist()
+
+    def close(self):
+        """
+        Stops the pool of encoding processes, if one was started.
+
+        Returns:
+            None
+        """
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+class HashingEmbeddings(Embeddings):
+    """
+    A deterministic embeddings model that needs no model weights, for benchmarks and
+    offline runs.
+
+    Every Arabic-normalized word of a text is hashed to one dimension of the
+    embedding, with a sign also taken from its hash, and the embedding is scaled to
+    unit length. Texts sharing words get similar embeddings, so searches return
+    meaningful results, but the embeddings capture no meaning beyond the words.
+
+    Attributes:
+        model_name (str): The name of the model.
+        full_dimension (int): The dimension of the embeddings produced by the model.
+        truncate_dimension (int): The dimension embeddings are truncated to, or None.
+        chunks_embedded (int): The number of texts embedded so far.
+        seconds_embedding (float): The time spent embedding so far.
+    """
+    def __init__(self, full_dimension=HASHING_DIMENSION, dimension=None):
+        """
+        Initializes a HashingEmbeddings instance.
+
+        Parameters:
+            full_dimension (int): The dimension of the embeddings. Defaults to
+                HASHING_DIMENSION.
+            dimension (int, optional): The dimension embeddings are truncated to.
+                Defaults to None (full width).
+        """
+        self.model_name = "hashing"
+        self.full_dimension = full_dimension
+        self.truncate_dimension = dimension
+        self.chunks_embedded = 0
+        self.seconds_embedding = 0.0
+
+    @property
+    def dimension(self):
+        """int: The dimension of the embeddings returned, after any truncation."""
+        return self.truncate_dimension or self.full_dimension
+
+    @property
+    def chunks_per_second(self):
+        """float: The average embedding throughput so far."""
+        return self.chunks_embedded / self.seconds_embedding if self.seconds_embedding else 0.0
+
+    def embed_documents(self, texts):
+        """
+        Generates embeddings for a list of texts by hashing their words.
+
+        Parameters:
+            texts (list): List of texts to embed.
+
+        Returns:
+            numpy.ndarray: The embeddings of the texts, one row per text.
+        """
+        start = time.perf_counter()
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            words = tokenize(text)
+            rows.extend([row] * len(words))
+            hashes.extend(zlib.crc32(word.encode('utf-8')) for word in words)
+        hashes = np.asarray(hashes, dtype=np.int64)
+        signs = np.where(hashes & (1 << 31), -1.0, 1.0).astype(np.float32)
+        embeddings = np.zeros((len(texts), self.full_dimension), dtype=np.float32)
+        np.add.at(embeddings, (np.asarray(rows, dtype=np.int64), hashes % self.full_dimension),
+                  signs)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+        if self.truncate_dimension:
+            embeddings = truncate_embeddings(embeddings, self.truncate_dimension)
+
+        self.chunks_embedded += len(texts)
+        self.seconds_embedding += time.perf_counter() - start
+        return embeddings
+
+    def embed_query(self, text):
+        """
+        Generates the embedding of a query.
+
+        Parameters:
+            text (str): The query to embed.
+
+        Returns:
+            list: The embedding of the query.
+        """
+        return self.embed_documents([text])[0].tolist()
+
+def get_model_identity(embeddings_model):
+    """
+    Describes an embeddings model by the name and dimension of the vectors it produces.
+
+    Parameters:
+        embeddings_model: An embeddings model returned by get_embeddings_model.
+
+    Returns:
+        tuple: The model name (str) and the embedding dimension (int).
+
+    Raises:
+        ValueError: If the model is not one of the supported embedding classes.
+    """
+    if isinstance(embeddings_model, (CustomArabicEmbeddings, HashingEmbeddings)):
+        return embeddings_model.model_name, embeddings_model.dimension
+    if isinstance(embeddings_model, OpenAIEmbeddings):
+        dimension = embeddings_model.dimensions or OPENAI_DIMENSIONS[embeddings_model.model]
+        return embeddings_model.model, dimension
+    raise ValueError(f"Unsupported embeddings model: {type(embeddings_model).__name__}")
 
-def get_embeddings_model(model_name, model_type):
+def get_embeddings_model(model_name, model_type, batch_size=32, workers=1, dimension=None):
     """
     Retrieves the appropriate embeddings model based on the model type and name.
 
     Parameters:
         model_name (str): The name of the model.
-        model_type (str): The type of the model ('huggingface' or 'openai').
+        model_type (str): The type of the model ('huggingface', 'openai', or 'hashing'
+            for the offline HashingEmbeddings, whose name is 'HASHING').
+        batch_size (int): The number of texts encoded per batch by Hugging Face models.
+        workers (int): The number of encoding processes used by Hugging Face models.
+        dimension (int, optional): The dimension embeddings are truncated to.
+            Defaults to None (full width).
 
     Returns:
         embedding_model: The corresponding embedding model.
 
     Raises:
-        ValueError: If the model type or name is invalid.
+        ValueError: If the model type or name is invalid, or the model cannot be
+            truncated to the dimension.
     """
     if model_type == "huggingface":
         if not any(model_name == member.name for member in HuggingFaceModels):
             raise ValueError(f"Invalid Hugging Face model name: {model_name}")
-        return CustomArabicEmbeddings(HuggingFaceModels[model_name].value)
+        return CustomArabicEmbeddings(HuggingFaceModels[model_name].value, batch_size, workers,
+                                      dimension)
     if model_type == "openai":
         if not any(model_name == member.name for member in OpenAIModels):
             raise ValueError(f"Invalid OpenAI model name: {model_name}")
-        return OpenAIEmbeddings(model=OpenAIModels[model_name].value)
+        check_truncation(model_name, model_type, dimension)
+        return OpenAIEmbeddings(model=OpenAIModels[model_name].value, dimensions=dimension)
+    if model_type == "hashing":
+        if model_name != "HASHING":
+            raise ValueError(f"Invalid hashing model name: {model_name}")
+        return HashingEmbeddings(dimension=dimension)
     raise ValueError(f"Unsupported model type: {model_type}")
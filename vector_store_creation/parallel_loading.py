@@ -0,0 +1,120 @@
+"""
+This module loads and splits source files in a pool of worker processes.
+
+Extracting the text of PDF files is CPU-bound, so files are loaded, enriched with
+their metadata and split into chunks in parallel, one file per task. The chunks are
+returned in the order of the files, and a file that fails to load is reported and
+skipped without stopping the others, even if it crashes its worker process.
+"""
+
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from text_processing import process_documents
+
+def load_file(file_path, loader_class, metadata, chunk_size, chunk_overlap, splitter="recursive"):
+    """
+    Loads a file and splits it into chunks.
+
+    Parameters:
+        file_path (str): The path of the file.
+        loader_class: The loader class for the file type.
+        metadata (dict): The metadata added to every document, or None.
+        chunk_size (int): The maximum size of each chunk.
+        chunk_overlap (int): The overlap between chunks.
+        splitter (str): The text splitter (see text_processing.SPLITTERS).
+            Defaults to 'recursive'.
+
+    Returns:
+        list: The chunks of the file.
+    """
+    documents = loader_class(file_path).load()
+    if metadata:
+        for doc in documents:
+            doc.metadata.update(metadata)
+    return process_documents(documents, chunk_size, chunk_overlap, splitter)
+
+def load_files(books_directory, files, loader_class, chunk_size, chunk_overlap,
+               handle_metadata=True, workers=1, splitter="recursive"):
+    """
+    Loads and splits files, in a pool of worker processes if `workers` is above 1.
+
+    At most twice as many files as there are workers are loaded ahead of the file
+    being consumed, so memory stays bounded. If a file crashes its worker process,
+    the pool is restarted and the file is retried on its own before it is reported
+    as failed.
+
+    Parameters:
+        books_directory (str): The directory containing the files.
+        files (list): The names of the files to load.
+        loader_class: The loader class for the file type.
+        chunk_size (int): The maximum size of each chunk.
+        chunk_overlap (int): The overlap between chunks.
+        handle_metadata (bool): Whether to add the file name and path to the
+            metadata of every chunk. Defaults to True.
+        workers (int): The number of worker processes (1 loads in this process).
+        splitter (str): The text splitter (see text_processing.SPLITTERS).
+            Defaults to 'recursive'.
+
+    Yields:
+        tuple: The file name, its chunks (None if it failed to load) and the
+        exception it failed with (None if it loaded).
+    """
+    def task(file):
+        file_path = os.path.join(books_directory, file)
+        metadata = {"source": file, "file_path": file_path} if handle_metadata else None
+        return file_path, loader_class, metadata, chunk_size, chunk_overlap, splitter
+
+    if not files:
+        return
+    if workers <= 1:
+        for file in files:
+            try:
+                result = file, load_file(*task(file)), None
+            except Exception as e:  # pylint: disable=broad-except
+                result = file, None, e
+            yield result
+        return
+
+    def start_pool():
+        return ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+
+    window = workers * 2
+    executor = start_pool()
+    pending = deque()
+    remaining = iter(files)
+    try:
+        while True:
+            for file in remaining:
+                pending.append((file, executor.submit(load_file, *task(file))))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+
+            file, future = pending.popleft()
+            try:
+                result = file, future.result(), None
+            except BrokenProcessPool:
+                executor.shutdown(wait=True)
+                executor = start_pool()
+                try:
+                    result = file, executor.submit(load_file, *task(file)).result(), None
+                except BrokenProcessPool as e:
+                    executor.shutdown(wait=True)
+                    executor = start_pool()
+                    result = file, None, e
+                except Exception as e:  # pylint: disable=broad-except
+                    result = file, None, e
+                pending = deque((name, executor.submit(load_file, *task(name)))
+                                for name, _ in pending)
+            except Exception as e:  # pylint: disable=broad-except
+                result = file, None, e
+            yield result
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,162 @@
+"""
+This module provides the stages of the streaming ingestion pipeline.
+
+Documents flow through the pipeline as generators: loaded and split chunks are
+grouped into batches, each batch is embedded and added to the FAISS index, and only
+a bounded number of batches is held in memory at any time. A background thread runs
+the loading and splitting stages so they overlap with embedding. FAISS indexes that
+need training hold back the first batches until they make up the training sample.
+"""
+
+import time
+import queue
+import threading
+from itertools import islice
+import numpy as np
+from models import truncate_embeddings
+from faiss_index import create_index, create_vector_store
+from common import metrics  # pylint: disable=import-error
+
+_END = object()
+
+def batched(iterable, batch_size):
+    """
+    Groups the items of an iterable into lists of at most `batch_size` items.
+
+    Parameters:
+        iterable (iterable): The items to group.
+        batch_size (int): The maximum number of items per batch.
+
+    Yields:
+        list: The next batch of items.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def prefetch(iterable, max_items):
+    """
+    Consumes an iterable in a background thread, buffering at most `max_items` items.
+
+    The producer blocks when the buffer is full, so memory stays bounded however fast
+    it runs ahead of the consumer. An exception raised by the producer is re-raised
+    in the consumer, and closing the generator stops the producer.
+
+    Parameters:
+        iterable (iterable): The items to produce in the background.
+        max_items (int): The maximum number of buffered items.
+
+    Yields:
+        The items of the iterable, in order.
+    """
+    buffer = queue.Queue(maxsize=max_items)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_END, None))
+        except Exception as e:  # pylint: disable=broad-except
+            put((_END, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def index_batches(batches, embeddings_model, vector_store_index=None, dimension=None,
+                  full_vectors=None, index_type="flat", index_params=None):
+    """
+    Embeds batches of chunks and adds them to a FAISS index.
+
+    A new index is created once the first `index_params['training_sample']` chunks
+    are embedded (or the first batch, for a flat index), and trained on them if its
+    type needs training.
+
+    Parameters:
+        batches (iterable): Lists of (chunk_id, document) pairs.
+        embeddings_model: The embeddings model used to embed the chunks.
+        vector_store_index (FAISS, optional): The index to add to; a new one is
+            created from the first batch if None. Defaults to None.
+        dimension (int, optional): The dimension the embeddings are truncated to
+            before they are indexed, if smaller than theirs. Defaults to None.
+        full_vectors (FullVectorStore, optional): The store the full-width embeddings
+            are added to. Defaults to None.
+        index_type (str): The type of a new index (see faiss_index.INDEX_TYPES).
+            Defaults to 'flat'.
+        index_params (dict, optional): The parameters of a new index. Defaults to None.
+
+    Returns:
+        tuple: The FAISS index (None if there were no chunks) and the number of
+        chunks added.
+    """
+    training_size = index_params["training_sample"] if index_type != "flat" else 1
+    pending = []
+    pending_count = 0
+    chunk_count = 0
+    start = time.perf_counter()
+    for batch in batches:
+        ids = [chunk_id for chunk_id, _ in batch]
+        texts = [doc.page_content for _, doc in batch]
+        metadatas = [doc.metadata for _, doc in batch]
+        with metrics.timer("ingestion_embed_batch_seconds"):
+            vectors = np.asarray(embeddings_model.embed_documents(texts), dtype=np.float32)
+        metrics.increment("ingestion_chunks_embedded_total", len(texts))
+        if full_vectors is not None:
+            full_vectors.add(ids, vectors)
+        if dimension and dimension < vectors.shape[1]:
+            vectors = truncate_embeddings(vectors, dimension)
+
+        pending.append((ids, texts, metadatas, vectors))
+        pending_count += len(ids)
+        if vector_store_index is None:
+            if pending_count < training_size:
+                continue
+            vector_store_index = _create_vector_store(embeddings_model, pending, index_type,
+                                                      index_params, training_size)
+        chunk_count += _add_pending(vector_store_index, pending)
+        pending, pending_count = [], 0
+        rate = chunk_count / (time.perf_counter() - start)
+        print(f"Indexed {chunk_count} chunks ({rate:.1f} chunks/s).")
+
+    if pending:
+        vector_store_index = _create_vector_store(embeddings_model, pending, index_type,
+                                                  index_params, training_size)
+        chunk_count += _add_pending(vector_store_index, pending)
+        print(f"Indexed {chunk_count} chunks.")
+    return vector_store_index, chunk_count
+
+def _create_vector_store(embeddings_model, pending, index_type, index_params, training_size):
+    training_vectors = np.concatenate([vectors for _, _, _, vectors in pending])
+    with metrics.timer("ingestion_index_train_seconds", index_type=index_type):
+        index = create_index(index_type, index_params or {}, training_vectors[:training_size])
+    return create_vector_store(embeddings_model, index)
+
+def _add_pending(vector_store_index, pending):
+    with metrics.timer("ingestion_index_add_seconds"):
+        for ids, texts, metadatas, vectors in pending:
+            vector_store_index.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+    return sum(len(ids) for ids, _, _, _ in pending)
@@ -0,0 +1,317 @@
+"""
+This module opens saved FAISS indexes for searching.
+
+Every index is saved with a metadata file describing the embeddings model it was
+built with and the dimension of its vectors, so an index can be loaded with a
+matching query embedder without access to config.py. Indexes built with two-stage
+search are wrapped in a TwoStageSearch, which finds candidates among the truncated
+vectors of the index and rescores them exactly with the full-width vectors on disk.
+Indexes are opened as a MappedIndex, which maps the vectors and reads chunk texts
+lazily from the chunk store. The search parameters of approximate indexes (nprobe,
+efSearch) saved in the metadata are applied to the opened index.
+
+Indexes saved with a lexical index can be opened for hybrid search, which fuses the
+dense results with BM25 results over Arabic-normalized words by reciprocal rank
+fusion, so exact words and names missed by the embeddings are still found.
+"""
+
+import os
+import json
+import numpy as np
+from models import get_embeddings_model, truncate_embeddings
+from full_vectors import VECTORS_FILENAME
+from faiss_index import set_search_params
+from index_store import MappedIndex, has_chunk_store
+from lexical_index import LexicalIndex, has_lexical_index
+
+INDEX_META_FILENAME = "index_meta.json"
+
+def save_index_meta(index_path, meta):
+    """
+    Saves the metadata of an index next to it.
+
+    Parameters:
+        index_path (str): The directory of the saved index.
+        meta (dict): The metadata of the index.
+
+    Returns:
+        None
+    """
+    os.makedirs(index_path, exist_ok=True)
+    meta_path = os.path.join(index_path, INDEX_META_FILENAME)
+    with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as file:
+        json.dump(meta, file, indent=2)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+def load_index_meta(index_path):
+    """
+    Loads the metadata of a saved index.
+
+    Parameters:
+        index_path (str): The directory of the saved index.
+
+    Returns:
+        dict: The metadata, or None if the index has no metadata file.
+    """
+    try:
+        with open(os.path.join(index_path, INDEX_META_FILENAME), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+class TwoStageSearch:
+    """
+    Searches an index of truncated vectors, then rescores the candidates at full width.
+
+    The query is embedded once at full width; its truncated prefix finds
+    `rescore_factor` times as many candidates as requested in the index, and the
+    candidates are ranked by their exact L2 distance to the full-width query.
+
+    Attributes:
+        mapped_index (MappedIndex): The index of truncated vectors.
+        full_vectors (numpy.ndarray): The memory-mapped full-width vectors.
+        embeddings_model: The embeddings model producing full-width query vectors.
+        dimension (int): The dimension of the vectors in the index.
+        rescore_factor (int): The number of candidates rescored per requested result.
+    """
+    def __init__(self, mapped_index, full_vectors, embeddings_model, dimension,
+                 rescore_factor=4):
+        """
+        Initializes a TwoStageSearch instance.
+
+        Parameters:
+            mapped_index (MappedIndex): The index of truncated vectors.
+            full_vectors (numpy.ndarray): The memory-mapped full-width vectors.
+            embeddings_model: The embeddings model producing full-width query vectors.
+            dimension (int): The dimension of the vectors in the index.
+            rescore_factor (int): The number of candidates rescored per requested
+                result. Defaults to 4.
+        """
+        self.mapped_index = mapped_index
+        self.full_vectors = full_vectors
+        self.embeddings_model = embeddings_model
+        self.dimension = dimension
+        self.rescore_factor = rescore_factor
+
+    def search_positions(self, embedding, k=4):
+        """
+        Finds the positions of the vectors nearest to a full-width query vector.
+
+        Parameters:
+            embedding (list): The full-width query vector.
+            k (int): The number of positions to return. Defaults to 4.
+
+        Returns:
+            list: (position, distance) pairs, nearest first.
+        """
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        coarse_vector = truncate_embeddings(query_vector[np.newaxis], self.dimension)
+        _, indices = self.mapped_index.index.search(coarse_vector, k * self.rescore_factor)
+
+        positions = [int(position) for position in indices[0] if position != -1]
+        if not positions:
+            return []
+        rows = self.mapped_index.full_vector_rows(positions)
+        distances = np.sum((self.full_vectors[rows] - query_vector) ** 2, axis=1)
+        order = np.argsort(distances, kind='stable')[:k]
+        return [(positions[i], float(distances[i])) for i in order]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        """
+        Finds the chunks nearest to a full-width query vector.
+
+        Parameters:
+            embedding (list): The full-width query vector.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: (Document, distance) pairs, nearest first.
+        """
+        hits = self.search_positions(embedding, k)
+        docs = self.mapped_index.documents([position for position, _ in hits])
+        return [(doc, distance) for doc, (_, distance) in zip(docs, hits)]
+
+    def similarity_search_with_score(self, query, k=4):
+        """
+        Finds the chunks most similar to a query.
+
+        Parameters:
+            query (str): The query.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: (Document, distance) pairs, nearest first.
+        """
+        return self.similarity_search_with_score_by_vector(
+            self.embeddings_model.embed_query(query), k)
+
+    def similarity_search(self, query, k=4):
+        """
+        Finds the chunks most similar to a query.
+
+        Parameters:
+            query (str): The query.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: The documents, nearest first.
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+class HybridSearch:
+    """
+    Fuses dense and lexical search results by reciprocal rank fusion.
+
+    Both searches return `candidate_factor` times as many candidates as requested,
+    and every candidate is scored by the sum of 1 / (rrf_k + rank) over the result
+    lists it appears in. Fused scores are higher for better matches, unlike the
+    distances returned by dense search.
+
+    Attributes:
+        dense_search (MappedIndex or TwoStageSearch): The dense search.
+        lexical_index (LexicalIndex): The BM25 index of the same chunks.
+        mapped_index (MappedIndex): The index the chunks are read from.
+        embeddings_model: The embeddings model used to embed queries.
+        rrf_k (int): The rank offset of reciprocal rank fusion.
+        candidate_factor (int): The number of candidates per requested result.
+    """
+    def __init__(self, dense_search, lexical_index, rrf_k=60, candidate_factor=4):
+        """
+        Initializes a HybridSearch instance.
+
+        Parameters:
+            dense_search (MappedIndex or TwoStageSearch): The dense search.
+            lexical_index (LexicalIndex): The BM25 index of the same chunks.
+            rrf_k (int): The rank offset of reciprocal rank fusion. Defaults to 60.
+            candidate_factor (int): The number of candidates taken from each search
+                per requested result. Defaults to 4.
+        """
+        self.dense_search = dense_search
+        self.lexical_index = lexical_index
+        self.mapped_index = getattr(dense_search, "mapped_index", dense_search)
+        self.embeddings_model = dense_search.embeddings_model
+        self.rrf_k = rrf_k
+        self.candidate_factor = candidate_factor
+
+    def hybrid_search_positions(self, query, embedding, k=4):
+        """
+        Finds the positions of the chunks that best match a query by meaning and by
+        its words.
+
+        Parameters:
+            query (str): The query.
+            embedding (list): The query vector.
+            k (int): The number of positions to return. Defaults to 4.
+
+        Returns:
+            list: (position, fused score) pairs, best first.
+        """
+        candidates = k * self.candidate_factor
+        dense_positions = [position for position, _ in
+                           self.dense_search.search_positions(embedding, candidates)]
+        lexical_positions, _ = self.lexical_index.search(query, candidates)
+
+        scores = {}
+        for positions in (dense_positions, lexical_positions.tolist()):
+            for rank, position in enumerate(positions):
+                scores[position] = scores.get(position, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        best = sorted(scores, key=lambda position: -scores[position])[:k]
+        return [(position, scores[position]) for position in best]
+
+    def hybrid_search_with_score(self, query, embedding, k=4):
+        """
+        Finds the chunks that best match a query by meaning and by its words.
+
+        Parameters:
+            query (str): The query.
+            embedding (list): The query vector.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: (Document, fused score) pairs, best first.
+        """
+        hits = self.hybrid_search_positions(query, embedding, k)
+        docs = self.mapped_index.documents([position for position, _ in hits])
+        return [(doc, score) for doc, (_, score) in zip(docs, hits)]
+
+    def similarity_search_with_score(self, query, k=4):
+        """
+        Finds the chunks that best match a query.
+
+        Parameters:
+            query (str): The query.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: (Document, fused score) pairs, best first.
+        """
+        return self.hybrid_search_with_score(query, self.embeddings_model.embed_query(query), k)
+
+    def similarity_search(self, query, k=4):
+        """
+        Finds the chunks that best match a query.
+
+        Parameters:
+            query (str): The query.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: The documents, best first.
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+def load_index(index_path, hybrid=False, rrf_k=60, candidate_factor=4, embeddings_model=None):
+    """
+    Opens a saved FAISS index with a query embedder matching the one it was built with.
+
+    The index is opened memory-mapped, and the text of chunks is read from its chunk
+    store only for the chunks a search returns.
+
+    Parameters:
+        index_path (str): The directory of the saved index.
+        hybrid (bool): Whether to fuse dense results with the results of the lexical
+            index, if the index was saved with one. Defaults to False.
+        rrf_k (int): The rank offset of reciprocal rank fusion. Defaults to 60.
+        candidate_factor (int): The number of candidates taken from each search per
+            requested result in hybrid search. Defaults to 4.
+        embeddings_model (optional): The query embedder, shared with other indexes
+            built with the same model; one is created from the metadata if None.
+            Defaults to None.
+
+    Returns:
+        MappedIndex, TwoStageSearch or HybridSearch: The searchable index.
+
+    Raises:
+        FileNotFoundError: If the index has no metadata file or chunk store.
+    """
+    meta = load_index_meta(index_path)
+    if meta is None:
+        raise FileNotFoundError(f"No {INDEX_META_FILENAME} in {index_path}")
+    if not has_chunk_store(index_path):
+        raise FileNotFoundError(f"No chunk store in {index_path}; run create_embeddings.py "
+                                "again to save one.")
+
+    dimension = meta["dimension"]
+    truncated = dimension != meta["full_dimension"]
+    if embeddings_model is None:
+        # Two-stage search embeds queries at full width and truncates them itself
+        embeddings_model = get_embeddings_model(
+            meta["embedding_model"], meta["model_type"],
+            dimension=dimension if truncated and not meta["two_stage"] else None)
+    mapped_index = MappedIndex(index_path, embeddings_model, meta["index_type"])
+    set_search_params(mapped_index.index, meta["index_params"])
+    dense_search = mapped_index
+    if meta["two_stage"]:
+        vectors_path = os.path.join(index_path, VECTORS_FILENAME)
+        full_dimension = meta["full_dimension"]
+        full_vectors = np.memmap(vectors_path, dtype=np.float32, mode='r',
+                                 shape=(os.path.getsize(vectors_path) // (full_dimension * 4),
+                                        full_dimension))
+        dense_search = TwoStageSearch(mapped_index, full_vectors, embeddings_model, dimension,
+                                      meta["rescore_factor"])
+    if not hybrid or not meta.get("lexical") or not has_lexical_index(index_path):
+        return dense_search
+
+    lexical_params = meta["lexical_params"]
+    lexical_index = LexicalIndex(index_path, lexical_params["k1"], lexical_params["b"])
+    return HybridSearch(dense_search, lexical_index, rrf_k, candidate_factor)
@@ -0,0 +1,334 @@
+"""
+This module keeps a library of books as shards, one FAISS index per book listed in a
+catalog, and searches them together.
+
+create_embeddings.py builds the index of every book of a library directory on its own
+and records it in the catalog (catalog.json), so adding or changing a book never
+rebuilds the indexes of the other books. A ShardRouter opens the shards of a catalog
+with one shared query embedder and searches them in parallel in a pool of threads;
+FAISS releases the GIL while it searches, so search latency depends on the number of
+cores rather than the size of the library. The results of the shards are merged by
+distance for dense search. For hybrid search, the dense results and the lexical
+results of all shards are ranked separately and fused by reciprocal rank fusion, as
+within one index. BM25 scores are computed with the statistics of each shard.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from retrieval import HybridSearch, load_index, load_index_meta
+
+CATALOG_FILENAME = "catalog.json"
+
+# Metadata that must be the same for all shards, so one query embedding fits them all
+SHARED_META_KEYS = ("embedding_model", "model_type", "dimension", "full_dimension", "two_stage")
+
+def has_catalog(directory):
+    """
+    Checks whether a directory holds a shard catalog.
+
+    Parameters:
+        directory (str): The directory.
+
+    Returns:
+        bool: True if the catalog exists.
+    """
+    return os.path.exists(os.path.join(directory, CATALOG_FILENAME))
+
+class ShardCatalog:
+    """
+    The list of the shards of a library, with the version of each.
+
+    Shards are saved in subdirectories of the catalog directory, and recorded by
+    their paths relative to it, so the directory can be moved.
+
+    Attributes:
+        directory (str): The directory of the catalog and its shards.
+        shards (dict): The relative path and version of every shard, by name.
+    """
+    def __init__(self, directory, shards=None):
+        """
+        Initializes a ShardCatalog instance.
+
+        Parameters:
+            directory (str): The directory of the catalog and its shards.
+            shards (dict, optional): The shards, by name. Defaults to None (no shards).
+        """
+        self.directory = directory
+        self.shards = shards or {}
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Loads the catalog of a directory.
+
+        Parameters:
+            directory (str): The directory of the catalog.
+
+        Returns:
+            ShardCatalog: The catalog, empty if the directory has none.
+        """
+        if not has_catalog(directory):
+            return cls(directory)
+        with open(os.path.join(directory, CATALOG_FILENAME), 'r', encoding='utf-8') as file:
+            return cls(directory, json.load(file)["shards"])
+
+    @property
+    def version(self):
+        """str: A version of the library that changes whenever any shard changes."""
+        return hashlib.sha256(json.dumps(self.shards, sort_keys=True).encode('utf-8')
+                              ).hexdigest()[:32]
+
+    def shard_path(self, name):
+        """
+        Returns the directory of a shard.
+
+        Parameters:
+            name (str): The name of the shard.
+
+        Returns:
+            str: The directory the shard is saved in.
+        """
+        return os.path.join(self.directory, self.shards[name]["path"]
+                            if name in self.shards else name)
+
+    def register(self, name, index_path):
+        """
+        Records a saved index as a shard, with the version in its metadata.
+
+        Parameters:
+            name (str): The name of the shard.
+            index_path (str): The directory of the saved index.
+
+        Returns:
+            None
+        """
+        meta = load_index_meta(index_path) or {}
+        self.shards[name] = {"path": os.path.relpath(index_path, self.directory),
+                             "version": meta.get("version")}
+
+    def remove(self, name):
+        """
+        Removes a shard from the catalog and deletes its index.
+
+        Parameters:
+            name (str): The name of the shard.
+
+        Returns:
+            None
+        """
+        shutil.rmtree(self.shard_path(name), ignore_errors=True)
+        self.shards.pop(name, None)
+
+    def save(self):
+        """
+        Saves the catalog.
+
+        Returns:
+            None
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        catalog_path = os.path.join(self.directory, CATALOG_FILENAME)
+        with open(f"{catalog_path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump({"version": self.version, "shards": self.shards}, file, indent=2,
+                      ensure_ascii=False)
+        os.replace(f"{catalog_path}.tmp", catalog_path)
+
+class ShardRouter:
+    """
+    Searches the shards of a library in parallel and merges their results.
+
+    Scores are distances, lower for better matches, unless some shard is searched in
+    hybrid mode; they are then fused scores, higher for better matches.
+
+    Attributes:
+        shards (dict): The searchable index of every shard, by name.
+        embeddings_model: The query embedder shared by the shards.
+        version (str): The version of the catalog.
+        hybrid (bool): Whether results are fused with lexical results.
+        rrf_k (int): The rank offset of reciprocal rank fusion.
+        candidate_factor (int): The number of candidates per requested result in
+            hybrid search.
+    """
+    def __init__(self, shards, version=None, rrf_k=60, candidate_factor=4, workers=None):
+        """
+        Initializes a ShardRouter instance.
+
+        Parameters:
+            shards (dict): The searchable index of every shard, as returned by
+                load_index, by name.
+            version (str, optional): The version of the catalog. Defaults to None.
+            rrf_k (int): The rank offset of reciprocal rank fusion. Defaults to 60.
+            candidate_factor (int): The number of candidates taken from each search
+                per requested result in hybrid search. Defaults to 4.
+            workers (int, optional): The number of threads searching shards. Defaults
+                to None (one per core, at most one per shard).
+        """
+        self.shards = shards
+        self.embeddings_model = next(iter(shards.values())).embeddings_model
+        self.version = version
+        self.hybrid = any(isinstance(search, HybridSearch) for search in shards.values())
+        self.rrf_k = rrf_k
+        self.candidate_factor = candidate_factor
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or max(min(len(shards), os.cpu_count() or 1), 1))
+
+    def __len__(self):
+        return sum(len(getattr(search, "mapped_index", search)) for search in self.shards.values())
+
+    @staticmethod
+    def _search_shard(search, query, embedding, candidates):
+        if isinstance(search, HybridSearch):
+            return (search.dense_search.search_positions(embedding, candidates),
+                    search.lexical_index.search(query, candidates))
+        return search.search_positions(embedding, candidates), None
+
+    def search_positions(self, query, embedding, k=4, shards=None):
+        """
+        Finds the positions of the best matches of a query in the shards.
+
+        Parameters:
+            query (str): The query.
+            embedding (list): The query vector.
+            k (int): The number of positions to return. Defaults to 4.
+            shards (list, optional): The names of the shards to search. Defaults to
+                None (all shards).
+
+        Returns:
+            list: (shard name, position, score) tuples, best first.
+
+        Raises:
+            ValueError: If a shard is unknown.
+        """
+        names = list(self.shards) if shards is None else list(shards)
+        unknown = [name for name in names if name not in self.shards]
+        if unknown:
+            raise ValueError(f"Unknown shards: {', '.join(unknown)}")
+        candidates = k * self.candidate_factor if self.hybrid else k
+        futures = {name: self._executor.submit(self._search_shard, self.shards[name], query,
+                                               embedding, candidates)
+                   for name in names}
+        results = {name: future.result() for name, future in futures.items()}
+
+        dense = sorted((distance, name, position) for name, (hits, _) in results.items()
+                       for position, distance in hits)
+        if not self.hybrid:
+            return [(name, position, distance) for distance, name, position in dense[:k]]
+
+        lexical = sorted((-float(score), name, int(position))
+                         for name, (_, lexical_hits) in results.items() if lexical_hits is not None
+                         for position, score in zip(*lexical_hits))
+        scores = {}
+        for ranking in (dense[:candidates], lexical[:candidates]):
+            for rank, (_, name, position) in enumerate(ranking):
+                key = (name, position)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        best = sorted(scores, key=lambda key: -scores[key])[:k]
+        return [(name, position, scores[(name, position)]) for name, position in best]
+
+    def search_with_score(self, query, embedding, k=4, shards=None):
+        """
+        Finds the chunks that best match a query in the shards.
+
+        Parameters:
+            query (str): The query.
+            embedding (list): The query vector.
+            k (int): The number of chunks to return. Defaults to 4.
+            shards (list, optional): The names of the shards to search. Defaults to
+                None (all shards).
+
+        Returns:
+            list: (Document, score) pairs, best first, with the name of the shard of
+            every chunk in its 'shard' metadata.
+
+        Raises:
+            ValueError: If a shard is unknown.
+        """
+        results = []
+        for name, position, score in self.search_positions(query, embedding, k, shards):
+            search = self.shards[name]
+            doc = getattr(search, "mapped_index", search).documents([position])[0]
+            doc.metadata["shard"] = name
+            results.append((doc, score))
+        return results
+
+    def similarity_search_with_score(self, query, k=4):
+        """
+        Finds the chunks that best match a query in all shards.
+
+        Parameters:
+            query (str): The query.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: (Document, score) pairs, best first.
+        """
+        return self.search_with_score(query, self.embeddings_model.embed_query(query), k)
+
+    def similarity_search(self, query, k=4):
+        """
+        Finds the chunks that best match a query in all shards.
+
+        Parameters:
+            query (str): The query.
+            k (int): The number of chunks to return. Defaults to 4.
+
+        Returns:
+            list: The documents, best first.
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def close(self):
+        """
+        Stops the search threads and closes the chunk stores of the shards.
+
+        Returns:
+            None
+        """
+        self._executor.shutdown()
+        for search in self.shards.values():
+            getattr(search, "mapped_index", search).close()
+
+def load_library(directory, hybrid=False, rrf_k=60, candidate_factor=4, workers=None):
+    """
+    Opens the shards of a catalog for searching.
+
+    Parameters:
+        directory (str): The directory of the catalog.
+        hybrid (bool): Whether to fuse dense results with the results of the lexical
+            indexes of the shards that have one. Defaults to False.
+        rrf_k (int): The rank offset of reciprocal rank fusion. Defaults to 60.
+        candidate_factor (int): The number of candidates taken from each search per
+            requested result in hybrid search. Defaults to 4.
+        workers (int, optional): The number of threads searching shards. Defaults to
+            None (one per core, at most one per shard).
+
+    Returns:
+        ShardRouter: The router over the shards.
+
+    Raises:
+        FileNotFoundError: If the catalog has no shards.
+        ValueError: If the shards were built with different embedding settings.
+    """
+    catalog = ShardCatalog.load(directory)
+    if not catalog.shards:
+        raise FileNotFoundError(f"No shards in the catalog of {directory}")
+    shards = {}
+    shared_meta = None
+    embeddings_model = None
+    for name in sorted(catalog.shards):
+        index_path = catalog.shard_path(name)
+        meta = load_index_meta(index_path)
+        if meta is None:
+            raise FileNotFoundError(f"Shard {name} has no index in {index_path}")
+        shard_meta = {key: meta[key] for key in SHARED_META_KEYS}
+        if shared_meta is None:
+            shared_meta = shard_meta
+        elif shard_meta != shared_meta:
+            raise ValueError(f"Shard {name} was built with other embedding settings than the "
+                             "other shards; run create_embeddings.py again.")
+        shards[name] = load_index(index_path, hybrid, rrf_k, candidate_factor, embeddings_model)
+        embeddings_model = shards[name].embeddings_model
+    return ShardRouter(shards, catalog.version, rrf_k, candidate_factor, workers)
@@ -1,21 +1,141 @@
 """
 This module contains functions for processing text documents, including splitting them into chunks.
+
+Two splitters are available. The 'recursive' splitter is LangChain's
+RecursiveCharacterTextSplitter, with chunk sizes in characters. The 'arabic' splitter
+makes a single pass over the words of a document, with chunk sizes in words, and
+ends chunks at the last sentence boundary (including the Arabic question mark and
+full stop) or, failing that, the last clause boundary (including the Arabic comma
+and semicolon) in their second half. It finds chunks as offsets into the document
+and copies only the text of each chunk once.
 """
 
+import numpy as np
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def process_documents(documents, chunk_size, chunk_overlap):
+SPLITTERS = ("recursive", "arabic")
+
+# Whether each code point up to U+3000 is whitespace
+WHITESPACE = np.array([chr(code).isspace() for code in range(0x3001)])
+
+# Characters ending a sentence or a clause when they end a word
+SENTENCE_ENDINGS = np.array([ord(char) for char in '.!?\u061F\u06D4\u2026'], dtype=np.uint32)
+CLAUSE_ENDINGS = np.array([ord(char) for char in ',;:\u060C\u061B'], dtype=np.uint32)
+
+def _last_true(mask):
+    # Returns, for every index, the last index up to it where the mask is set, or -1
+    return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+
+def _find_words(text):
+    # Returns the start and end offsets of the words of the text and, for every word,
+    # the last word up to it followed by a sentence boundary, and by a sentence or
+    # clause boundary
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    # Control characters separate words too; other whitespace is rare and looked up
+    is_space = (codes <= 0x20) | (codes == 0x85) | (codes == 0xA0)
+    wide = np.flatnonzero(codes - 0x1680 <= 0x3000 - 0x1680)
+    is_space[wide] = WHITESPACE[codes[wide]]
+
+    bounds = np.flatnonzero(is_space[1:] != is_space[:-1]) + 1
+    if len(codes) and not is_space[0]:
+        bounds = np.concatenate(([0], bounds))
+    if len(codes) and not is_space[-1]:
+        bounds = np.concatenate((bounds, [len(codes)]))
+    starts, ends = bounds[0::2], bounds[1::2]
+
+    last_chars = codes[ends - 1]
+    sentence = np.isin(last_chars, SENTENCE_ENDINGS)
+    clause = np.isin(last_chars, CLAUSE_ENDINGS)
+    # A line break between two words also ends a sentence
+    words_before_newlines = np.searchsorted(starts, np.flatnonzero(codes == 0x0A)) - 1
+    sentence[words_before_newlines[words_before_newlines >= 0]] = True
+    return starts, ends, _last_true(sentence), _last_true(sentence | clause)
+
+def split_text_offsets(text, chunk_size, chunk_overlap):
+    """
+    Splits text into chunks of at most `chunk_size` words, in a single pass.
+
+    Words are found, with the sentence and clause boundaries after them, in one
+    vectorized pass over the code points of the text. A line break after a word is
+    a sentence boundary, as is a word ending with a sentence ending. A chunk ends
+    after the last sentence boundary in its second half, or else the last clause
+    boundary, or else after `chunk_size` words. Consecutive chunks share up to
+    `chunk_overlap` words.
+
+    Parameters:
+        text (str): The text to split.
+        chunk_size (int): The maximum number of words of each chunk.
+        chunk_overlap (int): The number of words repeated at the start of the next chunk.
+
+    Yields:
+        tuple: The start and end offsets of every chunk in the text.
+
+    Raises:
+        ValueError: If the overlap is not smaller than the chunk size.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError(f"The chunk overlap ({chunk_overlap}) must be smaller than the "
+                         f"chunk size ({chunk_size}).")
+    starts, ends, last_sentence_ends, last_clause_ends = _find_words(text)
+    word_count = len(starts)
+    first = 0
+    while first < word_count:
+        limit = first + chunk_size
+        if limit >= word_count:
+            yield int(starts[first]), int(ends[-1])
+            return
+        cut = limit
+        for last_ends in (last_sentence_ends, last_clause_ends):
+            boundary = int(last_ends[limit - 1])
+            if boundary >= first + chunk_size // 2:
+                cut = boundary + 1
+                break
+        yield int(starts[first]), int(ends[cut - 1])
+        first = max(cut - chunk_overlap, first + 1)
+
+def split_documents(documents, chunk_size, chunk_overlap):
+    """
+    Splits documents with the Arabic-aware splitter.
+
+    Parameters:
+        documents (list): A list of documents to be split.
+        chunk_size (int): The maximum number of words of each chunk.
+        chunk_overlap (int): The number of words shared by consecutive chunks.
+
+    Returns:
+        list: The chunks, with the offset of each in its document as 'start_index'.
+    """
+    chunks = []
+    for doc in documents:
+        text = doc.page_content
+        for start, end in split_text_offsets(text, chunk_size, chunk_overlap):
+            # The fields are known to be valid, so pydantic validation is skipped
+            chunks.append(Document.construct(page_content=text[start:end],
+                                             metadata=dict(doc.metadata, start_index=start)))
+    return chunks
+
+def process_documents(documents, chunk_size, chunk_overlap, splitter="recursive"):
     """
     Splits the given list of documents into chunks based on the specified chunk size and overlap.
 
     Parameters:
         documents (list): A list of documents to be split.
-        chunk_size (int): The maximum size of each chunk.
-        chunk_overlap (int): The overlap between chunks.
+        chunk_size (int): The maximum size of each chunk, in characters for the
+            'recursive' splitter and in words for the 'arabic' splitter.
+        chunk_overlap (int): The overlap between chunks, in the same unit.
+        splitter (str): One of SPLITTERS. Defaults to 'recursive'.
 
     Returns:
         list: A list of documents where each document is split into chunks.
+
+    Raises:
+        ValueError: If the splitter is unknown.
     """
+    if splitter == "arabic":
+        return split_documents(documents, chunk_size, chunk_overlap)
+    if splitter != "recursive":
+        raise ValueError(f"Unsupported text splitter: {splitter}")
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size,
                                                    chunk_overlap=chunk_overlap)
     return text_splitter.split_documents(documents)
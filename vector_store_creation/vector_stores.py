@@ -6,7 +6,7 @@ for document indexing and retrieval.
 
 from langchain_community.vectorstores import FAISS, Chroma, Weaviate  # pylint: disable=no-name-in-module
 
-def get_vector_store(store_name, documents, embeddings_model):
+def get_vector_store(store_name, documents, embeddings_model, ids=None):
     """
     Retrieves the appropriate vector store based on the store name.
 
@@ -14,6 +14,7 @@ def get_vector_store(store_name, documents, embeddings_model):
         store_name (str): The name of the vector store ('faiss', 'chroma', or 'weaviate').
         documents (list): The list of documents to index in the vector store.
         embeddings_model: The embeddings model to use for vector store creation.
+        ids (list, optional): The IDs of the documents in the store. Defaults to None.
 
     Returns:
         vector_store: The corresponding vector store instance.
@@ -22,9 +23,9 @@ def get_vector_store(store_name, documents, embeddings_model):
         ValueError: If the store name is unsupported.
     """
     if store_name == "faiss":
-        return FAISS.from_documents(documents, embeddings_model)
+        return FAISS.from_documents(documents, embeddings_model, ids=ids)
     if store_name == "chroma":
-        return Chroma.from_documents(documents, embeddings_model)
+        return Chroma.from_documents(documents, embeddings_model, ids=ids)
     if store_name == "weaviate":
         return Weaviate.from_documents(documents, embeddings_model)
     raise ValueError(f"Unsupported vector store: {store_name}")